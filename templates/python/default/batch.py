@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Generate many projects from this template in one pass.
+
+The manifest is a CSV file with one column per ``cookiecutter.json``
+variable, or a JSON file holding a list of objects (or an object with a
+``projects`` list). Omitted variables take their defaults, e.g.::
+
+    project_name,author_name,include_tests,with_cuda
+    Protein Folding,Ada Lovelace,True,False
+    Climate Ensembles,Alan Turing,False,True
+
+Usage::
+
+    python batch.py manifest.csv --output-dir projects --workers 8
+
+Every row is checked before anything is rendered: against the choices in
+``cookiecutter.json`` and the rules of ``hooks/pre_gen_project.py``, and
+for duplicate or existing project directories. The system information of
+``cresp.toml`` is probed once for the whole batch and shared through the
+environment cache of ``hooks/post_gen_project.py``. The projects are then
+rendered in worker processes. Each project's hook output goes to
+``<output-dir>/batch_logs/<directory>.log``. A JSON report lists the
+status of every row, and the exit code is 1 if any row failed.
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).resolve().parent
+HOOKS_DIR = TEMPLATE_DIR / "hooks"
+
+TRUE_VALUES = ("true", "1", "yes", "y", "on")
+FALSE_VALUES = ("false", "0", "no", "n", "off")
+
+
+def load_hook(name):
+    """Import a hook script as a module, without running it."""
+    spec = importlib.util.spec_from_file_location(f"cresp_{name}", HOOKS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_manifest(path):
+    """Rows of a CSV or JSON manifest, as dicts of cookiecutter variables."""
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with open(path, "r") as f:
+            data = json.load(f)
+        rows = data.get("projects", []) if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError(f"{path} must hold a list of objects or an object with a 'projects' list")
+        return rows
+    with open(path, "r", newline="") as f:
+        # Empty cells mean "use the default"
+        return [{key: value for key, value in row.items() if key and value not in (None, "")}
+                for row in csv.DictReader(f)]
+
+
+def coerce_row(row, defaults):
+    """
+    Convert manifest values to the types of cookiecutter.json.
+
+    CSV gives strings, so booleans written as True/false/1/no are turned
+    into the bools the choice lists hold; other values are kept as strings.
+    """
+    answers = {}
+    for key, value in row.items():
+        if key not in defaults or key.startswith("_"):
+            raise ValueError(f"Unknown template variable: {key}")
+        default = defaults[key]
+        choices = default if isinstance(default, list) else [default]
+        if isinstance(choices[0], bool) and not isinstance(value, bool):
+            text = str(value).strip().lower()
+            if text not in TRUE_VALUES + FALSE_VALUES:
+                raise ValueError(f"{key} must be true or false, got {value!r}")
+            value = text in TRUE_VALUES
+        elif not isinstance(value, bool):
+            value = str(value)
+        answers[key] = value
+    return answers
+
+
+def resolve_row(row, defaults):
+    """All answers for one row, with defaults and derived variables (project_slug, ...) rendered."""
+    from cookiecutter.generate import generate_context
+    from cookiecutter.prompt import prompt_for_config
+
+    extra_context = coerce_row(row, defaults)
+    context = generate_context(TEMPLATE_DIR / "cookiecutter.json", extra_context=extra_context)
+    return extra_context, dict(prompt_for_config(context, no_input=True))
+
+
+def validate_manifest(rows, output_dir, overwrite=False):
+    """
+    Check every row before anything is generated.
+
+    Returns one entry per row with its index, the answers passed to
+    cookiecutter, the rendered directory name and the pre_gen messages,
+    plus an ``errors`` list that is empty for rows that can be rendered.
+    """
+    with open(TEMPLATE_DIR / "cookiecutter.json", "r") as f:
+        defaults = json.load(f)
+    pre_gen = load_hook("pre_gen_project")
+
+    entries = []
+    directories = {}
+    for index, row in enumerate(rows):
+        entry = {"row": index, "extra_context": {}, "directory": None, "messages": [], "errors": []}
+        entries.append(entry)
+        try:
+            entry["extra_context"], answers = resolve_row(row, defaults)
+        except Exception as e:
+            entry["errors"].append(str(e))
+            continue
+
+        entry["directory"] = answers["directory_name"]
+        entry["with_cuda"] = answers["with_cuda"] is True or answers["with_cuda"] == "True"
+        for level, message in pre_gen.check_options(
+            answers["project_name"], answers["project_slug"], answers["python_version"],
+            answers["include_jupyter"], answers["include_tests"], answers["include_visualization"],
+            answers["include_data_analysis"],
+        ):
+            if level == "ERROR":
+                entry["errors"].append(message)
+            else:
+                entry["messages"].append(f"{level}: {message}")
+
+        if entry["directory"] in directories:
+            entry["errors"].append(f"Directory {entry['directory']} is also generated by row "
+                                   f"{directories[entry['directory']]}")
+        else:
+            directories[entry["directory"]] = index
+        if not overwrite and (Path(output_dir) / entry["directory"]).exists():
+            entry["errors"].append(f"{Path(output_dir) / entry['directory']} already exists (use --overwrite)")
+    return entries
+
+
+def warm_environment_cache(with_cuda_values, refresh=False):
+    """Probe the system once per with_cuda setting so every post_gen hook of the batch hits the cache."""
+    post_gen = load_hook("post_gen_project")
+    for with_cuda in sorted(with_cuda_values):
+        post_gen.cached_probe_environment(with_cuda, refresh=refresh)
+
+
+def render_project(entry, output_dir, log_dir, overwrite=False):
+    """
+    Render one project in a worker process.
+
+    The hooks run as child processes writing to the inherited file
+    descriptors, so stdout and stderr are redirected at the descriptor
+    level into the project's log file.
+    """
+    from cookiecutter.main import cookiecutter
+
+    log_file = Path(log_dir) / f"{entry['directory']}.log"
+    start = time.perf_counter()
+    result = {"row": entry["row"], "directory": entry["directory"], "log": str(log_file)}
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(log_file, "w") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            path = cookiecutter(str(TEMPLATE_DIR), no_input=True, extra_context=entry["extra_context"],
+                                output_dir=str(output_dir), overwrite_if_exists=overwrite)
+            result.update(status="ok", path=path)
+        except BaseException as e:
+            result.update(status="failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(manifest, output_dir, workers=None, report_path=None, overwrite=False, skip_invalid=False,
+              refresh=False):
+    """
+    Validate, probe and render all rows of a manifest; write and return the report.
+
+    Unless skip_invalid is set, nothing is rendered when a row is invalid.
+    """
+    output_dir = Path(output_dir)
+    report_path = Path(report_path) if report_path else output_dir / "batch_report.json"
+    log_dir = output_dir / "batch_logs"
+
+    entries = validate_manifest(read_manifest(manifest), output_dir, overwrite)
+    invalid = [entry for entry in entries if entry["errors"]]
+    results = {}
+    for entry in invalid:
+        results[entry["row"]] = {"row": entry["row"], "directory": entry["directory"], "status": "invalid",
+                                 "error": "; ".join(entry["errors"])}
+    for entry in entries:
+        if invalid and not skip_invalid and not entry["errors"]:
+            results[entry["row"]] = {"row": entry["row"], "directory": entry["directory"], "status": "skipped",
+                                     "error": "Not rendered because other rows are invalid"}
+
+    pending = [entry for entry in entries if entry["row"] not in results]
+    if pending:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        warm_environment_cache({entry["with_cuda"] for entry in pending}, refresh=refresh)
+        # The cache is fresh now; do not let every hook probe again
+        os.environ.pop("CRESP_REFRESH_ENVIRONMENT", None)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render_project, entry, output_dir, log_dir, overwrite): entry
+                       for entry in pending}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"row": entry["row"], "directory": entry["directory"], "status": "failed",
+                              "error": f"{type(e).__name__}: {e}"}
+                result["messages"] = entry["messages"]
+                results[entry["row"]] = result
+                print(f"[{result['status']}] {result['directory']}" +
+                      (f": {result['error']}" if result.get("error") else ""))
+
+    report = {
+        "manifest": str(manifest),
+        "output_dir": str(output_dir),
+        "summary": {status: sum(1 for r in results.values() if r["status"] == status)
+                    for status in ("ok", "failed", "invalid", "skipped")},
+        "projects": [results[row] for row in sorted(results)],
+    }
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate projects from a CSV or JSON manifest")
+    parser.add_argument("manifest", help="CSV or JSON file with one row of cookiecutter answers per project")
+    parser.add_argument("--output-dir", default=".", help="Directory to create the projects in")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--report", default=None,
+                        help="Path of the JSON report (default: <output-dir>/batch_report.json)")
+    parser.add_argument("--overwrite", action="store_true", help="Overwrite existing project directories")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="Render the valid rows even if some rows are invalid")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Probe the system again instead of using the cached system information")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_batch(args.manifest, args.output_dir, args.workers, args.report, args.overwrite,
+                           args.skip_invalid, args.refresh)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Could not read manifest {args.manifest}: {e}")
+        return 1
+
+    for project in report["projects"]:
+        if project["status"] in ("invalid", "skipped"):
+            print(f"[{project['status']}] row {project['row']} ({project['directory']}): {project['error']}")
+    summary = report["summary"]
+    print(f"{summary['ok']} generated, {summary['failed']} failed, {summary['invalid']} invalid, "
+          f"{summary['skipped']} skipped; report: {args.report or Path(args.output_dir) / 'batch_report.json'}")
+    return 0 if summary["ok"] == len(report["projects"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark of string escaping in the bundled tomli_w (hooks/tomli_w).
+
+Dumps cresp.toml-like configs (a large system.packages inventory, long
+descriptions, captured command output) with the current ``format_string``
+and with the character-by-character version it replaced, checks that both
+give byte-identical output, and prints the timings::
+
+    python benchmarks/bench_tomli_w.py
+    python benchmarks/bench_tomli_w.py --packages 20000 --output-lines 5000 --repeat 5
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "hooks"))
+
+import tomli_w  # noqa: E402
+from tomli_w import _writer  # noqa: E402
+
+
+def reference_format_string(s, *, allow_multiline):
+    """format_string of tomli_w 1.2.0, escaping one character at a time."""
+    do_multiline = allow_multiline and "\n" in s
+    if do_multiline:
+        result = '"""\n'
+        s = s.replace("\r\n", "\n")
+    else:
+        result = '"'
+
+    pos = seq_start = 0
+    while True:
+        try:
+            char = s[pos]
+        except IndexError:
+            result += s[seq_start:pos]
+            if do_multiline:
+                return result + '"""'
+            return result + '"'
+        if char in _writer.ILLEGAL_BASIC_STR_CHARS:
+            result += s[seq_start:pos]
+            if char in _writer.COMPACT_ESCAPES:
+                if do_multiline and char == "\n":
+                    result += "\n"
+                else:
+                    result += _writer.COMPACT_ESCAPES[char]
+            else:
+                result += "\\u" + hex(ord(char))[2:].rjust(4, "0")
+            seq_start = pos + 1
+        pos += 1
+
+
+def make_config(packages, output_lines, seed=0):
+    """A cresp.toml-like config with a package inventory, prose and captured command output."""
+    rng = random.Random(seed)
+    words = ["reproducible", "experiment", "tensor", "gradient", "sample", "données", "測定", "α-helix"]
+    description = " ".join(rng.choice(words) for _ in range(20000))
+    output = "\n".join(
+        f"[{i:05d}] step={i} loss={rng.random():.6f} path=C:\\runs\\{i}\t\"ok\"" + ("\r" if i % 7 == 0 else "")
+        + ("\x1b[0m" if i % 11 == 0 else "")
+        for i in range(output_lines)
+    )
+    return {
+        "experiment": {
+            "name": "Benchmark",
+            "description": description,
+            "environment": {
+                "system": {
+                    "packages": [
+                        {"name": f"lib{i}-dev", "version": f"{i % 9}.{i % 97}.{i}", "source": "apt",
+                         "summary": f"Library {i} with \"quotes\" and a backslash \\ in its summary"}
+                        for i in range(packages)
+                    ],
+                },
+            },
+        },
+        "execution": {"log": output, "command": "python -m src.main --input \"data/raw.csv\""},
+    }
+
+
+def time_dumps(config, multiline_strings, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = tomli_w.dumps(config, multiline_strings=multiline_strings)
+        best = min(best, time.perf_counter() - start)
+    return text, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--packages", type=int, default=5000, help="Entries in system.packages")
+    parser.add_argument("--output-lines", type=int, default=2000, help="Lines of captured command output")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported")
+    args = parser.parse_args(argv)
+
+    config = make_config(args.packages, args.output_lines)
+    current = _writer.format_string
+    failed = False
+    for multiline_strings in (False, True):
+        _writer.format_string = reference_format_string
+        try:
+            expected, reference_seconds = time_dumps(config, multiline_strings, args.repeat)
+        finally:
+            _writer.format_string = current
+        text, seconds = time_dumps(config, multiline_strings, args.repeat)
+        identical = text.encode() == expected.encode()
+        failed = failed or not identical
+        print(f"multiline_strings={multiline_strings!s:5}  {len(text) / 1e6:6.2f} MB  "
+              f"reference {reference_seconds * 1000:8.1f} ms  current {seconds * 1000:8.1f} ms  "
+              f"speed-up {reference_seconds / seconds:5.1f}x  identical={identical}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
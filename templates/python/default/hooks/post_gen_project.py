@@ -7,9 +7,16 @@ This script runs after the project is generated.
 """
 
 import os
+import re
 import sys
 import json
+import time
 import shutil
+import hashlib
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 # Get cookiecutter configuration
@@ -25,6 +32,23 @@ include_tests = "{{ cookiecutter.include_tests }}" == "True"
 with_cuda = "{{ cookiecutter.with_cuda }}" == "True"
 license_choice = "{{ cookiecutter.open_source_license }}"
 
+# Modules in src/ that depend on NumPy/pandas
+DATA_ANALYSIS_MODULES = [
+    "array_store.py",
+    "arrow_dataset.py",
+    "columnar_cache.py",
+    "quantiles.py",
+    "shards.py",
+    "streaming_stats.py",
+    "synthetic.py",
+    "wide_correlation.py",
+]
+
+# Modules that need both the data analysis and the visualization libraries
+VISUALIZATION_MODULES = [
+    "rendering.py",
+]
+
 # Colors for terminal output
 TERMCOLOR_BLUE = "\033[94m"
 TERMCOLOR_GREEN = "\033[92m"
@@ -118,6 +142,7 @@ def update_pyproject_toml():
                 'pandas = "^2.0.0"',
                 'numpy = "^1.24.0"',
                 'scipy = "^1.10.0"',
+                'pyarrow = "^14.0.0"',
             ])
         
         # Jupyter
@@ -196,6 +221,7 @@ def update_environment_yml():
         if include_data_analysis:
             conda_packages.append("  - numpy")
             conda_packages.append("  - pandas")
+            conda_packages.append("  - pyarrow")
         
         if conda_packages:
             package_str = "\n".join(conda_packages)
@@ -291,6 +317,20 @@ def clean_optional_components():
         print_info("Removing tests directory (not requested)")
         shutil.rmtree("tests", ignore_errors=True)
     
+    # Remove modules that need the data analysis libraries
+    if not include_data_analysis:
+        for module in DATA_ANALYSIS_MODULES:
+            module_path = Path("src") / module
+            if module_path.exists():
+                print_info(f"Removing src/{module} (requires data analysis libraries)")
+                module_path.unlink()
+    if not (include_data_analysis and include_visualization):
+        for module in VISUALIZATION_MODULES:
+            module_path = Path("src") / module
+            if module_path.exists():
+                print_info(f"Removing src/{module} (requires data analysis and visualization libraries)")
+                module_path.unlink()
+    
     # Adjust main.py based on selections
     if not (include_visualization and include_data_analysis):
         try:
@@ -323,258 +363,709 @@ def clean_optional_components():
         except Exception as e:
             print_warning(f"Could not adjust main.py: {e}")
 
-def write_toml_preserving_format(config, file_path):
-    """Write TOML file while preserving format and structure."""
+def dump_toml(config, file_path):
+    """Write config to file_path as a new TOML document (comments and layout are lost)."""
     try:
         # First try to use tomli_w if available (better formatting)
         try:
             import tomli_w
             with open(file_path, 'wb') as f:
                 tomli_w.dump(config, f)
-            return True
+            return
         except ImportError:
             pass
-            
-        # If tomli_w not available, use standard toml but with a custom approach to preserve format
+
         import toml
-        import re
-        
-        # Get the original file content to analyze structure
-        if file_path.exists():
-            with open(file_path, 'r') as f:
-                original_content = f.read()
-        else:
-            original_content = ""
-            
-        # Get the raw toml output
-        toml_content = toml.dumps(config)
-        
-        # Try to preserve whitespace between major sections (simple approach)
-        if original_content:
-            # Find section headers in original content and preserve their spacing
-            section_headers = re.findall(r'(\n\n+)(\[.*?\])', original_content)
-            
-            # Replace in the new content
-            for spacing, header in section_headers:
-                # Escape header for regex
-                escaped_header = re.escape(header)
-                # Look for the header with any preceding whitespace and replace with proper spacing
-                toml_content = re.sub(r'\n+' + escaped_header, spacing + header, toml_content)
-                
-        # Write the modified content
         with open(file_path, 'w') as f:
-            f.write(toml_content)
-            
+            toml.dump(config, f)
+    except Exception as e:
+        print_warning(f"Could not write {file_path}: {e}")
+
+
+def parse_toml(text):
+    """Parse TOML text with tomllib, tomli or toml, whichever is installed."""
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            import toml
+            return toml.loads(text)
+    return tomllib.loads(text)
+
+
+TOML_BARE_KEY = re.compile(r"[A-Za-z0-9_-]+")
+TOML_BASIC_STRING = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+TOML_LITERAL_STRING = re.compile(r"'[^'\n]*'")
+TOML_SCALAR = re.compile(r"[^\s,\]\}#]+")
+TOML_TIME = re.compile(r" \d\d:\d\d[^\s,\]\}#]*")
+TOML_BLANK = re.compile(r"[ \t]*")
+TOML_BLANK_LINES = re.compile(r"(?:\s+|#[^\n]*)*")
+
+
+class TomlIndex:
+    """
+    Locations of the values in a TOML document, found in a single pass.
+
+    spans maps the path of every value (a tuple of keys, with list indices
+    for array elements and arrays of tables) to its (start, end) offsets in
+    the text; lines maps the path of every key/value pair to the lines it
+    occupies; tables maps the path of every [table] to the offset after its
+    last key/value pair, where new keys can be inserted.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.spans = {}
+        self.lines = {}
+        self.tables = {(): 0}
+        self.array_tables = {}
+        self._index()
+
+    def _skip(self, pos, pattern=TOML_BLANK_LINES):
+        return pattern.match(self.text, pos).end()
+
+    def _error(self, pos, message):
+        line = self.text.count("\n", 0, pos) + 1
+        return ValueError(f"{message} at line {line}")
+
+    def _key(self, pos):
+        """Parse a possibly dotted key; return its parts and the position after it."""
+        parts = []
+        while True:
+            pos = self._skip(pos, TOML_BLANK)
+            for pattern in (TOML_BARE_KEY, TOML_BASIC_STRING, TOML_LITERAL_STRING):
+                match = pattern.match(self.text, pos)
+                if match:
+                    break
+            else:
+                raise self._error(pos, "Expected a key")
+            part = match.group()
+            if part[0] == '"':
+                part = json.loads(part)
+            elif part[0] == "'":
+                part = part[1:-1]
+            parts.append(part)
+            pos = self._skip(match.end(), TOML_BLANK)
+            if self.text.startswith(".", pos):
+                pos += 1
+            else:
+                return tuple(parts), pos
+
+    def _multiline_string(self, pos, quote):
+        """End of a multi-line string starting at pos."""
+        search = pos + 3
+        while True:
+            end = self.text.find(quote * 3, search)
+            if end < 0:
+                raise self._error(pos, "Unterminated string")
+            backslashes = 0
+            while quote == '"' and self.text[end - 1 - backslashes] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                # Up to two quotes may directly precede the closing delimiter
+                run = 3
+                while run < 5 and self.text.startswith(quote, end + run):
+                    run += 1
+                return end + run
+            search = end + 1
+
+    def _value(self, pos, path):
+        """Parse the value at pos, recording the spans of it and of everything inside it."""
+        text = self.text
+        char = text[pos:pos + 1]
+        if text.startswith('"""', pos) or text.startswith("'''", pos):
+            end = self._multiline_string(pos, char)
+        elif char == '"':
+            match = TOML_BASIC_STRING.match(text, pos)
+            if not match:
+                raise self._error(pos, "Invalid string")
+            end = match.end()
+        elif char == "'":
+            match = TOML_LITERAL_STRING.match(text, pos)
+            if not match:
+                raise self._error(pos, "Invalid string")
+            end = match.end()
+        elif char == "[":
+            end = self._skip(pos + 1)
+            index = 0
+            while not text.startswith("]", end):
+                end = self._skip(self._value(end, path + (index,)))
+                index += 1
+                if text.startswith(",", end):
+                    end = self._skip(end + 1)
+                elif not text.startswith("]", end):
+                    raise self._error(end, "Expected , or ] in array")
+            end += 1
+        elif char == "{":
+            end = self._skip(pos + 1)
+            while not text.startswith("}", end):
+                keys, end = self._key(end)
+                if not text.startswith("=", end):
+                    raise self._error(end, "Expected = in inline table")
+                end = self._skip(self._value(self._skip(end + 1), path + keys))
+                if text.startswith(",", end):
+                    end = self._skip(end + 1)
+                elif not text.startswith("}", end):
+                    raise self._error(end, "Expected , or } in inline table")
+            end += 1
+        else:
+            match = TOML_SCALAR.match(text, pos)
+            if not match:
+                raise self._error(pos, "Expected a value")
+            end = match.end()
+            # Local date-times may separate the date and the time with a space
+            time_match = TOML_TIME.match(text, end)
+            if time_match and re.fullmatch(r"\d{4}-\d\d-\d\d", match.group()):
+                end = time_match.end()
+        self.spans[path] = (pos, end)
+        return end
+
+    def _index(self):
+        text = self.text
+        table = ()
+        pos = self._skip(0)
+        while pos < len(text):
+            line_start = text.rfind("\n", 0, pos) + 1
+            if text.startswith("[[", pos):
+                keys, pos = self._key(pos + 2)
+                if not text.startswith("]]", pos):
+                    raise self._error(pos, "Expected ]]")
+                index = self.array_tables.get(keys, 0)
+                self.array_tables[keys] = index + 1
+                table = keys + (index,)
+                pos += 2
+            elif text.startswith("[", pos):
+                keys, pos = self._key(pos + 1)
+                if not text.startswith("]", pos):
+                    raise self._error(pos, "Expected ]")
+                table = keys
+                pos += 1
+            else:
+                keys, pos = self._key(pos)
+                if not text.startswith("=", pos):
+                    raise self._error(pos, "Expected =")
+                pos = self._value(self._skip(pos + 1, TOML_BLANK), table + keys)
+            # Rest of the line: blanks and an optional comment
+            pos = self._skip(pos, TOML_BLANK)
+            if text.startswith("#", pos):
+                pos = text.find("\n", pos)
+                pos = len(text) if pos < 0 else pos
+            if pos < len(text) and text[pos] not in "\r\n":
+                raise self._error(pos, "Expected the end of the line")
+            line_end = text.find("\n", pos)
+            line_end = len(text) if line_end < 0 else line_end + 1
+            if keys and text[line_start:line_start + 1] != "[":
+                self.lines[table + keys] = (line_start, line_end)
+            self.tables[table] = line_end
+            pos = self._skip(line_end)
+
+
+def format_toml_key(key):
+    """A TOML key, quoted unless it is a bare key."""
+    return key if TOML_BARE_KEY.fullmatch(key) else json.dumps(key, ensure_ascii=False)
+
+
+def format_toml_value(value):
+    """A value in inline TOML syntax: tables become inline tables."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        items = ", ".join(f"{format_toml_key(k)} = {format_toml_value(v)}" for k, v in value.items())
+        return "{ " + items + " }"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(format_toml_value(v) for v in value) + "]"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Cannot write {type(value).__name__} as TOML")
+
+
+def collect_toml_edits(old, new, path, index, edits):
+    """
+    Add the (start, end, replacement) edits that turn the value old at path into new.
+
+    Values that changed are rewritten where they stand, containers only
+    in the parts that changed. Returns False if the change needs a
+    layout the index cannot express (e.g. a new [table]).
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        if old == new:
+            return True
+        inline = path in index.spans
+        checkpoint = len(edits)
+        for key in old:
+            if key not in new:
+                if inline or path + (key,) not in index.lines:
+                    break
+                start, end = index.lines[path + (key,)]
+                edits.append((start, end, ""))
+        else:
+            for key, value in new.items():
+                if key in old:
+                    if not collect_toml_edits(old[key], value, path + (key,), index, edits):
+                        break
+                elif not inline and path in index.tables:
+                    edits.append((index.tables[path], index.tables[path],
+                                  f"{format_toml_key(key)} = {format_toml_value(value)}\n"))
+                else:
+                    break
+            else:
+                return True
+        # Rewrite the whole inline table instead
+        del edits[checkpoint:]
+        if not inline:
+            return False
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        if old == new:
+            return True
+        checkpoint = len(edits)
+        if all(collect_toml_edits(o, n, path + (i,), index, edits) for i, (o, n) in enumerate(zip(old, new))):
+            return True
+        del edits[checkpoint:]
+    elif type(old) is type(new) and old == new:
         return True
+
+    if path not in index.spans:
+        return False
+    start, end = index.spans[path]
+    edits.append((start, end, format_toml_value(new)))
+    return True
+
+
+def patch_toml(text, config):
+    """
+    Return text with its values updated to those of config.
+
+    Comments, blank lines and the layout of unchanged values are kept: the
+    document is indexed once and only the values that differ from config
+    are replaced, so the cost is linear in the size of the document.
+    Returns None if config cannot be expressed as a patch of text.
+    """
+    index = TomlIndex(text)
+    edits = []
+    if not collect_toml_edits(parse_toml(text), config, (), index, edits):
+        return None
+    # Edits never overlap; insertions at one offset keep their order
+    edits.sort(key=lambda edit: edit[0])
+    pieces = []
+    pos = 0
+    for start, end, replacement in edits:
+        pieces.append(text[pos:start])
+        pieces.append(replacement)
+        pos = end
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+
+def write_toml_preserving_format(config, file_path):
+    """
+    Write config to a TOML file, keeping the comments and layout of the existing file.
+
+    Falls back to writing a new document (dump_toml) if the file does not
+    exist or config cannot be written as an in-place patch of it.
+    """
+    file_path = Path(file_path)
+    try:
+        if file_path.exists():
+            with open(file_path, 'r') as f:
+                patched = patch_toml(f.read(), config)
+            if patched is not None and parse_toml(patched) == config:
+                with open(file_path, 'w') as f:
+                    f.write(patched)
+                return True
     except Exception as e:
         print_warning(f"Error preserving TOML format: {e}")
-        
-        # Fallback to standard toml dump
-        import toml
-        with open(file_path, 'w') as f:
-            toml.dump(config, f)
-        return False
+    dump_toml(config, file_path)
+    return False
+
+# Seconds each external command may take while probing the environment
+PROBE_TIMEOUT = 5
+
+
+def run_probe_command(command, timeout=PROBE_TIMEOUT):
+    """Run a probe command; return its output, or None if it is missing, fails or times out."""
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print_warning(f"{command[0]} did not answer within {timeout}s, skipping it")
+        return None
+    except OSError:
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def read_text(path):
+    """Contents of a small system file such as /proc/meminfo, or None."""
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def format_memory_size(n_bytes):
+    """Format a size the way ``free -h`` does, e.g. 15Gi or 7.7Gi."""
+    size = float(n_bytes)
+    for unit in ("B", "Ki", "Mi", "Gi", "Ti"):
+        if size < 1024 or unit == "Ti":
+            break
+        size /= 1024
+    return f"{size:.1f}{unit}" if size < 10 else f"{size:.0f}{unit}"
+
+
+def probe_system():
+    """Operating system information."""
+    return {
+        "name": platform.system(),
+        "version": platform.version(),
+        "kernel": platform.release(),
+        "architecture": platform.machine(),
+        "locale": os.environ.get('LANG', 'en_US.UTF-8'),
+        "timezone": datetime.now().astimezone().tzname() or "UTC",
+    }
+
+
+def probe_cpu():
+    """CPU model, physical cores, threads and frequency."""
+    cpu_info = {"model": "", "architecture": platform.machine(), "cores": 0, "threads": 0, "frequency": ""}
+    system = platform.system()
+    if system == "Linux":
+        cpuinfo = read_text("/proc/cpuinfo")
+        if cpuinfo is not None:
+            cores = set()
+            for block in cpuinfo.strip().split("\n\n"):
+                fields = {}
+                for line in block.splitlines():
+                    key, _, value = line.partition(":")
+                    fields[key.strip()] = value.strip()
+                if "processor" not in fields:
+                    continue
+                cpu_info["threads"] += 1
+                cpu_info["model"] = cpu_info["model"] or fields.get("model name", "")
+                if not cpu_info["frequency"] and fields.get("cpu MHz"):
+                    cpu_info["frequency"] = fields["cpu MHz"] + " MHz"
+                cores.add((fields.get("physical id"), fields.get("core id", fields["processor"])))
+            cpu_info["cores"] = len(cores)
+            if not cpu_info["frequency"]:
+                max_khz = read_text("/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq")
+                if max_khz and max_khz.strip().isdigit():
+                    cpu_info["frequency"] = f"{int(max_khz) / 1000:.0f} MHz"
+        else:
+            output = run_probe_command(["lscpu"]) or ""
+            for line in output.splitlines():
+                key, _, value = line.partition(":")
+                key, value = key.strip(), value.strip()
+                if key == "Model name":
+                    cpu_info["model"] = value
+                elif key == "CPU(s)":
+                    cpu_info["threads"] = int(value)
+                elif key == "Core(s) per socket":
+                    cpu_info["cores"] = int(value)
+                elif key == "CPU MHz":
+                    cpu_info["frequency"] = value + " MHz"
+    elif system == "Darwin":  # macOS
+        values = {}
+        for key in ("machdep.cpu.brand_string", "hw.physicalcpu", "hw.logicalcpu", "hw.cpufrequency_max"):
+            output = run_probe_command(["sysctl", "-n", key])
+            if output:
+                values[key] = output.strip()
+        cpu_info["model"] = values.get("machdep.cpu.brand_string", "")
+        try:
+            cpu_info["cores"] = int(values.get("hw.physicalcpu", 0))
+            cpu_info["threads"] = int(values.get("hw.logicalcpu", 0))
+            if "hw.cpufrequency_max" in values:
+                cpu_info["frequency"] = f"{int(values['hw.cpufrequency_max']) / 1000000:.0f} MHz"
+        except ValueError:
+            pass
+    elif system == "Windows":
+        output = run_probe_command(["wmic", "cpu", "get", "Name,NumberOfCores,NumberOfLogicalProcessors,MaxClockSpeed",
+                                    "/format:csv"])
+        lines = output.strip().split('\n') if output else []
+        if len(lines) >= 2:  # Skip header line
+            parts = lines[1].split(',')
+            if len(parts) >= 5:  # First part is Node
+                cpu_info["model"] = parts[1].strip()
+                cpu_info["cores"] = int(parts[2].strip())
+                cpu_info["threads"] = int(parts[3].strip())
+                cpu_info["frequency"] = f"{parts[4].strip()} MHz"
+    return cpu_info
+
+
+def probe_memory():
+    """Total physical memory."""
+    memory_info = {"size": ""}
+    system = platform.system()
+    if system == "Linux":
+        meminfo = read_text("/proc/meminfo")
+        if meminfo is not None:
+            for line in meminfo.splitlines():
+                if line.startswith("MemTotal:"):
+                    memory_info["size"] = format_memory_size(int(line.split()[1]) * 1024)
+        else:
+            for line in (run_probe_command(["free", "-h"]) or "").splitlines():
+                if line.startswith("Mem:"):
+                    memory_info["size"] = line.split()[1].strip()
+    elif system == "Darwin":  # macOS
+        output = run_probe_command(["sysctl", "-n", "hw.memsize"])
+        if output and output.strip().isdigit():
+            memory_info["size"] = f"{int(output) / 1024 ** 3:.1f} GB"
+    elif system == "Windows":
+        output = run_probe_command(["wmic", "computersystem", "get", "TotalPhysicalMemory", "/format:csv"])
+        lines = output.strip().split('\n') if output else []
+        if len(lines) >= 2:
+            parts = lines[1].split(',')
+            if len(parts) >= 2 and parts[1].strip().isdigit():  # First part is Node
+                memory_info["size"] = f"{int(parts[1]) / 1024 ** 3:.1f} GB"
+    return memory_info
+
+
+def probe_gpu():
+    """Model, memory and driver version of the first NVIDIA GPU."""
+    gpu_info = {}
+    if shutil.which("nvidia-smi"):
+        output = run_probe_command(["nvidia-smi", "--query-gpu=name,memory.total,driver_version",
+                                    "--format=csv,noheader"])
+        parts = output.strip().split('\n')[0].split(',') if output else []
+        if len(parts) >= 3:
+            gpu_info = {"model": parts[0].strip(), "memory": parts[1].strip(), "driver_version": parts[2].strip()}
+    if "driver_version" not in gpu_info:
+        # The kernel module reports its version without starting nvidia-smi
+        match = re.search(r"Kernel Module\s+(\S+)", read_text("/proc/driver/nvidia/version") or "")
+        if match:
+            gpu_info["driver_version"] = match.group(1)
+    if not gpu_info:
+        print_warning("NVIDIA GPU info could not be retrieved. Is nvidia-smi installed?")
+    return gpu_info
+
+
+def probe_conda_version():
+    """Version of conda, read from its installation's package records if possible."""
+    conda = os.environ.get("CONDA_EXE") or shutil.which("conda")
+    if not conda:
+        return ""
+    # <root>/bin/conda or <root>/condabin/conda; conda-meta lists conda-<version>-<build>.json
+    root = Path(conda).resolve().parent.parent
+    for record in sorted(root.glob("conda-meta/conda-[0-9]*.json")):
+        return record.name.split("-")[1]
+    output = run_probe_command([conda, "--version"])
+    return output.strip().split()[-1] if output else ""
+
+
+def probe_cuda_version():
+    """CUDA toolkit version (major.minor), read from the toolkit's version file if possible."""
+    cuda_home = os.environ.get("CUDA_HOME") or os.environ.get("CUDA_PATH")
+    nvcc = shutil.which("nvcc")
+    if not cuda_home and nvcc:
+        cuda_home = str(Path(nvcc).resolve().parent.parent)
+    if cuda_home:
+        try:
+            with open(Path(cuda_home) / "version.json", "r") as f:
+                return ".".join(json.load(f)["cuda"]["version"].split(".")[:2])
+        except (OSError, ValueError, KeyError):
+            pass
+        match = re.search(r"CUDA Version (\d+\.\d+)", read_text(Path(cuda_home) / "version.txt") or "")
+        if match:
+            return match.group(1)
+    if nvcc:
+        match = re.search(r"release (\d+\.\d+)", run_probe_command([nvcc, "--version"]) or "")
+        if match:
+            return match.group(1)
+    return ""
+
+
+def probe_environment(with_cuda=False):
+    """
+    Probe the machine concurrently.
+
+    Every probe reads /proc, sysfs or package records where it can, and
+    each external command it has to run is killed after PROBE_TIMEOUT
+    seconds, so a slow or hung tool cannot stall project generation.
+
+    Returns a dict with the keys system, cpu, memory, python, conda and,
+    for CUDA projects, gpu and cuda; a probe that failed gives None.
+    """
+    probes = {
+        "system": probe_system,
+        "cpu": probe_cpu,
+        "memory": probe_memory,
+        "python": platform.python_version,
+        "conda": probe_conda_version,
+    }
+    if with_cuda:
+        probes["gpu"] = probe_gpu
+        probes["cuda"] = probe_cuda_version
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(probes)) as pool:
+        futures = {name: pool.submit(probe) for name, probe in probes.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print_warning(f"Could not probe {name}: {e}")
+                results[name] = None
+    return results
+
+
+# Probed environments are cached per host; set CRESP_REFRESH_ENVIRONMENT=1 to probe again
+PROBE_CACHE_TTL = 24 * 3600
+CACHE_TTL_ENV = "CRESP_ENVIRONMENT_CACHE_TTL"
+REFRESH_ENV = "CRESP_REFRESH_ENVIRONMENT"
+
+
+def user_cache_dir():
+    """Per-user cache directory of cresp (XDG_CACHE_HOME, ~/Library/Caches or LOCALAPPDATA)."""
+    if os.environ.get("CRESP_CACHE_DIR"):
+        return Path(os.environ["CRESP_CACHE_DIR"])
+    system = platform.system()
+    if system == "Darwin":
+        return Path.home() / "Library" / "Caches" / "cresp"
+    if system == "Windows" and os.environ.get("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "cresp" / "Cache"
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "cresp"
+
+
+def file_mtime(path):
+    """Modification time of path in nanoseconds, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def host_fingerprint(with_cuda=False):
+    """
+    Identify this host and the state of the tools the probes read.
+
+    The machine-id and boot-id change when the cached environment can no
+    longer be trusted (another machine sharing the home directory, a reboot
+    onto a new kernel or driver), and so do the mtimes of the probed tools
+    when one of them is upgraded.
+    """
+    machine_id = read_text("/etc/machine-id") or read_text("/var/lib/dbus/machine-id") or ""
+    boot_id = read_text("/proc/sys/kernel/random/boot_id") or ""
+    tools = {}
+    for name in ("lscpu", "free", "sysctl", "wmic", "conda", "nvidia-smi", "nvcc"):
+        tools[name] = file_mtime(shutil.which(name))
+    conda = os.environ.get("CONDA_EXE") or shutil.which("conda")
+    if conda:
+        # Updating conda rewrites its package records rather than the entry point
+        tools["conda-meta"] = file_mtime(Path(conda).resolve().parent.parent / "conda-meta")
+    cuda_home = os.environ.get("CUDA_HOME") or os.environ.get("CUDA_PATH")
+    if cuda_home:
+        tools["cuda"] = file_mtime(Path(cuda_home) / "version.json") or file_mtime(Path(cuda_home) / "version.txt")
+    tools["python"] = file_mtime(sys.executable)
+    return {
+        "node": platform.node(),
+        "machine_id": machine_id.strip(),
+        "boot_id": boot_id.strip(),
+        "with_cuda": with_cuda,
+        "locale": os.environ.get("LANG", ""),
+        "tz": os.environ.get("TZ", ""),
+        "tools": tools,
+    }
+
+
+def cached_probe_environment(with_cuda=False, refresh=None, ttl=None):
+    """
+    probe_environment, reusing the result of an earlier run on this host.
+
+    Results are kept in the user cache directory, one file per host
+    fingerprint (see host_fingerprint), for ttl seconds
+    (CRESP_ENVIRONMENT_CACHE_TTL, by default a day; 0 disables the cache).
+    refresh, or CRESP_REFRESH_ENVIRONMENT=1, ignores the cached result and
+    probes again. Problems with the cache are never fatal.
+    """
+    if ttl is None:
+        ttl = os.environ.get(CACHE_TTL_ENV, PROBE_CACHE_TTL)
+        try:
+            ttl = int(ttl)
+        except ValueError:
+            print_warning(f"{CACHE_TTL_ENV}={ttl!r} is not a number of seconds; using {PROBE_CACHE_TTL}")
+            ttl = PROBE_CACHE_TTL
+    if refresh is None:
+        refresh = os.environ.get(REFRESH_ENV, "").lower() in ("1", "true", "yes")
+    if ttl <= 0:
+        return probe_environment(with_cuda)
+
+    fingerprint = host_fingerprint(with_cuda)
+    key = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()[:32]
+    cache_dir = user_cache_dir() / "environment"
+    cache_file = cache_dir / f"{key}.json"
+    now = time.time()
+
+    if not refresh:
+        try:
+            with open(cache_file, "r") as f:
+                entry = json.load(f)
+            if entry["fingerprint"] == fingerprint and 0 <= now - entry["created"] < ttl:
+                print_info("Using cached system information (set CRESP_REFRESH_ENVIRONMENT=1 to probe again).")
+                return entry["environment"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    environment = probe_environment(with_cuda)
+    if any(value is None for value in environment.values()):
+        return environment  # do not cache a failed probe
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        with open(temp_file, "w") as f:
+            json.dump({"fingerprint": fingerprint, "created": now, "environment": environment}, f, indent=2)
+        os.replace(temp_file, cache_file)
+        # Drop entries of earlier boots and upgraded tools
+        for old in cache_dir.glob("*.json"):
+            if old != cache_file and now - old.stat().st_mtime > ttl:
+                old.unlink()
+    except OSError as e:
+        print_warning(f"Could not cache system information in {cache_dir}: {e}")
+    return environment
+
+
+def apply_environment(config, environment):
+    """Write the results of probe_environment into the experiment.environment tables of config."""
+    tables = config.get("experiment", {}).get("environment", {})
+    if "system" in tables and environment.get("system"):
+        tables["system"]["os"] = environment["system"]
+    if "hardware" in tables:
+        hardware = tables["hardware"]
+        if environment.get("cpu"):
+            hardware.setdefault("cpu", {}).update(environment["cpu"])
+        if environment.get("memory"):
+            hardware.setdefault("memory", {}).update(environment["memory"])
+        gpu = environment.get("gpu")
+        if gpu and "gpu" in hardware:
+            hardware["gpu"]["default_model"]["model"] = gpu.get("model", hardware["gpu"]["default_model"]["model"])
+            hardware["gpu"]["default_model"]["memory"] = gpu.get("memory", hardware["gpu"]["default_model"]["memory"])
+            hardware["gpu"]["driver_version"] = gpu.get("driver_version", hardware["gpu"]["driver_version"])
+    if "software" in tables:
+        software = tables["software"]
+        if environment.get("python"):
+            software["python"]["version"] = environment["python"]
+        if environment.get("conda") and "conda" in software:
+            software["conda"]["version"] = environment["conda"]
+        if environment.get("cuda") and "cuda" in software:
+            software["cuda"]["version"] = environment["cuda"]
+
 
 def update_cresp_toml():
     """Update cresp.toml with system information."""
     try:
-        import platform
-        import os
-        import toml
-        import json
-        import subprocess
-        from datetime import datetime
-        
         cresp_toml_path = Path("cresp.toml")
         if cresp_toml_path.exists():
             print_info("Updating cresp.toml with system information...")
             
             # Parse existing cresp.toml
             with open(cresp_toml_path, 'r') as f:
-                config = toml.load(f)
-            
-            # Add system information
-            system_info = {
-                "name": platform.system(),
-                "version": platform.version(),
-                "kernel": platform.release(),
-                "architecture": platform.machine(),
-                "locale": os.environ.get('LANG', 'en_US.UTF-8'),
-                "timezone": datetime.now().astimezone().tzname() or "UTC",
-            }
+                config = parse_toml(f.read())
             
-            # Update config with system information
-            if "experiment" in config and "environment" in config["experiment"] and "system" in config["experiment"]["environment"]:
-                config["experiment"]["environment"]["system"]["os"] = system_info
-            
-            # Update hardware information
-            if "experiment" in config and "environment" in config["experiment"] and "hardware" in config["experiment"]["environment"]:
-                # CPU info
-                cpu_info = {"model": "", "architecture": platform.machine(), "cores": 0, "threads": 0, "frequency": ""}
-                
-                try:
-                    # Try to get more detailed CPU info based on platform
-                    if platform.system() == "Linux":
-                        # On Linux, use lscpu
-                        try:
-                            cpu_data = subprocess.run(["lscpu"], capture_output=True, text=True)
-                            if cpu_data.returncode == 0:
-                                for line in cpu_data.stdout.splitlines():
-                                    if "Model name" in line:
-                                        cpu_info["model"] = line.split(":", 1)[1].strip()
-                                    elif "CPU(s)" == line.split(":", 1)[0].strip():
-                                        cpu_info["threads"] = int(line.split(":", 1)[1].strip())
-                                    elif "Core(s) per socket" in line:
-                                        cores_per_socket = int(line.split(":", 1)[1].strip())
-                                        cpu_info["cores"] = cores_per_socket
-                                    elif "CPU MHz" in line:
-                                        cpu_info["frequency"] = line.split(":", 1)[1].strip() + " MHz"
-                        except:
-                            pass
-                    elif platform.system() == "Darwin":  # macOS
-                        # On macOS, use sysctl
-                        try:
-                            model = subprocess.run(["sysctl", "-n", "machdep.cpu.brand_string"], 
-                                                 capture_output=True, text=True)
-                            if model.returncode == 0:
-                                cpu_info["model"] = model.stdout.strip()
-                            
-                            cores = subprocess.run(["sysctl", "-n", "hw.physicalcpu"], 
-                                                capture_output=True, text=True)
-                            if cores.returncode == 0:
-                                cpu_info["cores"] = int(cores.stdout.strip())
-                            
-                            threads = subprocess.run(["sysctl", "-n", "hw.logicalcpu"], 
-                                                  capture_output=True, text=True)
-                            if threads.returncode == 0:
-                                cpu_info["threads"] = int(threads.stdout.strip())
-                            
-                            # Frequency is not directly available, but we can approximate
-                            freq = subprocess.run(["sysctl", "-n", "hw.cpufrequency_max"], 
-                                               capture_output=True, text=True)
-                            if freq.returncode == 0:
-                                try:
-                                    freq_mhz = int(freq.stdout.strip()) / 1000000
-                                    cpu_info["frequency"] = f"{freq_mhz:.0f} MHz"
-                                except:
-                                    pass
-                        except:
-                            pass
-                    elif platform.system() == "Windows":
-                        # On Windows, use WMIC
-                        try:
-                            wmic_cpu = subprocess.run(["wmic", "cpu", "get", "Name,NumberOfCores,NumberOfLogicalProcessors,MaxClockSpeed", "/format:csv"], 
-                                                    capture_output=True, text=True)
-                            if wmic_cpu.returncode == 0:
-                                lines = wmic_cpu.stdout.strip().split('\n')
-                                if len(lines) >= 2:  # Skip header line
-                                    parts = lines[1].split(',')
-                                    if len(parts) >= 5:  # First part is Node
-                                        cpu_info["model"] = parts[1].strip()
-                                        cpu_info["cores"] = int(parts[2].strip())
-                                        cpu_info["threads"] = int(parts[3].strip())
-                                        cpu_info["frequency"] = f"{parts[4].strip()} MHz"
-                        except:
-                            pass
-                except Exception as e:
-                    print_warning(f"Could not get detailed CPU info: {e}")
-                
-                # Update CPU info
-                config["experiment"]["environment"]["hardware"]["cpu"] = cpu_info
-                
-                # Memory info
-                memory_info = {"size": "", "type": ""}
-                try:
-                    if platform.system() == "Linux":
-                        mem_data = subprocess.run(["free", "-h"], capture_output=True, text=True)
-                        if mem_data.returncode == 0:
-                            for line in mem_data.stdout.splitlines():
-                                if line.startswith("Mem:"):
-                                    memory_info["size"] = line.split()[1].strip()
-                    elif platform.system() == "Darwin":  # macOS
-                        mem_total = subprocess.run(["sysctl", "-n", "hw.memsize"], 
-                                                capture_output=True, text=True)
-                        if mem_total.returncode == 0:
-                            try:
-                                mem_gb = int(mem_total.stdout.strip()) / (1024 * 1024 * 1024)
-                                memory_info["size"] = f"{mem_gb:.1f} GB"
-                            except:
-                                pass
-                    elif platform.system() == "Windows":
-                        try:
-                            wmic_mem = subprocess.run(["wmic", "computersystem", "get", "TotalPhysicalMemory", "/format:csv"], 
-                                                    capture_output=True, text=True)
-                            if wmic_mem.returncode == 0:
-                                lines = wmic_mem.stdout.strip().split('\n')
-                                if len(lines) >= 2:
-                                    parts = lines[1].split(',')
-                                    if len(parts) >= 2:  # First part is Node
-                                        try:
-                                            mem_gb = int(parts[1].strip()) / (1024 * 1024 * 1024)
-                                            memory_info["size"] = f"{mem_gb:.1f} GB"
-                                        except:
-                                            pass
-                        except:
-                            pass
-                except Exception as e:
-                    print_warning(f"Could not get memory info: {e}")
-                
-                # Update memory info
-                config["experiment"]["environment"]["hardware"]["memory"] = memory_info
-                
-                # GPU info for CUDA projects
-                if "{{ cookiecutter.with_cuda }}" == "True":
-                    gpu_info = config["experiment"]["environment"]["hardware"]["gpu"]
-                    try:
-                        # Try to get GPU info using nvidia-smi
-                        gpu_data = subprocess.run(["nvidia-smi", "--query-gpu=name,memory.total,driver_version", "--format=csv,noheader"], 
-                                                capture_output=True, text=True)
-                        if gpu_data.returncode == 0:
-                            lines = gpu_data.stdout.strip().split('\n')
-                            if lines:
-                                parts = lines[0].split(',')
-                                if len(parts) >= 3:
-                                    gpu_info["default_model"]["model"] = parts[0].strip()
-                                    gpu_info["default_model"]["memory"] = parts[1].strip()
-                                    gpu_info["driver_version"] = parts[2].strip()
-                    except:
-                        print_warning("NVIDIA GPU info could not be retrieved. Is nvidia-smi installed?")
-                    
-                    # Update GPU info
-                    config["experiment"]["environment"]["hardware"]["gpu"] = gpu_info
-            
-            # Update software information
-            if "experiment" in config and "environment" in config["experiment"] and "software" in config["experiment"]["environment"]:
-                # Try to detect Python version
-                python_info = {
-                    "version": platform.python_version(),
-                }
-                config["experiment"]["environment"]["software"]["python"]["version"] = python_info["version"]
-
-                # Try to detect conda version if available
-                try:
-                    conda_process = subprocess.run(["conda", "--version"], capture_output=True, text=True)
-                    if conda_process.returncode == 0:
-                        conda_version = conda_process.stdout.strip().split()[-1]
-                        config["experiment"]["environment"]["software"]["conda"]["version"] = conda_version
-                except:
-                    pass
-                
-                # If using CUDA, try to detect CUDA version
-                if "{{ cookiecutter.with_cuda }}" == "True":
-                    try:
-                        # Try using nvcc
-                        nvcc_process = subprocess.run(["nvcc", "--version"], capture_output=True, text=True)
-                        if nvcc_process.returncode == 0:
-                            version_line = nvcc_process.stdout.strip().split('\n')[-1]
-                            if "release" in version_line.lower():
-                                version_parts = version_line.split(',')
-                                if len(version_parts) >= 2:
-                                    cuda_version = version_parts[1].strip().split()[-1]
-                                    if "cuda" in config["experiment"]["environment"]["software"]:
-                                        config["experiment"]["environment"]["software"]["cuda"]["version"] = cuda_version
-                    except:
-                        pass
+            apply_environment(config, cached_probe_environment(with_cuda))
             
             # Write updated config back to file using the format-preserving function
             write_toml_preserving_format(config, cresp_toml_path)
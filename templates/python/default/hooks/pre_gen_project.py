@@ -19,39 +19,67 @@ include_tests = "{{ cookiecutter.include_tests }}" == "True"
 include_visualization = "{{ cookiecutter.include_visualization }}" == "True"
 include_data_analysis = "{{ cookiecutter.include_data_analysis }}" == "True"
 
-# Validate project name
-if not project_name.strip():
-    print("ERROR: Project name cannot be empty")
-    sys.exit(1)
-
-# Validate project_slug
-if not re.match(r'^[a-z][a-z0-9_]*$', project_slug):
-    print("ERROR: Project slug must start with a letter and contain only lowercase letters, numbers, and underscores")
-    sys.exit(1)
-
-# Validate Python version
-try:
-    major, minor = map(int, python_version.split(".")[:2])
-    if major < 3 or (major == 3 and minor < 8):
-        print(f"WARNING: Python {python_version} is older than the recommended version (3.8+)")
-except (ValueError, AttributeError):
-    print(f"ERROR: Invalid Python version format: {python_version}. Expected format like '3.10'")
-    sys.exit(1)
-
-# Validation for feature combinations
-if not include_data_analysis and include_visualization:
-    print("WARNING: You selected visualization without data analysis libraries. You may want to include both.")
-
-if include_tests and not include_data_analysis:
-    print("NOTE: You selected tests without data analysis libraries. Make sure your tests don't need NumPy/pandas.")
-
-if not include_jupyter and include_visualization:
-    print("NOTE: You selected visualization without Jupyter. Consider including Jupyter for interactive visualization.")
-
-# Check if we're inside a virtual environment
-if "VIRTUAL_ENV" in os.environ:
-    print("NOTE: You are currently in a virtual environment.")
-    print("This project will create a Conda environment. Consider deactivating your current venv first.")
-
-# All checks passed
-print(f"Pre-generation checks passed. Creating project {project_name}...") 
\ No newline at end of file
+def check_options(project_name, project_slug, python_version, include_jupyter, include_tests,
+                  include_visualization, include_data_analysis):
+    """
+    Check a set of template options.
+
+    Returns a list of (level, message) pairs, where level is ERROR,
+    WARNING or NOTE; any ERROR means the project cannot be generated.
+    batch.py applies the same rules to every row of a manifest.
+    """
+    messages = []
+
+    # Validate project name
+    if not project_name.strip():
+        messages.append(("ERROR", "Project name cannot be empty"))
+
+    # Validate project_slug
+    if not re.match(r'^[a-z][a-z0-9_]*$', project_slug):
+        messages.append(("ERROR", "Project slug must start with a letter and contain only lowercase letters, "
+                                  "numbers, and underscores"))
+
+    # Validate Python version
+    try:
+        major, minor = map(int, python_version.split(".")[:2])
+        if major < 3 or (major == 3 and minor < 8):
+            messages.append(("WARNING", f"Python {python_version} is older than the recommended version (3.8+)"))
+    except (ValueError, AttributeError):
+        messages.append(("ERROR", f"Invalid Python version format: {python_version}. Expected format like '3.10'"))
+
+    # Validation for feature combinations
+    if not include_data_analysis and include_visualization:
+        messages.append(("WARNING", "You selected visualization without data analysis libraries. "
+                                    "You may want to include both."))
+
+    if include_tests and not include_data_analysis:
+        messages.append(("NOTE", "You selected tests without data analysis libraries. "
+                                 "Make sure your tests don't need NumPy/pandas."))
+
+    if not include_jupyter and include_visualization:
+        messages.append(("NOTE", "You selected visualization without Jupyter. "
+                                 "Consider including Jupyter for interactive visualization."))
+
+    return messages
+
+
+def main():
+    """Validate the options of the project being generated."""
+    messages = check_options(project_name, project_slug, python_version, include_jupyter, include_tests,
+                             include_visualization, include_data_analysis)
+    for level, message in messages:
+        print(f"{level}: {message}")
+    if any(level == "ERROR" for level, _ in messages):
+        sys.exit(1)
+
+    # Check if we're inside a virtual environment
+    if "VIRTUAL_ENV" in os.environ:
+        print("NOTE: You are currently in a virtual environment.")
+        print("This project will create a Conda environment. Consider deactivating your current venv first.")
+
+    # All checks passed
+    print(f"Pre-generation checks passed. Creating project {project_name}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from collections.abc import Mapping
 from datetime import date, datetime, time
+import re
 from types import MappingProxyType
 
 TYPE_CHECKING = False
@@ -12,6 +13,11 @@ if TYPE_CHECKING:
 
 ASCII_CTRL = frozenset(chr(i) for i in range(32)) | frozenset(chr(127))
 ILLEGAL_BASIC_STR_CHARS = frozenset('"\\') | ASCII_CTRL - frozenset("\t")
+# The same characters as regular expressions; line feeds stay literal in multiline strings
+ILLEGAL_BASIC_STR_RE = re.compile("[" + re.escape("".join(sorted(ILLEGAL_BASIC_STR_CHARS))) + "]")
+ILLEGAL_MULTILINE_STR_RE = re.compile(
+    "[" + re.escape("".join(sorted(ILLEGAL_BASIC_STR_CHARS - frozenset("\n")))) + "]"
+)
 BARE_KEY_CHARS = frozenset(
     "abcdefghijklmnopqrstuvwxyz" "ABCDEFGHIJKLMNOPQRSTUVWXYZ" "0123456789" "-_"
 )
@@ -182,34 +188,22 @@ def format_key_part(part: str) -> str:
     return format_string(part, allow_multiline=False)
 
 
+def _escape_char(match: re.Match[str]) -> str:
+    char = match.group()
+    if char in COMPACT_ESCAPES:
+        return COMPACT_ESCAPES[char]
+    return "\\u" + hex(ord(char))[2:].rjust(4, "0")
+
+
 def format_string(s: str, *, allow_multiline: bool) -> str:
     do_multiline = allow_multiline and "\n" in s
     if do_multiline:
-        result = '"""\n'
         s = s.replace("\r\n", "\n")
-    else:
-        result = '"'
-
-    pos = seq_start = 0
-    while True:
-        try:
-            char = s[pos]
-        except IndexError:
-            result += s[seq_start:pos]
-            if do_multiline:
-                return result + '"""'
-            return result + '"'
-        if char in ILLEGAL_BASIC_STR_CHARS:
-            result += s[seq_start:pos]
-            if char in COMPACT_ESCAPES:
-                if do_multiline and char == "\n":
-                    result += "\n"
-                else:
-                    result += COMPACT_ESCAPES[char]
-            else:
-                result += "\\u" + hex(ord(char))[2:].rjust(4, "0")
-            seq_start = pos + 1
-        pos += 1
+        return '"""\n' + ILLEGAL_MULTILINE_STR_RE.sub(_escape_char, s) + '"""'
+    # Most strings need no escaping and are copied whole
+    if ILLEGAL_BASIC_STR_RE.search(s) is None:
+        return '"' + s + '"'
+    return '"' + ILLEGAL_BASIC_STR_RE.sub(_escape_char, s) + '"'
 
 
 def is_aot(obj: Any) -> bool:
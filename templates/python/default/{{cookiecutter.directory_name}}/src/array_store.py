@@ -0,0 +1,311 @@
+"""
+Dense array inputs without copying.
+
+``load_data`` opens array files through ``open_array``, which never reads
+the data itself:
+
+- ``.npy`` files are memory-mapped.
+- ``.npz`` archives are memory-mapped member by member when they were
+  written uncompressed (``np.savez``). Members of compressed archives
+  (``np.savez_compressed``) have to be decompressed and are loaded into
+  memory with a warning.
+- Zarr stores (``.zarr``) and HDF5 files (``.h5``, ``.hdf5``) are opened
+  lazily when ``zarr`` or ``h5py`` is installed; slicing them reads only
+  the chunks that are touched.
+
+``iter_array_chunks`` cuts an array into row blocks and wraps each one in a
+DataFrame without copying, so the streaming statistics in
+``src/streaming_stats.py`` work on arrays larger than RAM and only page in
+the block being processed. Blocks are aligned to the storage chunks of
+Zarr and HDF5 arrays, so no chunk is decompressed twice.
+
+Column names: the fields of a structured array, or ``0, 1, ...`` for the
+columns of a 2-D array (``value`` for a 1-D array).
+
+HDF5 datasets and column selections are returned as an ``ArrayView``. It
+reads lazily like the array it wraps and closes the HDF5 file it owns on
+``close()``, at the end of a ``with`` block or when it is garbage
+collected.
+"""
+
+from __future__ import annotations
+
+import logging
+import zipfile
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Union
+
+from .utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+zarr = lazy_import("zarr", optional=True)
+h5py = lazy_import("h5py", optional=True)
+
+logger = logging.getLogger(__name__)
+
+ARRAY_SUFFIXES = (".npy", ".npz", ".zarr", ".h5", ".hdf5")
+
+# Default size of the row blocks handed out by iter_array_chunks
+BLOCK_BYTES = 64 * 1024 ** 2
+
+
+def is_array_file(path: Path) -> bool:
+    """True if ``path`` has the suffix of a supported array format."""
+    return Path(path).suffix in ARRAY_SUFFIXES
+
+
+def is_array_like(data: Any) -> bool:
+    """True for NumPy arrays and lazy arrays (Zarr, HDF5) returned by ``open_array``."""
+    return not isinstance(data, (pd.DataFrame, pd.Series)) and all(
+        hasattr(data, name) for name in ("shape", "dtype", "__getitem__")
+    )
+
+
+class ArrayView:
+    """
+    Lazy view of an array, optionally restricted to some columns, that owns its open file.
+
+    Only row indexing (an integer or a slice) is supported; the selected
+    columns are cut from each block that is read.
+
+    Parameters
+    ----------
+    array : array-like
+        Array to read from
+    usecols : List, optional
+        Fields of a structured array or column indices of a 2-D array
+    handle : optional
+        Open file (e.g. ``h5py.File``) closed together with the view
+    """
+
+    def __init__(self, array: Any, usecols: Optional[List[Any]] = None, handle: Any = None):
+        self.array = array
+        self.handle = handle
+        self.usecols = list(usecols) if usecols is not None else None
+        dtype, shape = array.dtype, tuple(array.shape)
+        if self.usecols is not None:
+            if dtype.names:
+                missing = [name for name in self.usecols if name not in dtype.names]
+                if missing:
+                    raise KeyError(f"Fields {missing} not found; available: {list(dtype.names)}")
+                dtype = np.dtype([(name, dtype.fields[name][0]) for name in self.usecols])
+            elif len(shape) == 2:
+                self.usecols = [int(column) for column in self.usecols]
+                if any(not -shape[1] <= column < shape[1] for column in self.usecols):
+                    raise IndexError(f"Column indices {self.usecols} out of range for {shape[1]} columns")
+                shape = (shape[0], len(self.usecols))
+            else:
+                raise ValueError("Columns can only be selected from structured or 2-D arrays")
+        self.dtype = dtype
+        self.shape = shape
+        self.ndim = len(shape)
+        self.chunks = getattr(array, "chunks", None)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, rows: Union[int, slice]) -> np.ndarray:
+        block = np.asarray(self.array[rows])
+        if self.usecols is None:
+            return block
+        if block.dtype.names:
+            return block[self.usecols].astype(self.dtype)
+        return block[..., self.usecols]
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> np.ndarray:
+        return np.asarray(self[:], dtype=dtype)
+
+    def close(self) -> None:
+        """Close the file behind the view; later reads fail."""
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def __enter__(self) -> "ArrayView":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _npz_member(path: Path, key: Optional[str], mmap_mode: str) -> np.ndarray:
+    with zipfile.ZipFile(path) as archive:
+        names = [name[:-4] for name in archive.namelist() if name.endswith(".npy")]
+        if key is None:
+            if not names:
+                raise ValueError(f"{path.name} contains no arrays")
+            key = names[0]
+        if key not in names:
+            raise KeyError(f"Array '{key}' not found in {path.name}; available: {names}")
+        info = archive.getinfo(f"{key}.npy")
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        logger.warning(f"{path.name} is compressed, loading '{key}' into memory")
+        with np.load(path) as archive:
+            return archive[key]
+
+    with open(path, "rb") as f:
+        # The member data follows its local header, whose name and extra
+        # field lengths can differ from the central directory
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        raise ValueError(f"Array '{key}' in {path.name} holds Python objects and cannot be memory-mapped")
+    return np.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape,
+                     order="F" if fortran_order else "C")
+
+
+def open_array(
+    path: Union[str, Path],
+    key: Optional[str] = None,
+    mmap_mode: str = "r",
+    usecols: Optional[List[Any]] = None,
+) -> Any:
+    """
+    Open an array file without reading its contents.
+
+    HDF5 datasets are returned as an ``ArrayView`` that owns the file; use
+    it in a ``with`` block or call ``close()`` to release the file early.
+
+    Parameters
+    ----------
+    path : str or Path
+        ``.npy``, ``.npz``, ``.zarr``, ``.h5`` or ``.hdf5`` file
+    key : str, optional
+        Array inside an ``.npz`` archive, HDF5 file or Zarr group, by
+        default the first one
+    mmap_mode : str, optional
+        Memory-map mode for NumPy files, by default ``"r"`` (read-only)
+    usecols : List, optional
+        Only expose these fields of a structured array or column indices
+        of a 2-D array; the result is then an ``ArrayView``
+
+    Returns
+    -------
+    np.memmap, zarr.Array or ArrayView
+        Array-like object; slicing it reads only the requested part
+    """
+    array = _open(Path(path), key, mmap_mode)
+    if usecols is None:
+        return array
+    if isinstance(array, ArrayView):
+        # The new view takes over the open file
+        view = ArrayView(array.array, usecols, handle=array.handle)
+        array.handle = None
+        return view
+    return ArrayView(array, usecols)
+
+
+def _open(path: Path, key: Optional[str], mmap_mode: str) -> Any:
+    if not path.exists():
+        raise FileNotFoundError(f"No such file or directory: '{path}'")
+    if path.suffix == ".npy":
+        return np.load(path, mmap_mode=mmap_mode)
+    if path.suffix == ".npz":
+        return _npz_member(path, key, mmap_mode)
+    if path.suffix == ".zarr":
+        if zarr is None:
+            raise ImportError("Reading Zarr stores requires zarr. Install with: pip install zarr")
+        store = zarr.open(str(path), mode="r")
+        if hasattr(store, "shape"):
+            return store
+        keys = sorted(name for name, _ in store.arrays())
+        if key is None and not keys:
+            raise ValueError(f"{path.name} contains no arrays")
+        return store[key if key is not None else keys[0]]
+    if path.suffix in (".h5", ".hdf5"):
+        if h5py is None:
+            raise ImportError("Reading HDF5 files requires h5py. Install with: pip install h5py")
+        handle = h5py.File(path, "r")
+        try:
+            if key is None:
+                keys: List[str] = []
+                handle.visititems(lambda name, item: keys.append(name) if isinstance(item, h5py.Dataset) else None)
+                if not keys:
+                    raise ValueError(f"{path.name} contains no datasets")
+                key = keys[0]
+            return ArrayView(handle[key], handle=handle)
+        except BaseException:
+            handle.close()
+            raise
+    raise ValueError(f"Unsupported array format: {path.suffix}")
+
+
+def row_bytes(array: Any) -> int:
+    """Bytes per row of ``array``."""
+    return int(np.prod(array.shape[1:], dtype=np.int64)) * array.dtype.itemsize
+
+
+def _frame(block: Any, start: int, usecols: Optional[List[Any]]) -> pd.DataFrame:
+    index = pd.RangeIndex(start, start + len(block))
+    if block.dtype.names:
+        fields = usecols or list(block.dtype.names)
+        return pd.DataFrame({name: block[name] for name in fields}, index=index, copy=False)
+    if block.ndim == 1:
+        return pd.DataFrame({"value": block}, index=index, copy=False)
+    if block.ndim > 2:
+        block = block.reshape(len(block), -1)
+    if usecols is not None:
+        return pd.DataFrame(block[:, [int(column) for column in usecols]], index=index,
+                            columns=[int(column) for column in usecols])
+    return pd.DataFrame(block, index=index, copy=False)
+
+
+def iter_array_chunks(
+    array: Any,
+    chunksize: Optional[int] = None,
+    usecols: Optional[List[Any]] = None,
+    close: bool = False,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream an array as DataFrames of consecutive row blocks.
+
+    Blocks of memory-mapped arrays are views of the mapping; nothing is
+    copied unless ``usecols`` selects columns of a plain 2-D array.
+
+    Parameters
+    ----------
+    array : array-like
+        Array returned by ``open_array`` (or any NumPy array)
+    chunksize : int, optional
+        Rows per block, by default about 64 MiB worth, rounded to whole
+        storage chunks for Zarr and HDF5 arrays
+    usecols : List, optional
+        Fields of a structured array or column indices of a 2-D array
+    close : bool, optional
+        Close ``array`` (an ``ArrayView``) once the iterator is exhausted
+        or discarded
+
+    Yields
+    ------
+    pd.DataFrame
+        Consecutive row blocks
+    """
+    view = array if isinstance(array, ArrayView) else None
+    if view is not None:
+        # Read the wrapped array directly so the frames keep the original column names
+        array, usecols = view.array, usecols if usecols is not None else view.usecols
+    try:
+        if chunksize is None:
+            chunksize = max(1, BLOCK_BYTES // max(row_bytes(array), 1))
+        storage_rows = (getattr(array, "chunks", None) or (None,))[0]
+        if storage_rows and chunksize > storage_rows:
+            chunksize -= chunksize % storage_rows
+        n_rows = array.shape[0]
+        for start in range(0, n_rows, chunksize):
+            yield _frame(array[start:start + chunksize], start, usecols)
+    finally:
+        if close and view is not None:
+            view.close()
@@ -0,0 +1,179 @@
+"""
+Partitioned Parquet and Arrow datasets.
+
+A dataset is either a single ``.parquet``/``.arrow``/``.feather`` file or a
+directory of them, typically written with hive-style partition
+directories::
+
+    data/processed/events/year=2024/month=01/part-0.parquet
+    data/processed/events/year=2024/month=02/part-0.parquet
+
+Both the column selection and the row filters are handed to the Arrow
+dataset scanner, so only the requested columns are read from disk, whole
+partitions are skipped when their directory values fail the filter, and
+Parquet row groups are skipped using their min/max statistics. Reading 3
+columns of 200 from one partition out of a year touches only that
+fraction of the bytes.
+
+Filters use the same form as ``pandas.read_parquet``: a list of
+``(column, op, value)`` tuples that must all hold, or a list of such lists
+of which at least one must hold. Supported operators are ``==``, ``=``,
+``!=``, ``<``, ``<=``, ``>``, ``>=``, ``in`` and ``not in``.
+
+Requires ``pyarrow``.
+"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .utils import lazy_import
+
+pd = lazy_import("pandas")
+ds = lazy_import("pyarrow.dataset", optional=True)
+pq = lazy_import("pyarrow.parquet", optional=True)
+
+logger = logging.getLogger(__name__)
+
+# File suffixes opened as datasets, mapped to Arrow dataset formats
+DATASET_FORMATS = {".parquet": "parquet", ".arrow": "ipc", ".feather": "ipc", ".ipc": "ipc"}
+
+Filters = Union[Sequence[Tuple[str, str, Any]], Sequence[Sequence[Tuple[str, str, Any]]]]
+
+
+def is_dataset(path: Path) -> bool:
+    """True if ``path`` is a Parquet/Arrow file or a directory to open as a dataset."""
+    return path.is_dir() or path.suffix in DATASET_FORMATS
+
+
+def _format_of(path: Path) -> str:
+    if path.is_file():
+        return DATASET_FORMATS[path.suffix]
+    for file in sorted(path.rglob("*")):
+        if file.is_file() and file.suffix in DATASET_FORMATS:
+            return DATASET_FORMATS[file.suffix]
+    raise FileNotFoundError(f"No Parquet or Arrow files found in {path}")
+
+
+def open_dataset(path: Union[str, Path]) -> "ds.Dataset":
+    """
+    Open a file or a hive-partitioned directory as an Arrow dataset.
+
+    Parameters
+    ----------
+    path : str or Path
+        Dataset file or directory
+
+    Returns
+    -------
+    pyarrow.dataset.Dataset
+        Dataset whose schema includes the partition columns
+    """
+    if ds is None:
+        raise ImportError("Reading Parquet/Arrow datasets requires pyarrow. Install with: pip install pyarrow")
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"No such file or directory: '{path}'")
+    # Skip hidden and temporary files (e.g. from interrupted writes)
+    return ds.dataset(path, format=_format_of(path), partitioning="hive", ignore_prefixes=[".", "_"])
+
+
+def to_expression(filters: Optional[Union[Filters, "ds.Expression"]]) -> Optional["ds.Expression"]:
+    """Convert ``read_parquet``-style filters to an Arrow expression."""
+    if filters is None or isinstance(filters, ds.Expression):
+        return filters
+    return pq.filters_to_expression(filters)
+
+
+def _scanner(path: Path, columns: Optional[List[str]], filters: Optional[Filters], **kwargs) -> "ds.Scanner":
+    dataset = open_dataset(path)
+    if columns is not None:
+        missing = set(columns) - set(dataset.schema.names)
+        if missing:
+            raise ValueError(f"Columns not found in {path.name}: {sorted(missing)}")
+    return dataset.scanner(columns=columns, filter=to_expression(filters), **kwargs)
+
+
+def read_dataset(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+) -> pd.DataFrame:
+    """
+    Read the selected columns and rows of a dataset.
+
+    Parameters
+    ----------
+    path : str or Path
+        Dataset file or directory
+    columns : List[str], optional
+        Columns to read, by default all (including partition columns)
+    filters : Filters, optional
+        Row filters, pushed down to the scan
+
+    Returns
+    -------
+    pd.DataFrame
+        Matching rows
+    """
+    return _scanner(Path(path), columns, filters).to_table().to_pandas()
+
+
+def iter_dataset(
+    path: Union[str, Path],
+    chunksize: int,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream the selected columns and rows of a dataset.
+
+    Chunks hold at most ``chunksize`` rows; they can be shorter at file and
+    row-group boundaries.
+
+    Parameters
+    ----------
+    path : str or Path
+        Dataset file or directory
+    chunksize : int
+        Maximum number of rows per chunk
+    columns : List[str], optional
+        Columns to read, by default all
+    filters : Filters, optional
+        Row filters, pushed down to the scan
+
+    Returns
+    -------
+    Iterator[pd.DataFrame]
+        Consecutive chunks of the matching rows
+    """
+    # Open the dataset now so that errors surface at the call
+    scanner = _scanner(Path(path), columns, filters, batch_size=chunksize)
+    return _iter_batches(scanner)
+
+
+def _iter_batches(scanner: "ds.Scanner") -> Iterator[pd.DataFrame]:
+    start = 0
+    for batch in scanner.to_batches():
+        if batch.num_rows == 0:
+            continue
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def rows_for_budget(
+    path: Union[str, Path],
+    memory_budget: int,
+    columns: Optional[List[str]] = None,
+    sample_rows: int = 1000,
+) -> int:
+    """Estimate how many rows of a dataset fit into ``memory_budget`` bytes."""
+    sample = open_dataset(path).head(sample_rows, columns=columns).to_pandas()
+    if sample.empty:
+        return sample_rows
+    bytes_per_row = sample.memory_usage(index=False, deep=True).sum() / len(sample)
+    return max(1, int(memory_budget // max(bytes_per_row, 1)))
@@ -0,0 +1,361 @@
+"""
+Scaling benchmarks of the analysis stages, with a stored baseline.
+
+``python -m src.benchmark`` runs ``load_data``, ``analyze_data``,
+{% if cookiecutter.include_visualization == 'True' %}``visualize_data`` and {% endif %}``save_results`` of ``src/main.py`` on synthetic
+data of 10^3 to 10^7 rows and several column widths. Each case
+(rows x columns) runs in a fresh process, so earlier cases do not warm
+its caches or inflate its memory, and every stage is repeated
+``--repeat`` times with the result and input caches bypassed. Per stage
+and case it records
+
+- the median wall-clock time,
+- the peak resident memory of the stage (the kernel's high-water mark
+  is reset before each stage), and
+- the throughput in rows per second.
+
+``--update`` stores the measurements in ``benchmarks/baseline.json``;
+commit that file. ``--check`` then compares a run against it and exits
+with status 1 if any stage got slower than the baseline by more than
+``--threshold`` (25% by default). Differences below ``--min-seconds``
+are ignored, as timings that short are mostly noise. Baselines are only
+comparable on the same machine; the machine is recorded with them.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .utils import PROJECT_DIR, atomic_path
+
+logger = logging.getLogger(__name__)
+
+BASELINE_FILE = PROJECT_DIR / "benchmarks" / "baseline.json"
+
+DEFAULT_ROWS = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+DEFAULT_COLUMNS = (2, 16, 64)
+# --quick: small enough to run on every commit
+QUICK_ROWS = (10 ** 3, 10 ** 4)
+QUICK_COLUMNS = (2, 16)
+
+# Cases with more cells than this are skipped (10^7 x 64 float64 cells are 5 GB)
+MAX_CELLS = 2 * 10 ** 8
+
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_SECONDS = 0.05
+
+STAGES = ("load_data", "analyze_data", {% if cookiecutter.include_visualization == 'True' %}"visualize_data", {% endif %}"save_results")
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak resident memory of this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss() -> int:
+    """Peak resident memory of this process in bytes."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            return int(re.search(r"VmHWM:\s+(\d+) kB", f.read()).group(1)) * 1024
+    except (OSError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def machine_info() -> Dict[str, Any]:
+    """Identify the machine a baseline was measured on."""
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def write_input(path: Path, n_rows: int, n_columns: int, seed: int = 42) -> Path:
+    """
+    Write a synthetic input of ``n_rows`` rows and ``n_columns`` columns.
+
+    Column ``x`` is evenly spaced over [0, 10], the others are
+    ``sin(x + k)`` plus noise.{% if cookiecutter.include_data_analysis == 'True' %} The file is Parquet when pyarrow is
+    installed and CSV otherwise.{% endif %}
+
+    Returns
+    -------
+    Path
+        The written file
+    """
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 10, n_rows)
+    columns = {"x": x}
+    for k in range(1, n_columns):
+        columns[f"v{k}"] = np.sin(x + k) + 0.1 * rng.standard_normal(n_rows)
+    frame = pd.DataFrame(columns)
+    try:
+        import pyarrow  # noqa: F401
+        path = path.with_suffix(".parquet")
+        frame.to_parquet(path, index=False)
+    except ImportError:
+        path = path.with_suffix(".csv")
+        frame.to_csv(path, index=False)
+    {% else %}
+    import csv
+    import math
+    import random
+
+    rng = random.Random(seed)
+    path = path.with_suffix(".csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["x"] + [f"v{k}" for k in range(1, n_columns)])
+        for i in range(n_rows):
+            x = i * 10 / max(n_rows - 1, 1)
+            writer.writerow([x] + [math.sin(x + k) + 0.1 * rng.gauss(0, 1) for k in range(1, n_columns)])
+    {% endif %}
+    return path
+
+
+def _run_case(n_rows: int, n_columns: int, repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Measure every stage on one input; runs in a fresh process."""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    from . import main
+
+    logging.getLogger().setLevel(logging.WARNING)
+    times = {stage: [] for stage in STAGES}
+    peaks = {stage: 0 for stage in STAGES}
+
+    def timed(stage: str, func, *args, **kwargs):
+        _reset_peak_rss()
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        times[stage].append(time.perf_counter() - start)
+        peaks[stage] = max(peaks[stage], _peak_rss())
+        return value
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as tmp:
+        tmp = Path(tmp)
+        path = write_input(tmp / "input", n_rows, n_columns)
+        for i in range(repeat):
+            data = timed("load_data", main.load_data, str(path){% if cookiecutter.include_data_analysis == 'True' %}, use_cache=False{% endif %})
+            if data is None:
+                raise RuntimeError(f"Could not load {path}")
+            {% if cookiecutter.include_data_analysis == 'True' %}
+            results = timed("analyze_data", main.analyze_data.__wrapped__, data)
+            {% else %}
+            results = {"summary": timed("analyze_data", main.summarize, data)}
+            {% endif %}
+            {% if cookiecutter.include_visualization == 'True' %}
+            # A new file each time, so the figure is not reused from the previous repeat
+            timed("visualize_data", main.visualize_data, data, batch=True, figure_path=tmp / f"figure-{i}.png")
+            {% endif %}
+            if not timed("save_results", main.save_results, results, str(tmp / f"results-{i}.json")):
+                raise RuntimeError("Could not save the results")
+            del data, results
+
+    measurements = {}
+    for stage in STAGES:
+        seconds = statistics.median(times[stage])
+        measurements[stage] = {
+            "seconds": round(seconds, 6),
+            "peak_rss_bytes": peaks[stage],
+            "rows_per_second": round(n_rows / seconds, 1) if seconds > 0 else None,
+        }
+    return measurements
+
+
+def case_key(stage: str, n_rows: int, n_columns: int) -> str:
+    """Key of a measurement in the results and the baseline, e.g. ``load_data/1000x16``."""
+    return f"{stage}/{n_rows}x{n_columns}"
+
+
+def run_benchmarks(
+    rows: Sequence[int] = DEFAULT_ROWS,
+    columns: Sequence[int] = DEFAULT_COLUMNS,
+    repeat: int = 3,
+    max_cells: int = MAX_CELLS,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every combination of ``rows`` and ``columns``.
+
+    Parameters
+    ----------
+    rows : Sequence[int], optional
+        Input sizes, by default 10^3 to 10^7 rows
+    columns : Sequence[int], optional
+        Input widths, by default 2, 16 and 64 columns
+    repeat : int, optional
+        Runs per stage; the median time is kept
+    max_cells : int, optional
+        Skip cases with more than this many cells
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        Measurements by ``case_key``
+    """
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for n_rows in rows:
+        for n_columns in columns:
+            if n_rows * n_columns > max_cells:
+                logger.info(f"Skipping {n_rows:,} x {n_columns} (more than {max_cells:,} cells)")
+                continue
+            logger.info(f"Benchmarking {n_rows:,} rows x {n_columns} columns")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                measurements = pool.submit(_run_case, n_rows, n_columns, repeat).result()
+            for stage, values in measurements.items():
+                results[case_key(stage, n_rows, n_columns)] = values
+                logger.info(f"  {stage:<16} {values['seconds']:>10.4f}s {values['peak_rss_bytes'] / 1024 ** 2:>9.1f} MB "
+                            f"{values['rows_per_second'] or 0:>14,.0f} rows/s")
+    return results
+
+
+def load_baseline(path: Path = BASELINE_FILE) -> Optional[Dict[str, Any]]:
+    """The stored baseline, or None if there is none."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results: Dict[str, Dict[str, Any]], path: Path = BASELINE_FILE) -> Path:
+    """Store ``results`` as the baseline, keeping entries of cases that were not run."""
+    baseline = load_baseline(path) or {}
+    if baseline.get("machine") not in (None, machine_info()):
+        logger.warning("The baseline was measured on a different machine; replacing it")
+        baseline = {}
+    entries = dict(baseline.get("results", {}), **results)
+    baseline = {"machine": machine_info(), "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": dict(sorted(entries.items()))}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(baseline, f, indent=2)
+    return path
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    min_seconds: float = DEFAULT_MIN_SECONDS,
+) -> List[str]:
+    """
+    Find stages that got slower than the baseline.
+
+    Parameters
+    ----------
+    results : Dict[str, Dict[str, Any]]
+        Current measurements, see ``run_benchmarks``
+    baseline : Dict[str, Any]
+        Stored baseline, see ``load_baseline``
+    threshold : float, optional
+        Allowed slowdown as a fraction of the baseline time
+    min_seconds : float, optional
+        Slowdowns smaller than this are never reported
+
+    Returns
+    -------
+    List[str]
+        One message per regression; empty if there are none
+    """
+    regressions = []
+    for key, current in results.items():
+        reference = baseline.get("results", {}).get(key)
+        if reference is None:
+            continue
+        old, new = reference["seconds"], current["seconds"]
+        if new > old * (1 + threshold) and new - old > min_seconds:
+            regressions.append(f"{key}: {new:.4f}s vs {old:.4f}s in the baseline (+{100 * (new / old - 1):.0f}%)")
+    return regressions
+
+
+def _sizes(value: str) -> List[int]:
+    """Parse a comma-separated list of sizes such as ``1e3,1e5``."""
+    try:
+        return [int(float(item)) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid list of sizes '{value}', expected e.g. '1e3,1e5'")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point; returns the process exit code."""
+    parser = argparse.ArgumentParser(description="Benchmark the analysis stages on synthetic data of growing size.")
+    parser.add_argument("--rows", type=_sizes, default=None,
+                        help="comma-separated row counts (default: 1e3,1e4,1e5,1e6,1e7)")
+    parser.add_argument("--columns", type=_sizes, default=None,
+                        help="comma-separated column counts (default: 2,16,64)")
+    parser.add_argument("--quick", action="store_true",
+                        help="only 1e3 and 1e4 rows with 2 and 16 columns")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the median is kept (default: 3)")
+    parser.add_argument("--max-cells", type=float, default=MAX_CELLS,
+                        help=f"skip cases with more cells than this (default: {MAX_CELLS:.0e})")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="baseline file")
+    parser.add_argument("--update", action="store_true", help="store the measurements as the baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 if a stage is slower than the baseline by more than --threshold")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"allowed slowdown as a fraction (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS,
+                        help=f"ignore slowdowns smaller than this (default: {DEFAULT_MIN_SECONDS})")
+    parser.add_argument("--output", default=str(PROJECT_DIR / "data" / "results" / "benchmark.json"),
+                        help="where to write the measurements of this run")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    rows = args.rows or (QUICK_ROWS if args.quick else DEFAULT_ROWS)
+    columns = args.columns or (QUICK_COLUMNS if args.quick else DEFAULT_COLUMNS)
+    results = run_benchmarks(rows, columns, repeat=args.repeat, max_cells=int(args.max_cells))
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"machine": machine_info(), "results": results}, f, indent=2)
+    logger.info(f"Measurements written to {output}")
+
+    status = 0
+    if args.check:
+        baseline = load_baseline(Path(args.baseline))
+        if baseline is None:
+            logger.error(f"No baseline at {args.baseline}; create one with --update")
+            return 1
+        if baseline.get("machine") != machine_info():
+            logger.warning("The baseline was measured on a different machine; timings may not be comparable")
+        regressions = compare(results, baseline, threshold=args.threshold, min_seconds=args.min_seconds)
+        for message in regressions:
+            logger.error(f"Performance regression: {message}")
+        if regressions:
+            status = 1
+        else:
+            logger.info(f"No stage is more than {100 * args.threshold:.0f}% slower than the baseline")
+    if args.update:
+        logger.info(f"Baseline updated: {save_baseline(results, Path(args.baseline))}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Checkpoints of a run of ``main()``, so an interrupted run can be resumed.
+
+After each stage, ``main()`` stores the stage's result in
+``data/processed/.checkpoint`` (in a subdirectory per ``--stage`` value,
+so pipeline stages running side by side keep separate checkpoints).
+Chunked stages also save their running state every few chunks
+(``--checkpoint-every``). ``python -m src.main --resume`` then skips the
+completed stages and continues a chunked stage after the last saved
+chunk. The checkpoint is deleted once the run has saved its results.
+
+Consistency: every state is pickled to a new file, which is complete
+before ``manifest.json`` is atomically replaced to point to it. A crash at
+any moment therefore leaves the manifest pointing to the previous
+complete state; half-written files are never referenced.
+
+A checkpoint is only resumed by a run with the same fingerprint: the
+size and modification time of every input file, the command-line options
+that affect the results, and the source code in ``src/``. Resuming
+after any of them changed raises ``CheckpointMismatch``.
+"""
+
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .utils import atomic_path, file_digest
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = Path(__file__).parent.parent / "data" / "processed" / ".checkpoint"
+MANIFEST_FILE = "manifest.json"
+
+# Save the state of chunked stages every this many chunks
+DEFAULT_EVERY = 10
+
+
+def _sync(f) -> None:
+    """Flush a file to disk, so that it is complete before it is renamed into place."""
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class CheckpointMismatch(ValueError):
+    """The checkpoint was written by a run with different inputs, options or code."""
+
+
+def input_files(data_dir: Path, pattern: str) -> List[Path]:
+    """Files read for ``pattern``: a file, the files below a directory, or the matches of a glob pattern."""
+    path = data_dir / pattern
+    if glob.has_magic(pattern):
+        candidates = [Path(name) for name in glob.glob(str(path), recursive=True)]
+    elif path.is_dir():
+        candidates = [p for p in path.rglob("*") if not any(part.startswith(".") for part in p.relative_to(path).parts)]
+    else:
+        candidates = [path]
+    return sorted(p for p in candidates if p.is_file())
+
+
+def run_fingerprint(data_dir: Path, pattern: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Describe what a run depends on.
+
+    Input files are identified by size and modification time rather than
+    by their contents, so that checking a multi-gigabyte input is instant.
+
+    Parameters
+    ----------
+    data_dir : Path
+        Data directory that ``pattern`` is relative to
+    pattern : str
+        The run's ``--input``
+    options : Dict[str, Any]
+        Options that affect the results
+
+    Returns
+    -------
+    Dict[str, Any]
+        JSON-compatible fingerprint
+    """
+    inputs = {}
+    for path in input_files(data_dir, pattern):
+        stat = path.stat()
+        inputs[str(path.relative_to(data_dir))] = [stat.st_size, stat.st_mtime_ns]
+    code = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        code.update(f"{path.name}:{file_digest(path)};".encode())
+    fingerprint = {"inputs": inputs, "options": options, "code": code.hexdigest()}
+    # Round-trip through JSON so it compares equal to a loaded manifest
+    return json.loads(json.dumps(fingerprint, sort_keys=True, default=str))
+
+
+class RunCheckpoint:
+    """
+    Checkpoint of one run.
+
+    Parameters
+    ----------
+    fingerprint : Dict[str, Any]
+        Fingerprint of the run, see ``run_fingerprint``
+    directory : Path, optional
+        Checkpoint directory, by default ``data/processed/.checkpoint``
+    every : int, optional
+        Save chunked stages every this many chunks, by default 10; 0 saves
+        only completed stages
+    """
+
+    def __init__(self, fingerprint: Dict[str, Any], directory: Path = CHECKPOINT_DIR, every: int = DEFAULT_EVERY):
+        self.fingerprint = fingerprint
+        self.directory = Path(directory)
+        self.every = every
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._sequence = 0
+
+    def start(self) -> None:
+        """Start a new run, discarding any previous checkpoint."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.stages = {}
+        self._sequence = 0
+
+    def resume(self) -> bool:
+        """
+        Load the checkpoint of an earlier run with the same fingerprint.
+
+        Returns
+        -------
+        bool
+            True if a checkpoint was loaded, False if there is none (the
+            run then starts from the beginning)
+
+        Raises
+        ------
+        CheckpointMismatch
+            If the checkpoint belongs to a run with different inputs,
+            options or code
+        """
+        try:
+            with open(self.directory / MANIFEST_FILE, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("No checkpoint to resume from, starting from the beginning")
+            self.start()
+            return False
+
+        saved = manifest["fingerprint"]
+        changed = [key for key in ("options", "code") if saved.get(key) != self.fingerprint[key]]
+        inputs, saved_inputs = self.fingerprint["inputs"], saved.get("inputs", {})
+        changed += [f"input {name}" for name in sorted(set(inputs) | set(saved_inputs))
+                    if inputs.get(name) != saved_inputs.get(name)]
+        if changed:
+            raise CheckpointMismatch(f"changed since the checkpoint was written: {', '.join(changed)}")
+
+        self.stages = manifest["stages"]
+        self._sequence = manifest["sequence"]
+        completed = [stage for stage, entry in self.stages.items() if entry["complete"]]
+        logger.info(f"Resuming from checkpoint; completed stages: {', '.join(completed) or 'none'}")
+        return True
+
+    def done(self, stage: str) -> bool:
+        """True if ``stage`` completed in the checkpointed run."""
+        return self.stages.get(stage, {}).get("complete", False)
+
+    def result(self, stage: str) -> Any:
+        """The result saved by ``complete(stage, ...)``."""
+        return self._load(stage)
+
+    def progress(self, stage: str) -> Tuple[int, Any]:
+        """Number of chunks processed and the saved state of a partly finished stage, or ``(0, None)``."""
+        entry = self.stages.get(stage)
+        if entry is None or entry["complete"]:
+            return 0, None
+        return entry["position"], self._load(stage)
+
+    def complete(self, stage: str, value: Any = None) -> None:
+        """Record that ``stage`` finished, with its result."""
+        self._save(stage, value, complete=True, position=None)
+
+    def save_progress(self, stage: str, position: int, state: Any) -> None:
+        """Record the state of ``stage`` after its first ``position`` chunks."""
+        self._save(stage, state, complete=False, position=position)
+        logger.info(f"Checkpoint: {stage} after {position} chunks")
+
+    def resume_chunks(
+        self, stage: str, chunks: Iterable[Any]
+    ) -> Tuple[Iterator[Any], Any, Optional[Callable[[int, Any], None]]]:
+        """
+        Prepare a chunked stage for checkpointing.
+
+        Parameters
+        ----------
+        stage : str
+            Stage name
+        chunks : Iterable
+            All chunks of the stage
+
+        Returns
+        -------
+        Tuple[Iterator, Any, Callable or None]
+            The chunks still to process, the state to continue from (None
+            when starting fresh) and a callback ``on_progress(position,
+            state)`` to call after each chunk, with ``position`` counted in
+            the returned chunks
+        """
+        position, state = self.progress(stage)
+        chunks = iter(chunks)
+        if position:
+            logger.info(f"Resuming {stage} after chunk {position}")
+            chunks = itertools.islice(chunks, position, None)
+        if not self.every:
+            return chunks, state, None
+
+        def on_progress(done: int, state: Any) -> None:
+            if done % self.every == 0:
+                self.save_progress(stage, position + done, state)
+
+        return chunks, state, on_progress
+
+    def finish(self) -> None:
+        """Delete the checkpoint after the run completed."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.stages = {}
+
+    def _load(self, stage: str) -> Any:
+        with open(self.directory / self.stages[stage]["file"], "rb") as f:
+            return pickle.load(f)
+
+    def _save(self, stage: str, value: Any, complete: bool, position: Optional[int]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sequence += 1
+        name = f"{stage}-{self._sequence}.pkl"
+        with atomic_path(self.directory / name) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                _sync(f)
+
+        previous = self.stages.get(stage, {}).get("file")
+        self.stages[stage] = {"complete": complete, "position": position, "file": name,
+                              "saved": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        manifest = {"fingerprint": self.fingerprint, "stages": self.stages, "sequence": self._sequence}
+        with atomic_path(self.directory / MANIFEST_FILE) as tmp_path:
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+                _sync(f)
+        if previous:
+            (self.directory / previous).unlink(missing_ok=True)
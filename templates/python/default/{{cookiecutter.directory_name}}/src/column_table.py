@@ -0,0 +1,485 @@
+"""
+Typed column storage without third-party dependencies.
+
+Reading a CSV file into lists of strings costs several times the size of
+the file: every value becomes a separate ``str`` object and every row a
+separate ``list``. ``ColumnTable`` stores each column contiguously
+instead:
+
+- integer columns as ``array('q')`` (8 bytes per value)
+- float columns as ``array('d')`` (8 bytes per value, NaN when missing)
+- anything else as a list of strings
+
+Numeric columns can be handed to other code without copying through
+``ColumnTable.view``, which returns a ``memoryview`` (NumPy and matplotlib
+accept it directly).
+
+Column types are inferred per column, trying int, then float, then text.
+In a stream of chunks the type found in the first chunk is kept, and only
+widened when a later chunk does not fit, so a column never changes type in
+a way that loses information.
+
+``RunningStats`` computes count, mean, standard deviation, minimum and
+maximum in a single pass with Welford's algorithm. Statistics of separate
+chunks can be merged, so a file of any size can be summarized with a
+constant amount of memory.
+"""
+
+import csv
+import logging
+import math
+import sys
+from array import array
+from collections.abc import Mapping
+from itertools import islice, zip_longest
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Column types, from narrowest to widest
+KINDS = ("int", "float", "str")
+
+# Strings read as missing values; they make a column float (NaN) or text
+MISSING_VALUES = frozenset({"", "NA", "N/A", "NaN", "nan", "null", "NULL", "None"})
+
+# Rows converted at a time by read_csv
+READ_CHUNK_ROWS = 65_536
+
+Column = Union[array, List[str]]
+
+
+def _kind_name(kind: Any) -> str:
+    """Normalize a column type given as a name or as ``int``/``float``/``str``."""
+    name = getattr(kind, "__name__", kind)
+    if name not in KINDS:
+        raise ValueError(f"Unsupported column type {kind!r}, expected one of {KINDS}")
+    return name
+
+
+def _to_float(value: str) -> float:
+    return math.nan if value in MISSING_VALUES else float(value)
+
+
+def _convert(values: List[str], kind: str) -> Column:
+    if kind == "int":
+        return array("q", map(int, values))
+    if kind == "float":
+        return array("d", map(_to_float, values))
+    return list(values)
+
+
+def convert_column(values: List[str], kind: Optional[Any] = None, widen: bool = True) -> Tuple[str, Column]:
+    """
+    Convert raw strings to a typed column.
+
+    Parameters
+    ----------
+    values : List[str]
+        Raw values of one column
+    kind : str or type, optional
+        Column type to use (``"int"``, ``"float"`` or ``"str"``), by default
+        the narrowest type that fits all values
+    widen : bool, optional
+        Fall back to a wider type if ``kind`` does not fit, by default True;
+        otherwise raise ValueError
+
+    Returns
+    -------
+    Tuple[str, Column]
+        Type name and converted values
+    """
+    start = KINDS.index(_kind_name(kind)) if kind is not None else 0
+    for name in KINDS[start:]:
+        try:
+            return name, _convert(values, name)
+        except (ValueError, OverflowError):
+            if not widen:
+                raise
+    raise AssertionError("text columns always convert")
+
+
+def _widen(column: Column, kind: str) -> Column:
+    if kind == "float":
+        return array("d", column)
+    return [str(value) for value in column]
+
+
+class ColumnTable(Mapping):
+    """
+    Table of named, typed columns of equal length.
+
+    Behaves as a read-only mapping from column names to columns, so
+    ``"x" in table``, ``table["x"]`` and ``table.keys()`` work as they do on
+    a dict of lists; ``len(table)`` is the number of columns and
+    ``table.n_rows`` the number of rows.
+
+    Parameters
+    ----------
+    columns : Dict[str, Iterable], optional
+        Initial columns, converted with ``convert_column`` unless they are
+        already ``array`` or ``list`` objects of a known type
+    """
+
+    __slots__ = ("_columns", "_kinds")
+
+    def __init__(self, columns: Optional[Dict[str, Iterable]] = None):
+        self._columns: Dict[str, Column] = {}
+        self._kinds: Dict[str, str] = {}
+        for name, values in (columns or {}).items():
+            self.add_column(name, values)
+
+    def add_column(self, name: str, values: Iterable, kind: Optional[Any] = None) -> None:
+        """Add or replace a column, inferring its type unless ``kind`` is given."""
+        if not isinstance(values, (array, list)):
+            values = list(values)
+        if kind is not None:
+            kind, column = convert_column([str(value) for value in values], kind, widen=False)
+        elif isinstance(values, array) and values.typecode in ("q", "d"):
+            kind, column = "int" if values.typecode == "q" else "float", values
+        elif all(isinstance(value, str) for value in values):
+            kind, column = convert_column(values)
+        elif all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+            kind, column = "int", array("q", values)
+        elif all(isinstance(value, (int, float)) for value in values):
+            kind, column = "float", array("d", values)
+        else:
+            kind, column = "str", [str(value) for value in values]
+        if self._columns and len(column) != self.n_rows:
+            raise ValueError(f"Column '{name}' has {len(column)} rows, expected {self.n_rows}")
+        self._columns[name] = column
+        self._kinds[name] = kind
+
+    @classmethod
+    def from_rows(
+        cls,
+        header: List[str],
+        rows: List[List[str]],
+        kinds: Optional[Dict[str, Any]] = None,
+    ) -> "ColumnTable":
+        """
+        Build a table from raw CSV rows.
+
+        Parameters
+        ----------
+        header : List[str]
+            Column names
+        rows : List[List[str]]
+            Raw rows; short rows are padded with missing values
+        kinds : Dict[str, Any], optional
+            Column types to start from; columns that do not fit are widened
+
+        Returns
+        -------
+        ColumnTable
+            Converted table
+        """
+        kinds = kinds or {}
+        table = cls()
+        raw_columns = zip_longest(*rows, fillvalue="") if rows else [[] for _ in header]
+        for name, values in zip(header, raw_columns):
+            kind, column = convert_column(list(values), kinds.get(name))
+            table._columns[name] = column
+            table._kinds[name] = kind
+        return table
+
+    def __getitem__(self, name: str) -> Column:
+        return self._columns[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def __repr__(self) -> str:
+        columns = ", ".join(f"{name}: {kind}" for name, kind in self._kinds.items())
+        return f"ColumnTable({self.n_rows} rows; {columns})"
+
+    @property
+    def n_rows(self) -> int:
+        """Number of rows."""
+        return len(next(iter(self._columns.values()))) if self._columns else 0
+
+    @property
+    def kinds(self) -> Dict[str, str]:
+        """Type name of every column."""
+        return dict(self._kinds)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the column data."""
+        total = 0
+        for column in self._columns.values():
+            if isinstance(column, array):
+                total += column.itemsize * len(column)
+            else:
+                total += sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+        return total
+
+    def numeric_columns(self) -> List[str]:
+        """Names of the int and float columns."""
+        return [name for name, kind in self._kinds.items() if kind != "str"]
+
+    def view(self, name: str) -> memoryview:
+        """Zero-copy view of a numeric column."""
+        column = self._columns[name]
+        if not isinstance(column, array):
+            raise TypeError(f"Column '{name}' holds text and has no buffer")
+        return memoryview(column)
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """Iterate over the rows as tuples, without materializing them all."""
+        return zip(*self._columns.values())
+
+    def append(self, other: "ColumnTable") -> "ColumnTable":
+        """
+        Append the rows of a table with the same columns.
+
+        Columns are widened where ``other`` has a wider type.
+
+        Returns
+        -------
+        ColumnTable
+            This table, for chaining
+        """
+        if not self._columns:
+            self._columns = {name: other[name][:] for name in other}
+            self._kinds = other.kinds
+            return self
+        if list(other) != list(self):
+            raise ValueError("Cannot append a table with different columns")
+        for name in self._columns:
+            kind = KINDS[max(KINDS.index(self._kinds[name]), KINDS.index(other._kinds[name]))]
+            if kind != self._kinds[name]:
+                self._columns[name] = _widen(self._columns[name], kind)
+                self._kinds[name] = kind
+            incoming = other[name] if other._kinds[name] == kind else _widen(other[name], kind)
+            self._columns[name].extend(incoming)
+        return self
+
+    def describe(self) -> Dict[str, "RunningStats"]:
+        """Running statistics of every numeric column."""
+        return {name: RunningStats().update(self._columns[name]) for name in self.numeric_columns()}
+
+
+class RunningStats:
+    """
+    Single-pass count, mean, variance, minimum and maximum.
+
+    NaN values are skipped. Instances built on disjoint parts of a column
+    can be combined with ``merge``.
+    """
+
+    __slots__ = ("n", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: Iterable[float]) -> "RunningStats":
+        """
+        Add values (Welford's algorithm).
+
+        Returns
+        -------
+        RunningStats
+            These statistics, for chaining
+        """
+        n, mean, m2 = self.n, self.mean, self.m2
+        low, high = self.min, self.max
+        for value in values:
+            if value != value:  # NaN
+                continue
+            n += 1
+            delta = value - mean
+            mean += delta / n
+            m2 += delta * (value - mean)
+            if value < low:
+                low = value
+            if value > high:
+                high = value
+        self.n, self.mean, self.m2, self.min, self.max = n, mean, m2, low, high
+        return self
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """
+        Fold in statistics of another, disjoint set of values.
+
+        Returns
+        -------
+        RunningStats
+            These statistics, for chaining
+        """
+        n = self.n + other.n
+        if n == 0:
+            return self
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (``ddof=1``), NaN with fewer than two values."""
+        return self.m2 / (self.n - 1) if self.n > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation, NaN with fewer than two values."""
+        return math.sqrt(self.variance) if self.n > 1 else math.nan
+
+    def as_dict(self) -> Dict[str, float]:
+        """Statistics keyed like the rows of ``DataFrame.describe()``."""
+        empty = self.n == 0
+        return {
+            "count": self.n,
+            "mean": math.nan if empty else self.mean,
+            "std": self.std,
+            "min": math.nan if empty else self.min,
+            "max": math.nan if empty else self.max,
+        }
+
+
+def iter_csv(
+    path: Union[str, Path],
+    chunksize: int,
+    kinds: Optional[Dict[str, Any]] = None,
+    usecols: Optional[List[str]] = None,
+) -> Iterator[ColumnTable]:
+    """
+    Stream a CSV file with a header row as typed tables.
+
+    Parameters
+    ----------
+    path : str or Path
+        CSV file
+    chunksize : int
+        Number of rows per table
+    kinds : Dict[str, Any], optional
+        Column types; other columns are inferred from the first chunk and
+        widened if a later chunk does not fit
+    usecols : List[str], optional
+        Only read these columns
+
+    Returns
+    -------
+    Iterator[ColumnTable]
+        Consecutive chunks of the file
+    """
+    # Open the file now so that a missing file is reported at the call
+    f = open(path, "r", newline="")
+    return _iter_tables(f, Path(path).name, chunksize, dict(kinds or {}), usecols)
+
+
+def _iter_tables(
+    f: TextIO,
+    source: str,
+    chunksize: int,
+    kinds: Dict[str, Any],
+    usecols: Optional[List[str]],
+) -> Iterator[ColumnTable]:
+    with f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if usecols is not None:
+            missing = set(usecols) - set(header)
+            if missing:
+                raise ValueError(f"Columns not found in {source}: {sorted(missing)}")
+            indices = [header.index(name) for name in usecols]
+            header = list(usecols)
+        while True:
+            rows = list(islice(reader, chunksize))
+            if not rows:
+                break
+            if usecols is not None:
+                rows = [[row[i] if i < len(row) else "" for i in indices] for row in rows]
+            table = ColumnTable.from_rows(header, rows, kinds)
+            kinds.update(table.kinds)
+            yield table
+
+
+def read_csv(
+    path: Union[str, Path],
+    kinds: Optional[Dict[str, Any]] = None,
+    usecols: Optional[List[str]] = None,
+) -> ColumnTable:
+    """
+    Read a whole CSV file with a header row into a typed table.
+
+    The file is converted in chunks, so the raw strings of only one chunk
+    are held at a time.
+
+    Parameters
+    ----------
+    path : str or Path
+        CSV file
+    kinds : Dict[str, Any], optional
+        Column types; others are inferred
+    usecols : List[str], optional
+        Only read these columns
+
+    Returns
+    -------
+    ColumnTable
+        The file contents
+    """
+    table = ColumnTable()
+    for chunk in iter_csv(path, READ_CHUNK_ROWS, kinds, usecols):
+        table.append(chunk)
+    return table
+
+
+def summarize(
+    tables: Union[ColumnTable, Iterable[ColumnTable]],
+    initial: Optional[Dict[str, RunningStats]] = None,
+    on_progress: Optional[Callable[[int, Dict[str, RunningStats]], None]] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Summarize the numeric columns of a table or a stream of tables.
+
+    A column that holds text in any table is left out, as it would be from
+    the summary of the whole table.
+
+    Parameters
+    ----------
+    tables : ColumnTable or Iterable[ColumnTable]
+        Data to summarize; a stream is consumed in one pass
+    initial : Dict[str, RunningStats], optional
+        Statistics of earlier tables to continue from, e.g. from a checkpoint;
+        None for columns found not to be numeric
+    on_progress : Callable[[int, Dict[str, RunningStats]], None], optional
+        Called with the number of tables consumed and the statistics so far
+        after each table
+
+    Returns
+    -------
+    Dict[str, Dict[str, float]]
+        ``count``, ``mean``, ``std``, ``min`` and ``max`` per column
+    """
+    if isinstance(tables, ColumnTable):
+        tables = [tables]
+    # None marks columns that turned out not to be numeric, as the whole table would type them
+    totals: Dict[str, Optional[RunningStats]] = dict(initial or {})
+    for position, table in enumerate(tables, start=1):
+        for name, kind in table.kinds.items():
+            if kind == "str":
+                if totals.get(name) is not None:
+                    logger.warning(f"Column {name} holds text from table {position} on, leaving it out of the summary")
+                totals[name] = None
+        for name, stats in table.describe().items():
+            if name not in totals:
+                totals[name] = stats
+            elif totals[name] is not None:
+                totals[name] = totals[name].merge(stats)
+        if on_progress is not None:
+            on_progress(position, totals)
+    return {name: stats.as_dict() for name, stats in totals.items() if stats is not None}
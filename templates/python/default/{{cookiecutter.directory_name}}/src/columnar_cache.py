@@ -0,0 +1,252 @@
+"""
+Content-addressed columnar cache for raw input files.
+
+Parsing CSV or Excel text is usually the slowest part of loading data. The
+first time a raw file is loaded, the parsed table is written as an
+uncompressed Arrow IPC file to ``data/processed/.columnar``. The cache file
+name contains a hash of the source file contents and of the read options,
+so a changed source or different options never hit a stale entry. Later
+loads memory-map the Arrow file instead of parsing the text again.
+
+Hashing a large source on every load would defeat the purpose, so the
+digest is remembered together with the file's size and modification time
+and only recomputed when either of them changes. Updates of the index are
+serialized with a lock file, so concurrent pipeline stages keep each
+other's entries.
+
+Requires ``pyarrow``; without it the loaders simply parse the source.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .utils import atomic_path, file_digest, file_lock, lazy_import, options_digest
+
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow", optional=True)
+feather = lazy_import("pyarrow.feather", optional=True)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).parent.parent / "data" / "processed" / ".columnar"
+INDEX_FILE = "index.json"
+
+
+def _load_index(cache_dir: Path) -> Dict[str, Any]:
+    try:
+        with open(cache_dir / INDEX_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(cache_dir: Path, index: Dict[str, Any]) -> None:
+    with atomic_path(cache_dir / INDEX_FILE) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+
+
+@contextmanager
+def _updating_index(cache_dir: Path) -> Iterator[Dict[str, Any]]:
+    """Load the index for changing it and save it afterwards, locked against concurrent runs."""
+    with file_lock(cache_dir / f"{INDEX_FILE}.lock"):
+        index = _load_index(cache_dir)
+        yield index
+        _save_index(cache_dir, index)
+
+
+def source_digest(source: Path, cache_dir: Path = CACHE_DIR) -> str:
+    """
+    Return the content hash of ``source``.
+
+    The hash is reused from the cache index while the file's size and
+    modification time are unchanged. When the source has changed, cache
+    files built from its previous contents are deleted.
+
+    Parameters
+    ----------
+    source : Path
+        Raw input file
+    cache_dir : Path, optional
+        Cache directory, by default ``data/processed/.columnar``
+
+    Returns
+    -------
+    str
+        Hex SHA-256 digest of the file contents
+    """
+    source = Path(source).resolve()
+    stat = source.stat()
+    entry = _load_index(cache_dir).get(str(source))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["digest"]
+
+    # Hash outside the lock; only the index update is serialized
+    digest = file_digest(source)
+    with _updating_index(cache_dir) as index:
+        entry = index.get(str(source))
+        if entry and entry["digest"] != digest:
+            logger.info(f"{source.name} changed since it was cached, discarding old cache files")
+            for name in entry.get("files", []):
+                (cache_dir / name).unlink(missing_ok=True)
+        files = entry.get("files", []) if entry and entry["digest"] == digest else []
+        index[str(source)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest, "files": files}
+    return digest
+
+
+def _register(source: Path, cache_path: Path, cache_dir: Path) -> None:
+    with _updating_index(cache_dir) as index:
+        entry = index.get(str(Path(source).resolve()))
+        if entry is not None and cache_path.name not in entry["files"]:
+            entry["files"].append(cache_path.name)
+
+
+def cache_path_for(source: Path, options: Optional[Dict[str, Any]] = None, cache_dir: Path = CACHE_DIR) -> Path:
+    """Return the cache file location for ``source`` read with ``options``."""
+    digest = source_digest(source, cache_dir)
+    return cache_dir / f"{Path(source).stem}-{digest[:16]}-{options_digest(options or {})}.arrow"
+
+
+def read_cached(
+    source: Path,
+    parse: Callable[[], pd.DataFrame],
+    options: Optional[Dict[str, Any]] = None,
+    cache_dir: Path = CACHE_DIR,
+) -> pd.DataFrame:
+    """
+    Load a raw file through the columnar cache.
+
+    Parameters
+    ----------
+    source : Path
+        Raw input file
+    parse : Callable[[], pd.DataFrame]
+        Parses ``source`` on a cache miss
+    options : Dict[str, Any], optional
+        Read options that affect the parsed result (dtypes, columns, ...),
+        part of the cache key
+    cache_dir : Path, optional
+        Cache directory, by default ``data/processed/.columnar``
+
+    Returns
+    -------
+    pd.DataFrame
+        Parsed data
+    """
+    if pa is None:
+        logger.debug("pyarrow is not installed, columnar cache disabled")
+        return parse()
+
+    cache_path = cache_path_for(source, options, cache_dir)
+    if cache_path.exists():
+        logger.info(f"Loading cached copy {cache_path.name}")
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+
+    data = parse()
+    try:
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        with atomic_path(cache_path) as tmp_path:
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+        _register(source, cache_path, cache_dir)
+        logger.info(f"Cached {Path(source).name} as {cache_path.name}")
+    except (pa.ArrowException, OSError) as e:
+        logger.warning(f"Could not cache {Path(source).name}: {e}")
+    return data
+
+
+def iter_cached(
+    source: Path,
+    parse_chunks: Callable[[], Iterator[pd.DataFrame]],
+    chunksize: int,
+    options: Optional[Dict[str, Any]] = None,
+    cache_dir: Path = CACHE_DIR,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a raw file in chunks through the columnar cache.
+
+    On a cache hit, chunks are sliced out of the memory-mapped Arrow file,
+    so only the chunk being converted is materialized. On a miss the parsed
+    chunks are appended to a new cache file while they are handed out; the
+    file is only published once the source has been read to the end.
+
+    Parameters
+    ----------
+    source : Path
+        Raw input file
+    parse_chunks : Callable[[], Iterator[pd.DataFrame]]
+        Returns an iterator over the parsed chunks on a cache miss
+    chunksize : int
+        Number of rows per chunk returned on a cache hit
+    options : Dict[str, Any], optional
+        Read options that affect the parsed result, part of the cache key
+    cache_dir : Path, optional
+        Cache directory, by default ``data/processed/.columnar``
+
+    Returns
+    -------
+    Iterator[pd.DataFrame]
+        Consecutive chunks of the data
+    """
+    if pa is None:
+        logger.debug("pyarrow is not installed, columnar cache disabled")
+        return parse_chunks()
+
+    # Hash the source right away so that a missing or unreadable file is
+    # reported here rather than on the first iteration
+    cache_path = cache_path_for(source, options, cache_dir)
+    if cache_path.exists():
+        logger.info(f"Streaming cached copy {cache_path.name}")
+        return _iter_table(cache_path, chunksize)
+    return _iter_and_cache(source, parse_chunks, cache_path, cache_dir)
+
+
+def _iter_table(cache_path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    table = feather.read_table(cache_path, memory_map=True)
+    for start in range(0, table.num_rows, chunksize):
+        chunk = table.slice(start, chunksize).to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        yield chunk
+
+
+def _iter_and_cache(
+    source: Path,
+    parse_chunks: Callable[[], Iterator[pd.DataFrame]],
+    cache_path: Path,
+    cache_dir: Path,
+) -> Iterator[pd.DataFrame]:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    writer = None
+    schema = None
+    failed = False
+    try:
+        for chunk in parse_chunks():
+            if not failed:
+                try:
+                    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                    if writer is None:
+                        schema = table.schema
+                        writer = pa.ipc.new_file(str(tmp_path), schema)
+                    writer.write_table(table)
+                except (pa.ArrowException, OSError) as e:
+                    logger.warning(f"Could not cache {Path(source).name}: {e}")
+                    failed = True
+            yield chunk
+        if writer is not None and not failed:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, cache_path)
+            _register(source, cache_path, cache_dir)
+            logger.info(f"Cached {Path(source).name} as {cache_path.name}")
+    finally:
+        # Reached with a partial file if the source failed to parse or the
+        # caller stopped iterating early
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,433 @@
+"""
+Content-addressed cache for the results of expensive functions.
+
+Decorate a function with ``memoize`` and its return values are pickled to
+``data/processed/.cache``::
+
+    @memoize(ignore=("n_workers",))
+    def analyze_data(data, n_workers=None, ...):
+        ...
+
+The cache key combines
+
+- the function's qualified name and a hash of its source code (plus the
+  source of anything listed in ``depends``), so editing the function
+  invalidates its entries, and
+- a hash of the *contents* of the arguments, not their identity:
+  DataFrames and Series are hashed with ``pd.util.hash_pandas_object``,
+  NumPy arrays through their buffer, existing files given as ``Path``
+  through their contents, and anything else through its pickle.
+  Arrays stored on disk (whole memory-mapped files, HDF5 datasets, Zarr
+  arrays in a directory, and ``ArrayView``s of them) are keyed by the
+  path, size and modification time of their files, as the pipeline does,
+  so a cache hit does not read them. Other arrays with ``shape`` and
+  ``dtype`` are read in blocks of rows and hashed by content.
+
+Because the key does not depend on which process computes it, results
+computed in a notebook are reused by ``python -m src.main`` and vice
+versa. Iterators (streamed chunks) cannot be hashed without consuming
+them; calls with such arguments bypass the cache.
+
+The cache directory is kept under a size budget (``ComputeCache.max_bytes``,
+1 GiB by default). When a new entry pushes it over the budget, the least
+recently used entries are deleted; a hit refreshes an entry's
+modification time, which serves as its last-use time. Hits, misses,
+bypassed calls and the compute time saved are counted per function and
+returned by ``ComputeCache.stats``.
+"""
+
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .utils import atomic_path, file_digest
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).parent.parent / "data" / "processed" / ".cache"
+DEFAULT_BUDGET = 1024 ** 3
+ENTRY_SUFFIX = ".pkl"
+ARRAY_BLOCK_BYTES = 64 * 1024 ** 2
+
+
+class Uncacheable(Exception):
+    """An argument whose contents cannot be hashed."""
+
+
+def _update_array(digest: "hashlib._Hash", array: "np.ndarray") -> None:
+    np = sys.modules["numpy"]
+    digest.update(f"ndarray:{array.dtype.str}:{array.shape};".encode())
+    if array.dtype.hasobject:
+        digest.update(pickle.dumps(array, protocol=pickle.HIGHEST_PROTOCOL))
+    elif array.flags.c_contiguous:
+        # Hashes memory-mapped arrays straight from the mapping
+        digest.update(array.reshape(-1).view(np.uint8))
+    else:
+        for block in (array[start:start + 65536] for start in range(0, len(array), 65536)):
+            digest.update(np.ascontiguousarray(block).reshape(-1).view(np.uint8))
+
+
+def _array_files(array: Any) -> Optional[Tuple[str, List[Path]]]:
+    """Where an on-disk array lives and the files holding it; None if that is not known."""
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(array, np.memmap):
+        filename = getattr(array, "filename", None)
+        # A view of part of the mapping shares its file; only a whole mapping is identified by it
+        if filename and array.flags.c_contiguous and array.offset + array.nbytes == os.path.getsize(filename):
+            return f"memmap:{array.offset}", [Path(filename)]
+        return None
+    h5file = getattr(array, "file", None)
+    if getattr(h5file, "filename", None) and isinstance(getattr(array, "name", None), str):
+        return f"hdf5:{array.name}", [Path(h5file.filename)]
+    store_path = getattr(array, "store_path", None)
+    if store_path is not None:  # Zarr 3
+        root, path = getattr(store_path.store, "root", None), store_path.path
+    else:  # Zarr 2
+        root, path = getattr(getattr(array, "store", None), "path", None), getattr(array, "path", None)
+    if isinstance(root, (str, Path)) and isinstance(path, str) and (Path(root) / path).is_dir():
+        return f"zarr:{path}", sorted(p for p in (Path(root) / path).rglob("*") if p.is_file())
+    return None
+
+
+def _update_array_files(digest: "hashlib._Hash", array: Any) -> bool:
+    """Hash an on-disk array by the identity of its files; False if they are unknown."""
+    np, views = sys.modules.get("numpy"), sys.modules.get(f"{__package__}.array_store")
+    if np is None:
+        return False
+    usecols = None
+    if views is not None and isinstance(array, views.ArrayView):
+        array, usecols = array.array, array.usecols
+    try:
+        location = _array_files(array)
+        if location is None:
+            return False
+        where, files = location
+        stats = [(path.resolve(), path.stat()) for path in files]
+    except (OSError, ValueError):  # e.g. a deleted file or a closed HDF5 file
+        return False
+    digest.update(f"arrayfile:{np.dtype(array.dtype).str}:{tuple(array.shape)}:{where}:{usecols!r}:{len(files)}[".encode())
+    for path, stat in stats:
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    digest.update(b"]")
+    return True
+
+
+def _is_array_like(value: Any) -> bool:
+    return all(hasattr(value, name) for name in ("shape", "dtype", "__getitem__"))
+
+
+def _update_array_like(digest: "hashlib._Hash", array: Any) -> None:
+    """Hash an on-disk array by its contents, reading blocks of rows."""
+    np = sys.modules.get("numpy")
+    if np is None:
+        raise Uncacheable(f"cannot read {type(array).__name__} contents without NumPy")
+    shape = tuple(array.shape)
+    digest.update(f"arraylike:{np.dtype(array.dtype).str}:{shape};".encode())
+    try:
+        if not shape:
+            _update_array(digest, np.asarray(array[()]))
+            return
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * np.dtype(array.dtype).itemsize
+        rows = max(1, ARRAY_BLOCK_BYTES // max(row_bytes, 1))
+        for start in range(0, shape[0], rows):
+            _update_array(digest, np.asarray(array[start:start + rows]))
+    except Exception as e:
+        raise Uncacheable(f"cannot read {type(array).__name__} contents: {e}")
+
+
+def _update(digest: "hashlib._Hash", value: Any) -> None:
+    """Feed a type-tagged encoding of ``value``'s contents into ``digest``."""
+    # Frames and arrays can only exist once their library was imported, so
+    # looking them up here never imports pandas or NumPy
+    pd, np = sys.modules.get("pandas"), sys.modules.get("numpy")
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}:{len(value)}[".encode())
+        for item in value:
+            _update(digest, item)
+        digest.update(b"]")
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}(".encode())
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+        digest.update(b")")
+    elif isinstance(value, (set, frozenset)):
+        digest.update(f"set:{sorted(repr(item) for item in value)};".encode())
+    elif isinstance(value, Path):
+        content = file_digest(value) if value.is_file() else "not a file"
+        digest.update(f"path:{value}:{content};".encode())
+    elif pd is not None and isinstance(value, (pd.DataFrame, pd.Series)):
+        columns = list(value.columns) if isinstance(value, pd.DataFrame) else [value.name]
+        dtypes = list(value.dtypes) if isinstance(value, pd.DataFrame) else [value.dtype]
+        digest.update(f"{type(value).__name__}:{value.shape}:{columns!r}:{dtypes!r};".encode())
+        try:
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().view(np.uint8))
+        except TypeError as e:
+            raise Uncacheable(f"cannot hash {type(value).__name__} contents: {e}")
+    elif np is not None and isinstance(value, np.ndarray):
+        if not _update_array_files(digest, value):
+            _update_array(digest, value)
+    elif _is_array_like(value):
+        # Their pickle holds a path, not the data it points to
+        if not _update_array_files(digest, value):
+            _update_array_like(digest, value)
+    elif isinstance(value, Iterator):
+        raise Uncacheable(f"{type(value).__name__} can only be read once")
+    else:
+        try:
+            digest.update(f"pickle:{type(value).__qualname__}:".encode())
+            digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            raise Uncacheable(f"cannot pickle {type(value).__name__}: {e}")
+
+
+def source_digest(obj: Any) -> str:
+    """Hash of the source code of a function or module (of its bytecode if the source is unavailable)."""
+    obj = inspect.unwrap(obj)
+    try:
+        source = inspect.getsource(obj).encode()
+    except (OSError, TypeError):
+        code = getattr(obj, "__code__", None)
+        source = code.co_code + repr(code.co_consts).encode() if code else repr(obj).encode()
+    return hashlib.sha256(source).hexdigest()
+
+
+class ComputeCache:
+    """
+    A directory of pickled function results with a size budget.
+
+    Parameters
+    ----------
+    directory : Path, optional
+        Cache directory, by default ``data/processed/.cache``
+    max_bytes : int, optional
+        Size budget of the directory, by default 1 GiB
+    enabled : bool, optional
+        When False, decorated functions are always called
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, max_bytes: int = DEFAULT_BUDGET, enabled: bool = True):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, event: str, seconds: float = 0.0) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {"hits": 0, "misses": 0, "bypassed": 0, "seconds_saved": 0.0})
+            stats[event] += 1
+            stats["seconds_saved"] += seconds
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Cache statistics of this process.
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            Per function: number of ``hits``, ``misses`` and ``bypassed``
+            calls, and the compute time (``seconds_saved``) the hits saved
+        """
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def usage(self) -> Tuple[int, int]:
+        """Number of entries and total bytes currently in the cache directory."""
+        entries = self._entries()
+        return len(entries), sum(size for _, _, size in entries)
+
+    def _entries(self) -> List[Tuple[str, int, int]]:
+        """``(path, last use, size)`` of every entry."""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(ENTRY_SUFFIX):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue  # evicted by another process
+                        entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def key(self, func: Callable, args: Iterable[Tuple[str, Any]], depends: Iterable[Any] = ()) -> str:
+        """
+        Cache key of a call of ``func`` with the named arguments ``args``.
+
+        Raises
+        ------
+        Uncacheable
+            If an argument cannot be hashed
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{func.__qualname__}:{source_digest(func)};".encode())
+        for dependency in depends:
+            digest.update(f"{source_digest(dependency)};".encode())
+        for name, value in args:
+            digest.update(f"{name}=".encode())
+            _update(digest, value)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Any, float]:
+        """Look up an entry; returns ``(found, value, seconds it took to compute)``."""
+        path = self.directory / f"{key}{ENTRY_SUFFIX}"
+        try:
+            with open(path, "rb") as f:
+                seconds, value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None, 0.0
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return False, None, 0.0
+        self._touch(path)
+        return True, value, seconds
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        """Record the last use; file system timestamps alone can be too coarse to order entries."""
+        now = time.time_ns()
+        try:
+            os.utime(path, ns=(now, now))
+        except FileNotFoundError:
+            pass  # evicted by another process meanwhile
+
+    def put(self, key: str, value: Any, seconds: float = 0.0) -> None:
+        """Store an entry, then evict the least recently used ones above the budget."""
+        path = self.directory / f"{key}{ENTRY_SUFFIX}"
+        try:
+            payload = pickle.dumps((seconds, value), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Result cannot be cached: {e}")
+            return
+        if len(payload) > self.max_bytes:
+            logger.info(f"Result of {len(payload):,} bytes exceeds the cache budget, not caching it")
+            return
+        with atomic_path(path) as tmp_path:
+            tmp_path.write_bytes(payload)
+        self._touch(path)
+        self.evict(keep=path)
+
+    def evict(self, max_bytes: Optional[int] = None, keep: Optional[Path] = None) -> int:
+        """
+        Delete least recently used entries until the cache fits ``max_bytes``.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Size to shrink to, by default the budget
+        keep : Path, optional
+            Entry that must not be deleted
+
+        Returns
+        -------
+        int
+            Number of bytes freed
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        freed = 0
+        for path, _, size in entries:
+            if total <= max_bytes:
+                break
+            if keep is not None and Path(path) == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            freed += size
+        if freed:
+            logger.info(f"Evicted {freed:,} bytes from the compute cache")
+        return freed
+
+    def clear(self) -> None:
+        """Delete all entries."""
+        self.evict(max_bytes=0)
+
+
+default_cache = ComputeCache()
+
+
+def memoize(
+    func: Optional[Callable] = None,
+    *,
+    cache: Optional[ComputeCache] = None,
+    ignore: Iterable[str] = (),
+    depends: Iterable[Any] = (),
+) -> Callable:
+    """
+    Cache a function's results by the contents of its arguments and its source.
+
+    Usable as ``@memoize`` or ``@memoize(ignore=(...))``. The undecorated
+    function remains available as ``__wrapped__``.
+
+    Parameters
+    ----------
+    func : Callable
+        Function to cache; its results must be picklable
+    cache : ComputeCache, optional
+        Cache to use, by default ``default_cache`` (looked up at call time,
+        so changing its settings takes effect immediately)
+    ignore : Iterable[str], optional
+        Parameters that do not affect the result, such as a worker count
+    depends : Iterable, optional
+        Functions or modules the result also depends on; their source
+        becomes part of the key
+
+    Returns
+    -------
+    Callable
+        The caching wrapper
+    """
+    ignore = frozenset(ignore)
+    depends = tuple(depends)
+
+    def decorate(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            active = cache or default_cache
+            if not active.enabled:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            try:
+                key = active.key(func, [(k, v) for k, v in bound.arguments.items() if k not in ignore], depends)
+            except Uncacheable as e:
+                logger.debug(f"Not caching {name}: {e}")
+                active._count(name, "bypassed")
+                return func(*args, **kwargs)
+
+            found, value, seconds = active.get(key)
+            if found:
+                logger.info(f"Reusing cached result of {name} (saves {seconds:.1f}s)")
+                active._count(name, "hits", seconds)
+                return value
+            active._count(name, "misses")
+            start = time.perf_counter()
+            value = func(*args, **kwargs)
+            active.put(key, value, time.perf_counter() - start)
+            return value
+
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
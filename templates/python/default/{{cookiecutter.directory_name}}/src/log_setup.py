@@ -0,0 +1,207 @@
+"""
+Non-blocking logging for the command line entry points.
+
+Importing a module of this package never configures logging; only
+``configure_logging`` does, and ``main()`` calls it for the duration of a
+run. It puts a ``QueueHandler`` on the root logger, so a log call only
+formats its message and appends the record to an in-memory queue. A
+``QueueListener`` thread takes the records off the queue and writes them
+to the console and to a size-rotated log file (``output.log``,
+``output.log.1``, ...), keeping disk I/O off the calling thread.
+
+Worker processes do not share the in-memory queue. Process pools pass
+``**worker_logging()`` to ``ProcessPoolExecutor``, whose initializer
+sends the workers' records through a ``multiprocessing`` queue to a
+second listener writing to the same handlers.
+
+Every record carries the pipeline stage that was running when it was
+logged (``set_log_stage``), shown in brackets in text output. With
+``json_lines=True`` the file gets one JSON object per line instead, with
+the fields ``time``, ``level``, ``logger``, ``stage`` and ``message``
+(plus ``exception`` if there is one).
+"""
+
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] [%(stage)s] %(message)s"
+DEFAULT_MAX_BYTES = 10 * 1024 ** 2
+DEFAULT_BACKUPS = 3
+# Overrides the default log file; src.pipeline gives every stage its own
+LOG_FILE_ENV = "CRESP_LOG_FILE"
+
+# Stage of the whole process, so records from worker threads carry it too
+_stage = "-"
+
+# Handlers of the running configure_logging and the listener for worker processes
+_handlers: Optional[List[logging.Handler]] = None
+_worker_listener: Optional[logging.handlers.QueueListener] = None
+_worker_lock = threading.Lock()
+
+
+def set_log_stage(name: str) -> None:
+    """Tag the records logged from now on with the stage ``name``."""
+    global _stage
+    _stage = name
+
+
+class StageFilter(logging.Filter):
+    """Add the current stage to records as ``record.stage``."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "stage"):
+            record.stage = _stage
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "stage": getattr(record, "stage", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue records as they are when they need no formatting (the usual f-string message)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args or record.exc_info or record.stack_info or not isinstance(record.msg, str):
+            return super().prepare(record)
+        return record
+
+
+def _log_to_queue(records: Any, level: int, stage: str) -> None:
+    """Pool initializer: send the worker's records to the parent's listener."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):  # inherited from a forked parent
+        root.removeHandler(handler)
+    handler = _QueueHandler(records)
+    handler.addFilter(StageFilter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    set_log_stage(stage)
+
+
+def worker_logging() -> Dict[str, Any]:
+    """
+    Keyword arguments for a ``ProcessPoolExecutor`` of the default start method that log the
+    workers through ``configure_logging``.
+
+    The multiprocessing queue and its listener are started on first use.
+    Outside ``configure_logging`` this is empty and the workers' logging
+    is left alone.
+    """
+    global _worker_listener
+    with _worker_lock:
+        if _handlers is None:
+            return {}
+        if _worker_listener is None:
+            _worker_listener = logging.handlers.QueueListener(multiprocessing.Queue(), *_handlers,
+                                                              respect_handler_level=True)
+            _worker_listener.start()
+        return {"initializer": _log_to_queue,
+                "initargs": (_worker_listener.queue, logging.getLogger().level, _stage)}
+
+
+def _stop_worker_listener() -> None:
+    global _worker_listener
+    with _worker_lock:
+        if _worker_listener is not None:
+            _worker_listener.stop()
+            _worker_listener.queue.close()
+            _worker_listener.queue.join_thread()
+            _worker_listener = None
+
+
+@contextmanager
+def configure_logging(
+    log_file: Optional[Union[str, Path]] = "output.log",
+    level: Union[int, str] = logging.INFO,
+    json_lines: bool = False,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backup_count: int = DEFAULT_BACKUPS,
+    console: bool = True,
+) -> Iterator[logging.handlers.QueueListener]:
+    """
+    Log through a background thread while the ``with`` block runs.
+
+    The root logger's previous level is restored and the queued records
+    are flushed when the block exits.
+
+    Parameters
+    ----------
+    log_file : str or Path, optional
+        Log file, by default ``output.log`` in the working directory; None
+        logs to the console only
+    level : int or str, optional
+        Level of the root logger, by default INFO
+    json_lines : bool, optional
+        Write the log file as JSON lines
+    max_bytes : int, optional
+        Rotate the log file when it would grow beyond this size, by
+        default 10 MB; 0 never rotates
+    backup_count : int, optional
+        Number of rotated files to keep, by default 3
+    console : bool, optional
+        Also log to standard output
+
+    Yields
+    ------
+    logging.handlers.QueueListener
+        The listener writing the records
+    """
+    handlers = []
+    if console:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(handler)
+    if log_file is not None:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                                       encoding="utf-8")
+        handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+        handlers.append(handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(StageFilter())
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+
+    global _handlers
+    root = logging.getLogger()
+    previous_level = root.level
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    listener.start()
+    _handlers = handlers
+    try:
+        yield listener
+    finally:
+        _handlers = None
+        root.removeHandler(queue_handler)
+        root.setLevel(previous_level)
+        listener.stop()
+        _stop_worker_listener()
+        for handler in handlers:
+            handler.close()
+        set_log_stage("-")
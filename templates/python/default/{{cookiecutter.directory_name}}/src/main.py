@@ -8,64 +8,209 @@ This module demonstrates basic scientific computing capabilities
 and serves as a starting point for your project.
 """
 
+from __future__ import annotations
+
 import sys
 import os
+import argparse
+import csv
 import logging
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Tuple, Any
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler("output.log")
-    ]
-)
+from typing import Dict, Iterable, Iterator, List, Optional, Union, Tuple, Any
+
+from .checkpoint import CheckpointMismatch, RunCheckpoint, run_fingerprint
+from .compute_cache import default_cache, memoize
+from .log_setup import DEFAULT_BACKUPS, LOG_FILE_ENV, configure_logging, set_log_stage
+from .resource_monitor import ResourceMonitor
+from .tracing import PROFILE_ENV, Tracer, profile_kinds
+from .result_store import write_results
+from .utils import atomic_path, lazy_import, parse_size
+
+# Logging is configured by main() (see src/log_setup.py), not on import
 logger = logging.getLogger(__name__)
 
-# Import optional libraries based on project configuration
+# Import optional libraries based on project configuration. Heavy libraries
+# are imported on first use, so --help and stages that do not need them
+# start quickly.
 {% if cookiecutter.include_data_analysis == 'True' %}
-import numpy as np
-import pandas as pd
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow", optional=True)
+pq = lazy_import("pyarrow.parquet", optional=True)
+
+from .array_store import is_array_file, is_array_like, iter_array_chunks, open_array, row_bytes
+from .arrow_dataset import is_dataset, iter_dataset, read_dataset, rows_for_budget
+from .columnar_cache import iter_cached, read_cached
+from .shards import ShardLoadError, find_shards, iter_shards, read_shards, rows_per_budget
+from . import quantiles, streaming_stats, wide_correlation
+from .streaming_stats import accumulate_chunks
+from .synthetic import iter_sample_chunks, write_sample_data
+from .wide_correlation import EDGES_SUFFIX, blocked_correlation, correlation_edges
+{% else %}
+from .column_table import ColumnTable, iter_csv, read_csv, summarize
+
+# Summaries of unchanged tables are reused from data/processed/.cache
+summarize_table = memoize(summarize)
 {% endif %}
 
 {% if cookiecutter.include_visualization == 'True' %}
-import matplotlib.pyplot as plt
-import seaborn as sns
+matplotlib = lazy_import("matplotlib")
+plt = lazy_import("matplotlib.pyplot")
+sns = lazy_import("seaborn")
+{% if cookiecutter.include_data_analysis == 'True' %}
+from .rendering import MAX_POINTS, render_batch
+{% endif %}
+
+# Backends that cannot open a window; plt.show() would do nothing useful
+NON_INTERACTIVE_BACKENDS = ("agg", "cairo", "pdf", "pgf", "ps", "svg", "template")
 {% endif %}
 
 
-def load_data(filename: str) -> Optional[{% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}Any{% endif %}]:
+def load_data(
+    filename: str,
+    chunksize: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    dtype: Optional[Dict[str, Any]] = None,
+    usecols: Optional[List[str]] = None,{% if cookiecutter.include_data_analysis == 'True' %}
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    key: Optional[str] = None,
+    n_workers: Optional[int] = None,
+    use_cache: bool = True,{% endif %}
+) -> Optional[{% if cookiecutter.include_data_analysis == 'True' %}Union[pd.DataFrame, np.ndarray, Iterator[pd.DataFrame]]{% else %}Union[ColumnTable, Iterator[ColumnTable]]{% endif %}]:
     """
     Load data from file.
     
+    CSV files{% if cookiecutter.include_data_analysis == 'True' %}, Excel files, Parquet/Arrow files or
+    hive-partitioned directories of them (e.g. ``processed/events``), and
+    dense arrays (``.npy``, ``.npz``, Zarr, HDF5) are supported. Arrays are
+    memory-mapped or opened lazily rather than read (see
+    ``src/array_store.py``). A glob pattern (``raw/run-*.csv``) or a
+    directory of CSV/Excel files loads all matching shards concurrently
+    and concatenates them in natural file-name order (see
+    ``src/shards.py``){% else %} are supported{% endif %}. By default the whole file is read into memory. Passing ``chunksize`` or
+    ``memory_budget`` switches to streaming mode: an iterator of fixed-size
+    chunks is returned instead, so files larger than RAM can be processed
+    one piece at a time.
+    
     Parameters
     ----------
     filename : str
         Name of the file to load (should be in the data directory)
+    chunksize : int, optional
+        Number of rows per chunk, enables streaming mode
+    memory_budget : int, optional
+        Approximate in-memory size of each chunk in bytes, enables streaming
+        mode. The row count is estimated from a sample at the start of the
+        file. Ignored when ``chunksize`` is given.
+    dtype : Dict[str, Any], optional
+        Explicit column types. Recommended in streaming mode, where types
+        inferred per chunk may otherwise differ between chunks.{% if cookiecutter.include_data_analysis != 'True' %}
+        Without pandas the types are ``int``, ``float`` or ``str``.{% endif %}
+    usecols : List[str], optional
+        Only read these columns{% if cookiecutter.include_data_analysis == 'True' %}. For Parquet/Arrow datasets the other
+        columns are not read from disk at all. For arrays, fields of a
+        structured array or column indices (``0``, ``1``, ...) of a 2-D array.
+    filters : List[Tuple[str, str, Any]], optional
+        Row filters for Parquet/Arrow datasets, e.g.
+        ``[("year", "==", 2024), ("x", ">", 0)]``. They are pushed down to
+        the scan, so partitions and row groups that cannot match are
+        skipped. See ``src/arrow_dataset.py``.
+    key : str, optional
+        Array to open inside an ``.npz`` archive, HDF5 file or Zarr group,
+        by default the first one
+    n_workers : int, optional
+        Number of threads parsing the shards of a multi-file input
+    use_cache : bool, optional
+        Keep a columnar copy of CSV and Excel inputs in ``data/processed``
+        and reuse it while the source is unchanged, by default True.
+        Requires pyarrow.{% endif %}
         
     Returns
     -------
-    {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}Any{% endif %}
-        Loaded data or None if loading fails
+    {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame, array-like or Iterator[pd.DataFrame]{% else %}ColumnTable or Iterator[ColumnTable]{% endif %}
+        Loaded data (or an iterator of chunks in streaming mode), or None if
+        loading fails{% if cookiecutter.include_data_analysis == 'True' %}. Shards of a multi-file input that fail to load
+        are skipped and listed in ``data.attrs["failed_shards"]``.
+        
+    Raises
+    ------
+    ShardLoadError
+        If a multi-file input matches no files or none of them loads;
+        there is no fallback to sample data in that case{% endif %}
     """
     data_dir = Path(__file__).parent.parent / "data"
+    streaming = chunksize is not None or memory_budget is not None
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    options = {"dtype": dtype, "usecols": usecols}
+    cache_dir = data_dir / "processed" / ".columnar"
+    {% endif %}
     try:
         file_path = data_dir / filename
         logger.info(f"Loading data from {file_path}")
         
+        {% if cookiecutter.include_data_analysis == 'True' %}
+        shards = find_shards(data_dir, filename)
+        if shards is not None:
+            if not shards:
+                raise ShardLoadError(f"No input files match {filename}")
+            if not streaming:
+                return read_shards(shards, dtype=dtype, usecols=usecols, n_workers=n_workers)
+            if chunksize is None:
+                chunksize = rows_per_budget(shards, memory_budget, dtype, usecols)
+            logger.info(f"Streaming {len(shards)} shards in chunks of about {chunksize} rows")
+            return iter_shards(shards, chunksize, dtype=dtype, usecols=usecols, n_workers=n_workers)
+        if is_array_file(file_path):
+            array = open_array(file_path, key=key, usecols=usecols)
+            logger.info(f"Opened {file_path.name} as a {array.dtype} array of shape {array.shape}")
+            if not streaming:
+                # A view of the file; analyze_data and visualize_data stream it in blocks
+                return array
+            if chunksize is None:
+                chunksize = max(1, int(memory_budget // max(row_bytes(array), 1)))
+            return iter_array_chunks(array, chunksize, close=True)
+        if is_dataset(file_path):
+            if not streaming:
+                return read_dataset(file_path, columns=usecols, filters=filters)
+            if chunksize is None:
+                chunksize = rows_for_budget(file_path, memory_budget, usecols)
+            logger.info(f"Streaming {file_path.name} in chunks of up to {chunksize} rows")
+            return iter_dataset(file_path, chunksize, columns=usecols, filters=filters)
+        if filters:
+            logger.warning("Row filters only apply to Parquet/Arrow datasets and are ignored for this file")
+        
+        {% endif %}
         if file_path.suffix == ".csv":
             {% if cookiecutter.include_data_analysis == 'True' %}
-            return pd.read_csv(file_path)
+            if not streaming:
+                parse = partial(pd.read_csv, file_path, dtype=dtype, usecols=usecols)
+                return read_cached(file_path, parse, options, cache_dir) if use_cache else parse()
+            if chunksize is None:
+                chunksize = _rows_for_budget(file_path, memory_budget, dtype, usecols)
+            logger.info(f"Streaming {file_path.name} in chunks of {chunksize} rows")
+            parse_chunks = partial(pd.read_csv, file_path, dtype=dtype, usecols=usecols, chunksize=chunksize)
+            return iter_cached(file_path, parse_chunks, chunksize, options, cache_dir) if use_cache else parse_chunks()
             {% else %}
-            with open(file_path, 'r') as f:
-                return [line.strip().split(',') for line in f]
+            if not streaming:
+                return read_csv(file_path, kinds=dtype, usecols=usecols)
+            if chunksize is None:
+                chunksize = _rows_for_budget(file_path, memory_budget, dtype, usecols)
+            logger.info(f"Streaming {file_path.name} in chunks of {chunksize} rows")
+            return iter_csv(file_path, chunksize, kinds=dtype, usecols=usecols)
             {% endif %}
         elif file_path.suffix in [".xls", ".xlsx"]:
             {% if cookiecutter.include_data_analysis == 'True' %}
-            return pd.read_excel(file_path)
+            parse = partial(pd.read_excel, file_path, dtype=dtype, usecols=usecols)
+            data = read_cached(file_path, parse, options, cache_dir) if use_cache else parse()
+            if not streaming:
+                return data
+            # Excel files cannot be read incrementally, so the sheet is loaded
+            # once and handed out in slices to keep the downstream API uniform
+            logger.warning("Excel files cannot be streamed; loading the whole sheet before chunking")
+            if chunksize is None:
+                bytes_per_row = data.memory_usage(index=False, deep=True).sum() / max(len(data), 1)
+                chunksize = max(1, int(memory_budget // max(bytes_per_row, 1)))
+            return (data.iloc[start:start + chunksize] for start in range(0, len(data), chunksize))
             {% else %}
             logger.error("Excel support requires pandas. Install with: pip install pandas openpyxl")
             return None
@@ -73,13 +218,50 @@ def load_data(filename: str) -> Optional[{% if cookiecutter.include_data_analysi
         else:
             logger.error(f"Unsupported file format: {file_path.suffix}")
             return None
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    except ShardLoadError as e:
+        logger.error(f"Error loading data: {e}")
+        raise
+    {% endif %}
     except Exception as e:
         logger.error(f"Error loading data: {e}")
         # Generate sample data as fallback
+        if streaming:
+            return iter([generate_sample_data()])
         return generate_sample_data()
 
 
-def generate_sample_data(n_samples: int = 100) -> {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}Dict[str, List[float]]{% endif %}:
+{% if cookiecutter.include_data_analysis == 'True' %}
+def _rows_for_budget(
+    file_path: Path,
+    memory_budget: int,
+    dtype: Optional[Dict[str, Any]] = None,
+    usecols: Optional[List[str]] = None,
+    sample_rows: int = 1000,
+) -> int:
+    """Estimate how many rows of a CSV file fit into ``memory_budget`` bytes."""
+    sample = pd.read_csv(file_path, dtype=dtype, usecols=usecols, nrows=sample_rows)
+    if sample.empty:
+        return sample_rows
+    bytes_per_row = sample.memory_usage(index=False, deep=True).sum() / len(sample)
+    return max(1, int(memory_budget // max(bytes_per_row, 1)))
+{% else %}
+def _rows_for_budget(
+    file_path: Path,
+    memory_budget: int,
+    dtype: Optional[Dict[str, Any]] = None,
+    usecols: Optional[List[str]] = None,
+    sample_rows: int = 1000,
+) -> int:
+    """Estimate how many rows of a CSV file fit into ``memory_budget`` bytes."""
+    sample = next(iter_csv(file_path, sample_rows, kinds=dtype, usecols=usecols), None)
+    if sample is None or sample.n_rows == 0:
+        return sample_rows
+    return max(1, int(memory_budget // max(sample.nbytes / sample.n_rows, 1)))
+{% endif %}
+
+
+def generate_sample_data(n_samples: int = 100, seed: int = 42) -> {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}ColumnTable{% endif %}:
     """
     Generate sample data for demonstration.
     
@@ -87,40 +269,88 @@ def generate_sample_data(n_samples: int = 100) -> {% if cookiecutter.include_dat
     ----------
     n_samples : int, optional
         Number of samples to generate, by default 100
+    seed : int, optional
+        Random seed, by default 42{% if cookiecutter.include_data_analysis == 'True' %}. The same seed always gives the same data;
+        see ``src/synthetic.py`` for generating large datasets to disk.{% endif %}
         
     Returns
     -------
-    {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}Dict[str, List[float]]{% endif %}
+    {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}ColumnTable{% endif %}
         Generated sample data
     """
     logger.info(f"Generating sample data with {n_samples} samples")
     
     {% if cookiecutter.include_data_analysis == 'True' %}
-    np.random.seed(42)  # for reproducibility
-    x = np.linspace(0, 10, n_samples)
-    y = np.sin(x) + 0.1 * np.random.randn(n_samples)
-    return pd.DataFrame({"x": x, "y": y})
+    chunks = list(iter_sample_chunks(n_samples, seed=seed, n_workers=1))
+    if not chunks:
+        return pd.DataFrame({"x": [], "y": []}, dtype=np.float64)
+    return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
     {% else %}
     # Simple data generation without NumPy/Pandas
     import math
     import random
-    random.seed(42)  # for reproducibility
+    random.seed(seed)  # for reproducibility
     
     x = [i * 10 / (n_samples - 1) for i in range(n_samples)]
     y = [math.sin(val) + 0.1 * (random.random() * 2 - 1) for val in x]
-    return {"x": x, "y": y}
+    return ColumnTable({"x": x, "y": y})
     {% endif %}
 
 
 {% if cookiecutter.include_data_analysis == 'True' %}
-def analyze_data(data: pd.DataFrame) -> Dict[str, Any]:
+def analyze_data(
+    data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    n_workers: Optional[int] = None,
+    percentiles: Optional[List[float]] = None,
+    exact: Optional[bool] = None,
+    quantile_error: float = 0.01,
+    wide: bool = False,
+    corr_dtype: str = "float64",
+    top_k: Optional[int] = None,
+    corr_threshold: Optional[float] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+) -> Dict[str, Any]:
     """
     Perform basic data analysis.
     
+    Results for whole frames and arrays are cached by the contents of the
+    data and the options (see ``src/compute_cache.py``), so repeated runs
+    on unchanged data, including from notebooks, return immediately.
+    Streamed chunks are always analyzed.
+    
     Parameters
     ----------
-    data : pd.DataFrame
-        Data to analyze
+    data : pd.DataFrame, array-like or Iterable[pd.DataFrame]
+        Data to analyze, either a whole frame or an iterable of chunks as
+        returned by ``load_data`` in streaming mode. Arrays opened by
+        ``load_data`` are processed in row blocks like chunks.
+    n_workers : int, optional
+        Number of processes used to analyze chunks, by default one per CPU
+    percentiles : List[float], optional
+        Percentiles to include in the summary, by default the quartiles
+    exact : bool, optional
+        True computes the summary with ``describe()`` (chunks are first
+        collected in memory), False estimates percentiles with mergeable
+        quantile sketches. By default whole frames are summarized exactly
+        and chunks with sketches.
+    quantile_error : float, optional
+        Normalized rank error of the sketched percentiles, by default 0.01
+    wide : bool, optional
+        Wide-data mode for tables with thousands of columns: the correlation
+        matrix is computed in column blocks (see ``src/wide_correlation.py``).
+        Streamed chunks are collected in memory first.
+    corr_dtype : str, optional
+        "float64" (default) or "float32" for the wide-data correlation
+    top_k : int, optional
+        In wide-data mode, keep only the ``top_k`` strongest correlations of
+        each column and write them to ``data/results`` instead of returning
+        the dense matrix
+    corr_threshold : float, optional
+        In wide-data mode, keep only correlations with ``|r| >=
+        corr_threshold`` and write them to ``data/results``
+    checkpoint : RunCheckpoint, optional
+        Save the state of a chunked analysis every few chunks and continue
+        from the state saved by an interrupted run
         
     Returns
     -------
@@ -129,33 +359,199 @@ def analyze_data(data: pd.DataFrame) -> Dict[str, Any]:
     """
     logger.info("Analyzing data")
     
+    if is_array_like(data):
+        data = iter_array_chunks(data)
+    if wide and not isinstance(data, pd.DataFrame):
+        logger.info("Wide-data mode: collecting all chunks in memory")
+        data = pd.concat(list(data))
+        exact = True if exact is None else exact
+    if exact and not isinstance(data, pd.DataFrame):
+        logger.info("Exact mode: collecting all chunks in memory")
+        data = pd.concat(list(data))
+    if exact is False and isinstance(data, pd.DataFrame) and not wide:
+        data = [data]
+    if not isinstance(data, pd.DataFrame):
+        return _analyze_chunks(data, n_workers, percentiles, quantile_error, checkpoint)
+    
     # Store results in a dictionary
     results = {}
     
     # Basic summary statistics
-    results["summary"] = data.describe()
+    results["summary"] = data.describe(percentiles=percentiles)
     logger.info("Generated summary statistics")
     
     # Example correlation analysis
     if data.shape[1] > 1:
-        results["correlation"] = data.corr()
+        if wide:
+            results.update(_wide_correlation(data.select_dtypes(include=[np.number]), corr_dtype, top_k, corr_threshold))
+        else:
+            results["correlation"] = data.corr()
         logger.info("Generated correlation matrix")
     
     return results
+
+
+def _wide_correlation(
+    data: pd.DataFrame,
+    dtype: str,
+    top_k: Optional[int],
+    threshold: Optional[float],
+) -> Dict[str, Any]:
+    """Blocked correlation, written to ``data/results`` as an edge list if top_k/threshold is set."""
+    if top_k is None and threshold is None:
+        return {"correlation": blocked_correlation(data, dtype=dtype)}
+    
+    output_dir = Path(__file__).parent.parent / "data" / "results"
+    edges_path = output_dir / f"correlation_edges{EDGES_SUFFIX}"
+    n_edges = correlation_edges(data, edges_path, top_k=top_k, threshold=threshold, dtype=dtype)
+    return {"correlation_edges": str(edges_path), "correlation_edge_count": n_edges}
+
+
+def _analyze_chunks(
+    chunks: Iterable[pd.DataFrame],
+    n_workers: Optional[int] = None,
+    percentiles: Optional[List[float]] = None,
+    quantile_error: float = 0.01,
+    checkpoint: Optional[RunCheckpoint] = None,
+) -> Dict[str, Any]:
+    """
+    Compute summary statistics and correlations one chunk at a time.
+    
+    Per-chunk moments and quantile sketches are computed in parallel and
+    merged, so memory use is independent of the number of rows. See
+    ``src/streaming_stats.py`` and ``src/quantiles.py`` for the accuracy
+    relative to describe()/corr().
+    """
+    initial, on_progress = None, None
+    if checkpoint is not None:
+        chunks, initial, on_progress = checkpoint.resume_chunks("analysis", chunks)
+    moments = accumulate_chunks(chunks, n_workers=n_workers, quantile_error=quantile_error,
+                                initial=initial, on_progress=on_progress)
+    
+    results = {}
+    if moments is None or not moments.columns:
+        logger.warning("No numeric data to analyze")
+        return results
+    
+    results["summary"] = moments.summary(percentiles or (0.25, 0.5, 0.75))
+    logger.info("Generated summary statistics")
+    
+    if len(moments.columns) > 1:
+        results["correlation"] = moments.correlation()
+        logger.info("Generated correlation matrix")
+    
+    return results
+
+
+# Results for unchanged data are reused from data/processed/.cache; they are
+# invalidated by edits to analyze_data, its helpers or the modules they use
+analyze_data = memoize(analyze_data, ignore=("n_workers", "checkpoint"),
+                       depends=(_wide_correlation, _analyze_chunks, quantiles, streaming_stats, wide_correlation))
+
+
+# Rows sampled from streamed input for plotting; batch mode samples
+# BATCH_SAMPLE_FACTOR times max_points rows instead
+SAMPLE_ROWS = 100_000
+BATCH_SAMPLE_FACTOR = 10
+
+
+def sample_chunks(chunks: Iterable[pd.DataFrame], n_rows: int = SAMPLE_ROWS, seed: int = 42) -> pd.DataFrame:
+    """
+    Draw a uniform random sample of rows from a stream of chunks.
+    
+    Every row gets a random key and the ``n_rows`` rows with the smallest
+    keys are kept (bottom-k sampling), so at most ``n_rows`` plus one chunk
+    are held in memory at any time.
+    
+    Parameters
+    ----------
+    chunks : Iterable[pd.DataFrame]
+        Chunks to sample from
+    n_rows : int, optional
+        Maximum number of rows in the sample, by default 100000
+    seed : int, optional
+        Random seed, by default 42
+        
+    Returns
+    -------
+    pd.DataFrame
+        Sampled rows in their original order
+    """
+    rng = np.random.default_rng(seed)
+    sample = None
+    offset = 0
+    for chunk in chunks:
+        chunk = chunk.set_axis(np.arange(offset, offset + len(chunk)))
+        offset += len(chunk)
+        chunk = chunk.assign(_sample_key=rng.random(len(chunk)))
+        sample = chunk if sample is None else pd.concat([sample, chunk])
+        if len(sample) > n_rows:
+            sample = sample.nsmallest(n_rows, "_sample_key")
+    if sample is None:
+        return pd.DataFrame()
+    return sample.drop(columns="_sample_key").sort_index()
 {% endif %}
 
 
 {% if cookiecutter.include_visualization == 'True' %}
-def visualize_data(data: {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}Dict[str, List[float]]{% endif %}) -> None:
+def visualize_data(
+    data: {% if cookiecutter.include_data_analysis == 'True' %}Union[pd.DataFrame, Iterable[pd.DataFrame]]{% else %}Union[ColumnTable, Iterable[ColumnTable]]{% endif %},
+    batch: Optional[bool] = None,{% if cookiecutter.include_data_analysis == 'True' %}
+    max_points: int = MAX_POINTS,
+    n_workers: Optional[int] = None,{% endif %}
+    figure_path: Optional[Union[str, Path]] = None,
+) -> None:
     """
     Create visualizations of the data.
     
     Parameters
     ----------
-    data : {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}Dict[str, List[float]]{% endif %}
-        Data to visualize
+    data : {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame, array-like or Iterable[pd.DataFrame]{% else %}ColumnTable or Iterable[ColumnTable]{% endif %}
+        Data to visualize{% if cookiecutter.include_data_analysis == 'True' %}. Streamed chunks are reduced to a random
+        sample of rows before plotting, of ten times ``max_points`` rows in
+        batch mode.{% else %}. Of streamed chunks, the first
+        100,000 rows are plotted.{% endif %}
+    batch : bool, optional
+        Render without displaying the figure, by default only when matplotlib
+        has no interactive backend (e.g. on a headless node){% if cookiecutter.include_data_analysis == 'True' %}. Batch
+        figures are drawn by ``src/rendering.py``: hexbin densities above
+        ``max_points`` rows, binned KDEs, one process per panel, and no
+        re-render while the data and plot parameters are unchanged.
+    max_points : int, optional
+        Largest number of rows drawn as individual points in batch mode
+    n_workers : int, optional
+        Number of processes used to render the panels in batch mode{% endif %}
+    figure_path : str or Path, optional
+        Output image, by default ``data/results/data_visualization.png``
     """
     logger.info("Creating visualizations")
+    if batch is None:
+        batch = matplotlib.get_backend().lower() in NON_INTERACTIVE_BACKENDS
+    if figure_path is None:
+        figure_path = Path(__file__).parent.parent / "data" / "results" / "data_visualization.png"
+    figure_path = Path(figure_path)
+    figure_path.parent.mkdir(exist_ok=True, parents=True)
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    if is_array_like(data):
+        data = iter_array_chunks(data)
+    if not isinstance(data, pd.DataFrame):
+        # Batch figures bin large samples into a density plot, so draw well
+        # beyond max_points rows for them
+        data = sample_chunks(data, n_rows=BATCH_SAMPLE_FACTOR * max_points if batch else SAMPLE_ROWS)
+    
+    if batch:
+        if render_batch(data, figure_path, max_points=max_points, n_workers=n_workers):
+            logger.info(f"Visualization saved to {figure_path}")
+        return
+    {% else %}
+    if not isinstance(data, ColumnTable):
+        sample = ColumnTable()
+        for chunk in data:
+            sample.append(chunk)
+            if sample.n_rows >= 100_000:
+                break
+        data = sample
+    {% endif %}
     
     # Set a nice style
     sns.set_theme(style="whitegrid")
@@ -183,8 +579,8 @@ def visualize_data(data: {% if cookiecutter.include_data_analysis == 'True' %}pd
         ax1.set_ylabel("y")
     
     # Plot 2: Distribution as histogram
-    if len(data) > 0:
-        for key in list(data.keys())[:3]:  # Limit to first 3 keys
+    if data.numeric_columns():
+        for key in data.numeric_columns()[:3]:  # Limit to first 3 numeric columns
             ax2.hist(data[key], bins=20, alpha=0.6, label=key)
         ax2.set_title("Distribution Plot")
         ax2.legend()
@@ -193,28 +589,41 @@ def visualize_data(data: {% if cookiecutter.include_data_analysis == 'True' %}pd
     plt.tight_layout()
     
     # Save the figure
-    output_dir = Path(__file__).parent.parent / "data" / "results"
-    output_dir.mkdir(exist_ok=True, parents=True)
-    figure_path = output_dir / "data_visualization.png"
     plt.savefig(figure_path, dpi=300)
     
     logger.info(f"Visualization saved to {figure_path}")
     
     # Display if running in an interactive environment
+    {% if cookiecutter.include_data_analysis == 'True' %}
     plt.show()
+    {% else %}
+    if batch:
+        plt.close(fig)
+    else:
+        plt.show()
+    {% endif %}
 {% endif %}
 
 
-def save_results(results: Dict[str, Any], filename: str) -> None:
+def save_results(results: Dict[str, Any], filename: str) -> bool:
     """
     Save results to a file.
     
+    ``filename`` becomes a small JSON manifest; DataFrames and arrays are
+    written next to it in binary form (see ``src/result_store.py``). Use
+    ``load_results`` to read them back lazily.
+    
     Parameters
     ----------
     results : Dict[str, Any]
         Results to save
     filename : str
-        Name of the file to save results to
+        Name of the manifest file to save results to
+    
+    Returns
+    -------
+    bool
+        True if the results were saved
     """
     output_dir = Path(__file__).parent.parent / "data" / "results"
     output_dir.mkdir(exist_ok=True, parents=True)
@@ -222,45 +631,345 @@ def save_results(results: Dict[str, Any], filename: str) -> None:
     output_path = output_dir / filename
     logger.info(f"Saving results to {output_path}")
     
-    # Save in JSON format for simple dictionary results
     try:
-        import json
-        with open(output_path, 'w') as f:
-            json.dump(str(results), f, indent=2)
+        write_results(results, output_path)
         logger.info("Results saved successfully")
+        return True
     except Exception as e:
         logger.error(f"Error saving results: {e}")
+        return False
+
+
+def save_processed(data: Any, filename: str) -> Path:
+    """
+    Write loaded data to ``data/processed`` for the later pipeline stages.
+    
+    Streamed input is written chunk by chunk, so it never has to fit into
+    memory. The file appears atomically once it is complete.
+    
+    Parameters
+    ----------
+    data : {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame, array-like or Iterator[pd.DataFrame]{% else %}ColumnTable or Iterator[ColumnTable]{% endif %}
+        Data as returned by ``load_data``
+    filename : str
+        Name of the {% if cookiecutter.include_data_analysis == 'True' %}Parquet{% else %}CSV{% endif %} file, relative to ``data/processed``
+    
+    Returns
+    -------
+    Path
+        The written file
+    """
+    output_path = Path(__file__).parent.parent / "data" / "processed" / filename
+    output_path.parent.mkdir(exist_ok=True, parents=True)
+    logger.info(f"Saving processed data to {output_path}")
+    
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    if pa is None:
+        raise ImportError("Writing Parquet requires pyarrow. Install with: pip install pyarrow")
+    if isinstance(data, pd.DataFrame):
+        chunks = iter([data])
+    elif is_array_like(data):
+        chunks = iter_array_chunks(data)
+    else:
+        chunks = iter(data)
+    with atomic_path(output_path) as tmp_path:
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                else:
+                    # Later chunks take the column types of the first one
+                    table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    {% else %}
+    tables = iter([data]) if isinstance(data, ColumnTable) else iter(data)
+    with atomic_path(output_path) as tmp_path:
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            header_written = False
+            for table in tables:
+                if not header_written:
+                    writer.writerow(list(table))
+                    header_written = True
+                writer.writerows(table.rows())
+    {% endif %}
+    return output_path
+
+
+{% if cookiecutter.include_data_analysis == 'True' %}
+def parse_filter(value: str) -> Tuple[str, str, Any]:
+    """Parse a filter such as ``"year==2024"`` into ``("year", "==", 2024)``."""
+    for op in ("==", "!=", "<=", ">=", "<", ">", "="):
+        column, found, operand = value.partition(op)
+        if found and column.strip():
+            operand = operand.strip()
+            for convert in (int, float):
+                try:
+                    return column.strip(), op, convert(operand)
+                except ValueError:
+                    pass
+            return column.strip(), op, operand
+    raise argparse.ArgumentTypeError(f"Invalid filter '{value}', expected e.g. 'year==2024'")
+
+
+{% endif %}
+# Stages selectable with --stage; src/pipeline.py runs them as separate steps
+STAGES = ("all", "preprocessing", "analysis"{% if cookiecutter.include_visualization == 'True' %}, "visualization"{% endif %})
+
+# Output of the preprocessing stage, relative to data/processed
+PROCESSED_FILE = "dataset.{% if cookiecutter.include_data_analysis == 'True' %}parquet{% else %}csv{% endif %}"
+
+# Options that change the results or how the input is split into chunks; a
+# run can be resumed with different values of all others (workers, cache,
+# logging, profiling, plotting, ...)
+RESULT_OPTIONS = ("input", "stage", "chunksize", "memory_budget", "columns", "filters", "key", "exact",
+                  "quantile_error", "wide", "float32", "top_k", "corr_threshold")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run the {{ cookiecutter.project_name }} analysis pipeline.")
+    parser.add_argument("--input", default="sample.csv",
+                        help="data file{% if cookiecutter.include_data_analysis == 'True' %}, directory or glob pattern such as 'raw/run-*.csv'{% endif %}, "
+                             "relative to the data directory (default: sample.csv)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the input in chunks of this many rows")
+    parser.add_argument("--memory-budget", type=parse_size, default=None,
+                        help="stream the input in chunks of roughly this size, e.g. 256MB")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes used to analyze streamed chunks{% if cookiecutter.include_data_analysis == 'True' %} and threads used "
+                             "to load multi-file input{% endif %} (default: one per CPU)")
+    parser.add_argument("--exact", action="store_true",
+                        help="compute exact percentiles for streamed input (collects all chunks in memory)")
+    parser.add_argument("--quantile-error", type=float, default=0.01,
+                        help="normalized rank error of streamed percentiles (default: 0.01)")
+    parser.add_argument("--wide", action="store_true",
+                        help="wide-data mode: blocked correlation for tables with many columns")
+    parser.add_argument("--float32", action="store_true",
+                        help="compute the wide-data correlation in float32")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="wide-data mode: write the k strongest correlations per column to data/results")
+    parser.add_argument("--corr-threshold", type=float, default=None,
+                        help="wide-data mode: write correlations with |r| above this value to data/results")
+    parser.add_argument("--columns", type=lambda value: value.split(","), default=None,
+                        help="comma-separated list of columns to load")
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    parser.add_argument("--filter", dest="filters", type=parse_filter, action="append", default=None,
+                        help="row filter for Parquet/Arrow datasets such as 'year==2024' or 'x>0'; repeat to combine")
+    parser.add_argument("--key", default=None,
+                        help="array to load from an .npz, HDF5 or Zarr input (default: the first one)")
+    {% endif %}
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse the input and recompute results instead of reusing them from data/processed")
+    parser.add_argument("--cache-budget", type=parse_size, default=None,
+                        help="size limit of the result cache in data/processed/.cache, e.g. 2GB; least recently "
+                             "used results are deleted above it (default: 1GB)")
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    parser.add_argument("--generate", type=int, default=None, metavar="ROWS",
+                        help="write a synthetic dataset of this many rows and exit")
+    parser.add_argument("--generate-to", default="raw/synthetic.parquet",
+                        help="output of --generate, relative to the data directory; .parquet, .npy or .csv "
+                             "(default: raw/synthetic.parquet)")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="random seed of generated data (default: 42)")
+    {% endif %}
+    {% if cookiecutter.include_visualization == 'True' %}
+    parser.add_argument("--batch", action="store_true",
+                        help="render figures without displaying them (automatic when no display is available)")
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS,
+                        help=f"batch mode: plot densities instead of points above this many rows (default: {MAX_POINTS})")
+    {% endif %}
+    {% endif %}
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its last checkpoint in data/processed/.checkpoint")
+    parser.add_argument("--checkpoint-every", type=int, default=10, metavar="CHUNKS",
+                        help="save the state of streamed analyses every this many chunks; 0 only after "
+                             "each stage (default: 10)")
+    parser.add_argument("--profile", type=profile_kinds, default=None, metavar="KINDS",
+                        help="profile each stage: 'cpu' (cProfile, written to data/results/profiles), 'memory' "
+                             f"(tracemalloc) or 'cpu,memory' (default: ${PROFILE_ENV} or none)")
+    parser.add_argument("--log-file", default=os.environ.get(LOG_FILE_ENV, "output.log"),
+                        help=f"log file, rotated by size (default: ${LOG_FILE_ENV} or output.log in the working "
+                             "directory)")
+    parser.add_argument("--log-json", action="store_true",
+                        help="write the log file as JSON lines with time, level, logger, stage and message")
+    parser.add_argument("--log-max-bytes", type=parse_size, default="10MB",
+                        help="rotate the log file above this size, e.g. 50MB; 0 never rotates (default: 10MB)")
+    parser.add_argument("--log-backups", type=int, default=DEFAULT_BACKUPS,
+                        help=f"rotated log files to keep (default: {DEFAULT_BACKUPS})")
+    parser.add_argument("--stage", choices=STAGES, default="all",
+                        help="run a single stage: preprocessing writes the loaded data to data/processed/"
+                             f"{PROCESSED_FILE}, the others read their --input (default: all stages in one process)")
+    return parser.parse_args(argv)
 
 
-def main() -> None:
+def main(argv: Optional[List[str]] = None) -> None:
     """Main function to run the analysis pipeline."""
+    args = parse_args(argv)
+    results_dir = Path(__file__).parent.parent / "data" / "results"
+    # Separate files per stage, so pipeline stages running side by side do not collide
+    suffix = "" if args.stage == "all" else f"-{args.stage}"
+    tracer = Tracer(profile=args.profile if args.profile is not None else profile_kinds(),
+                    profile_dir=results_dir / f"profiles{suffix}")
+    with configure_logging(args.log_file, json_lines=args.log_json, max_bytes=args.log_max_bytes,
+                           backup_count=args.log_backups):
+        with ResourceMonitor.from_config(results_dir / f"resource_usage{suffix}.csv") as monitor:
+            run(args, monitor, tracer)
+        if tracer.spans:
+            logger.info(f"Trace written to {tracer.write(results_dir / f'trace{suffix}.json')}")
+            tracer.log_summary()
+
+
+def run(args: argparse.Namespace, monitor: ResourceMonitor, tracer: Tracer) -> None:
+    """Run the stages selected by ``args``, tagging resource samples and log records with the current stage."""
+    def enter_stage(name: str) -> None:
+        monitor.set_stage(name)
+        set_log_stage(name)
+    
+    streaming = args.chunksize is not None or args.memory_budget is not None
+    
     logger.info("=" * 50)
     logger.info(f"Running {{ cookiecutter.project_name }}")
     logger.info("=" * 50)
     
+    default_cache.enabled = not args.no_cache
+    if args.cache_budget is not None:
+        default_cache.max_bytes = args.cache_budget
+    
+    {% if cookiecutter.include_data_analysis == 'True' %}
+    if args.generate is not None:
+        output = Path(__file__).parent.parent / "data" / args.generate_to
+        write_sample_data(output, args.generate, seed=args.seed, n_workers=args.workers)
+        return
+    
+    {% endif %}
+    options = {name: getattr(args, name) for name in RESULT_OPTIONS if hasattr(args, name)}
+    data_dir = Path(__file__).parent.parent / "data"
+    checkpoint = RunCheckpoint(run_fingerprint(data_dir, args.input, options),
+                               directory=data_dir / "processed" / ".checkpoint" / args.stage, every=args.checkpoint_every)
+    if args.resume:
+        try:
+            checkpoint.resume()
+        except CheckpointMismatch as e:
+            logger.error(f"Cannot resume, {e}. Run without --resume to start over.")
+            sys.exit(1)
+    else:
+        checkpoint.start()
+    
+    analysis_pending = args.stage in ("all", "analysis") and not checkpoint.done("analysis")
+    {% if cookiecutter.include_visualization == 'True' %}
+    visualization_pending = args.stage in ("all", "visualization") and not checkpoint.done("visualization")
+    {% else %}
+    visualization_pending = False
+    {% endif %}
+    
     # Load or generate data
-    data = load_data("sample.csv")
-    if data is None:
-        data = generate_sample_data()
-        logger.info("Using generated sample data")
+    load_options = {
+        "chunksize": args.chunksize,
+        "memory_budget": args.memory_budget,
+        "usecols": args.columns,{% if cookiecutter.include_data_analysis == 'True' %}
+        "filters": args.filters,
+        "key": args.key,
+        "n_workers": args.workers,
+        "use_cache": not args.no_cache,{% endif %}
+    }
+    data = None
+    if args.stage == "preprocessing" or analysis_pending or visualization_pending:
+        enter_stage("loading")
+        with tracer.span("load_data", input=args.input):
+            data = load_data(args.input, **load_options)
+        if data is None:
+            data = generate_sample_data()
+            logger.info("Using generated sample data")
+    
+    if args.stage == "preprocessing":
+        enter_stage("preprocessing")
+        with tracer.span("save_processed"):
+            save_processed(data, PROCESSED_FILE)
+        checkpoint.finish()
+        return
     
     # Create a results dictionary to store outputs
     results = {}
     
     # Analyze the data
-    {% if cookiecutter.include_data_analysis == 'True' %}
-    analysis_results = analyze_data(data)
-    results.update(analysis_results)
-    {% endif %}
+    if args.stage in ("all", "analysis"):
+        if not analysis_pending:
+            results = checkpoint.result("analysis")
+            logger.info("Analysis results restored from the checkpoint")
+        else:
+            enter_stage("analysis")
+            {% if cookiecutter.include_data_analysis == 'True' %}
+            if isinstance(data, pd.DataFrame) and data.attrs.get("failed_shards"):
+                results["failed_shards"] = data.attrs["failed_shards"]
+            # Edge lists are written to data/results, so they are not served from the cache
+            analyze = analyze_data.__wrapped__ if args.top_k is not None or args.corr_threshold is not None else analyze_data
+            with tracer.span("analyze_data"):
+                analysis_results = analyze(data, n_workers=args.workers, exact=args.exact or None,
+                                           quantile_error=args.quantile_error, wide=args.wide,
+                                           corr_dtype="float32" if args.float32 else "float64",
+                                           top_k=args.top_k, corr_threshold=args.corr_threshold,
+                                           checkpoint=checkpoint)
+            results.update(analysis_results)
+            # Streamed shards report their failures on the chunk iterator once it is consumed
+            if getattr(data, "failed_shards", None):
+                results["failed_shards"] = dict(data.failed_shards)
+            {% else %}
+            with tracer.span("analyze_data"):
+                if isinstance(data, ColumnTable):
+                    results["summary"] = summarize_table(data)
+                else:
+                    chunks, initial, on_progress = checkpoint.resume_chunks("analysis", data)
+                    results["summary"] = summarize(chunks, initial=initial, on_progress=on_progress)
+            {% endif %}
+            checkpoint.complete("analysis", results)
     
     # Visualize the data
     {% if cookiecutter.include_visualization == 'True' %}
-    visualize_data(data)
-    results["visualization_created"] = True
+    if args.stage in ("all", "visualization"):
+        if not visualization_pending:
+            logger.info("Visualization was created before the interruption, skipping it")
+        else:
+            enter_stage("visualization")
+            if analysis_pending and streaming and not isinstance(data, {% if cookiecutter.include_data_analysis == 'True' %}pd.DataFrame{% else %}ColumnTable{% endif %}):
+                # The chunk iterator was consumed by the analysis, so open a fresh one
+                with tracer.span("load_data", input=args.input, reopened=True):
+                    data = load_data(args.input, **load_options)
+            with tracer.span("visualize_data"):
+                {% if cookiecutter.include_data_analysis == 'True' %}
+                visualize_data(data, batch=args.batch or None, max_points=args.max_points)
+                {% else %}
+                visualize_data(data, batch=args.batch or None)
+                {% endif %}
+            checkpoint.complete("visualization")
+        results["visualization_created"] = True
     {% endif %}
     
-    # Save results
-    save_results(results, "analysis_results.json")
+    # Save results; a visualization-only run leaves the analysis results alone
+    enter_stage("saving")
+    if monitor.enabled:
+        results["resource_usage"] = monitor.summary()
+    # Spans up to here; the trace file also has the save_results span
+    results["trace"] = tracer.summary()
+    if args.stage == "visualization":
+        saved = True
+    else:
+        with tracer.span("save_results"):
+            saved = save_results(results, "analysis_results.json")
+    if saved:
+        checkpoint.finish()
+    else:
+        logger.info("Keeping the checkpoint; rerun with --resume to retry saving the results")
+    
+    for name, stats in default_cache.stats().items():
+        logger.info(f"Result cache for {name}: {stats['hits']} hits, {stats['misses']} misses, "
+                    f"{stats['bypassed']} bypassed, {stats['seconds_saved']:.1f}s saved")
     
     logger.info("=" * 50)
     logger.info("Analysis complete")
@@ -0,0 +1,397 @@
+"""
+Stage pipeline driven by ``[execution.steps]`` in ``cresp.toml``.
+
+Each step declares what it runs and which files it reads and writes::
+
+    [execution.steps.analysis]
+    command = "python -m src.main --stage analysis"
+    inputs = ["data/processed/dataset.parquet"]
+    outputs = ["data/results/analysis_results.json"]
+    code = ["src"]           # files, directories or glob patterns
+    depends_on = []          # optional, in addition to inferred dependencies
+
+A step depends on every step that writes one of its inputs (or a file
+inside an input directory), plus any listed in ``depends_on``. Steps whose
+dependencies have finished run concurrently, each command in its own
+process. A plain string, as in ``preprocessing = "python prep.py"``, is a
+command without declared files; it always runs.
+
+A step is skipped when its command, the contents of its ``inputs`` and
+``code`` files (all files below a directory, except ``__pycache__``), and
+its outputs are unchanged since its last successful run. The digests
+are kept in ``data/processed/.pipeline/state.json`` (together with the
+size and modification time of every hashed file, so unchanged files are
+not read again) and each step's output goes to a log file next to it.
+Every step also gets its own rotating log file, ``logs/<step>.log``,
+through ``CRESP_LOG_FILE``, since concurrent steps cannot share
+``output.log``.
+
+Run with ``python -m src.pipeline``; see ``--help`` for options.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from .log_setup import LOG_FILE_ENV
+from .utils import PROJECT_DIR, atomic_path, file_digest, load_config
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = Path("data") / "processed" / ".pipeline"
+# Log files of the stages run by src.main, one per step
+LOG_DIR = Path("logs")
+
+
+class Step:
+    """
+    One stage of the pipeline.
+
+    Parameters
+    ----------
+    name : str
+        Step name, the key under ``[execution.steps]``
+    command : str
+        Shell command, run from the project directory. A leading
+        ``python`` is replaced by the interpreter running the pipeline.
+    inputs : List[str], optional
+        Files, directories or glob patterns the step reads
+    outputs : List[str], optional
+        Files or directories the step writes
+    code : List[str], optional
+        Source files or directories whose changes invalidate the step
+    depends_on : List[str], optional
+        Steps that must finish first, in addition to the ones producing
+        this step's inputs
+    description : str, optional
+        Free-text description
+    """
+
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+        code: Optional[List[str]] = None,
+        depends_on: Optional[List[str]] = None,
+        description: str = "",
+    ):
+        self.name = name
+        self.command = command
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.code = list(code or [])
+        self.depends_on = list(depends_on or [])
+        self.description = description
+
+    @property
+    def declares_files(self) -> bool:
+        """Whether the step lists inputs or outputs and can be skipped."""
+        return bool(self.inputs or self.outputs)
+
+    def __repr__(self) -> str:
+        return f"Step({self.name!r}, command={self.command!r})"
+
+
+def load_steps(config_path: Path) -> Dict[str, Step]:
+    """
+    Read the steps from ``[execution.steps]`` of a CRESP configuration.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path of ``cresp.toml``
+
+    Returns
+    -------
+    Dict[str, Step]
+        Steps by name, in file order; steps without a command are left out
+    """
+    config = load_config(config_path)
+    steps = {}
+    for name, spec in config.get("execution", {}).get("steps", {}).items():
+        if isinstance(spec, str):
+            spec = {"command": spec}
+        if not spec.get("command"):
+            logger.debug(f"Step '{name}' has no command, skipping it")
+            continue
+        unknown = set(spec) - {"command", "inputs", "outputs", "code", "depends_on", "description"}
+        if unknown:
+            raise ValueError(f"Unknown keys in step '{name}': {sorted(unknown)}")
+        steps[name] = Step(name, **spec)
+    return steps
+
+
+def _overlaps(a: str, b: str) -> bool:
+    a, b = Path(os.path.normpath(a)), Path(os.path.normpath(b))
+    return a == b or a in b.parents or b in a.parents
+
+
+def dependencies(steps: Dict[str, Step]) -> Dict[str, Set[str]]:
+    """
+    Work out which steps each step has to wait for.
+
+    Returns
+    -------
+    Dict[str, Set[str]]
+        Upstream step names per step
+
+    Raises
+    ------
+    ValueError
+        For unknown step names in ``depends_on`` or a dependency cycle
+    """
+    graph = {}
+    for step in steps.values():
+        upstream = set(step.depends_on)
+        unknown = upstream - set(steps)
+        if unknown:
+            raise ValueError(f"Step '{step.name}' depends on unknown steps: {sorted(unknown)}")
+        for other in steps.values():
+            if other is not step and any(_overlaps(i, o) for i in step.inputs for o in other.outputs):
+                upstream.add(other.name)
+        graph[step.name] = upstream
+
+    # Kahn's algorithm, only to detect cycles
+    remaining = {name: set(upstream) for name, upstream in graph.items()}
+    while remaining:
+        ready = [name for name, upstream in remaining.items() if not upstream]
+        if not ready:
+            raise ValueError(f"Dependency cycle between steps: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for upstream in remaining.values():
+            upstream.difference_update(ready)
+    return graph
+
+
+class PipelineState:
+    """Digests of the last successful run of every step, persisted as JSON."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.path = root / STATE_DIR / "state.json"
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self.steps: Dict[str, Any] = state.get("steps", {})
+        self.files: Dict[str, Any] = state.get("files", {})
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_path(self.path) as tmp_path:
+            with open(tmp_path, "w") as f:
+                json.dump({"steps": self.steps, "files": self.files}, f, indent=2, sort_keys=True)
+
+    def _file_digest(self, path: Path) -> str:
+        stat = path.stat()
+        relative = str(path.relative_to(self.root))
+        entry = self.files.get(relative)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["digest"]
+        digest = file_digest(path)
+        self.files[relative] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+        return digest
+
+    def digest(self, patterns: List[str]) -> Dict[str, str]:
+        """Content digests of all files matched by ``patterns``; missing entries map to ``"missing"``."""
+        digests = {}
+        for pattern in patterns:
+            matches = sorted(glob.glob(str(self.root / pattern), recursive=True)) if glob.has_magic(pattern) \
+                else [str(self.root / pattern)]
+            if not matches:
+                digests[pattern] = "missing"
+            for match in map(Path, matches):
+                if match.is_dir():
+                    files = sorted(p for p in match.rglob("*") if p.is_file()
+                                   and not any(part.startswith(".") for part in p.relative_to(match).parts))
+                elif match.exists():
+                    files = [match]
+                else:
+                    digests[str(match.relative_to(self.root))] = "missing"
+                    continue
+                for file in files:
+                    if "__pycache__" not in file.parts:
+                        digests[str(file.relative_to(self.root))] = self._file_digest(file)
+        return digests
+
+
+def _step_key(step: Step, state: PipelineState) -> str:
+    payload = {"command": step.command, "inputs": state.digest(step.inputs), "code": state.digest(step.code)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _is_current(step: Step, key: str, state: PipelineState) -> bool:
+    previous = state.steps.get(step.name)
+    if not step.declares_files or previous is None or previous.get("key") != key:
+        return False
+    outputs = state.digest(step.outputs)
+    return "missing" not in outputs.values() and outputs == previous.get("outputs")
+
+
+def _run_command(step: Step, root: Path) -> subprocess.CompletedProcess:
+    command = step.command
+    if command == "python" or command.startswith("python "):
+        command = f'"{sys.executable}"{command[len("python"):]}'
+    log_path = root / STATE_DIR / f"{step.name}.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    # Concurrent stages must not rotate one shared output.log
+    env = dict(os.environ, **{LOG_FILE_ENV: str(root / LOG_DIR / f"{step.name}.log")})
+    with open(log_path, "w") as log:
+        return subprocess.run(command, shell=True, cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def run_pipeline(
+    steps: Dict[str, Step],
+    root: Path = PROJECT_DIR,
+    only: Optional[List[str]] = None,
+    n_workers: Optional[int] = None,
+    force: bool = False,
+    dry_run: bool = False,
+) -> Dict[str, str]:
+    """
+    Run the steps in dependency order, concurrently where possible.
+
+    Parameters
+    ----------
+    steps : Dict[str, Step]
+        Steps as returned by ``load_steps``
+    root : Path, optional
+        Project directory that commands run in and paths are relative to
+    only : List[str], optional
+        Run only these steps and the steps they depend on
+    n_workers : int, optional
+        Maximum number of steps running at once, by default one per CPU
+    force : bool, optional
+        Run steps even if they are up to date
+    dry_run : bool, optional
+        Only report which steps would run
+
+    Returns
+    -------
+    Dict[str, str]
+        Outcome per step: ``"ran"``, ``"skipped"`` (up to date),
+        ``"would run"`` (dry run), ``"failed"`` or ``"blocked"`` (an
+        upstream step failed)
+    """
+    graph = dependencies(steps)
+    if only:
+        unknown = set(only) - set(steps)
+        if unknown:
+            raise ValueError(f"Unknown steps: {sorted(unknown)}")
+        selected: Set[str] = set()
+        stack = list(only)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(graph[name])
+        graph = {name: upstream & selected for name, upstream in graph.items() if name in selected}
+
+    state = PipelineState(root)
+    status: Dict[str, str] = {}
+    running: Dict[Future, str] = {}
+    started: Dict[str, float] = {}
+    keys: Dict[str, str] = {}
+
+    def ready() -> List[str]:
+        return [name for name, upstream in graph.items()
+                if name not in status and name not in started and all(status.get(u) in ("ran", "skipped", "would run") for u in upstream)]
+
+    def block_dependents() -> None:
+        changed = True
+        while changed:
+            changed = False
+            for name, upstream in graph.items():
+                if name not in status and any(status.get(u) in ("failed", "blocked") for u in upstream):
+                    status[name] = "blocked"
+                    logger.error(f"Step '{name}' not run because an upstream step failed")
+                    changed = True
+
+    with ThreadPoolExecutor(max_workers=n_workers or os.cpu_count() or 1) as pool:
+        while len(status) < len(graph):
+            for name in ready():
+                step = steps[name]
+                keys[name] = _step_key(step, state)
+                if not force and _is_current(step, keys[name], state):
+                    logger.info(f"Step '{name}' is up to date, skipping")
+                    status[name] = "skipped"
+                elif dry_run:
+                    logger.info(f"Step '{name}' would run: {step.command}")
+                    status[name] = "would run"
+                else:
+                    logger.info(f"Running step '{name}': {step.command}")
+                    started[name] = time.perf_counter()
+                    running[pool.submit(_run_command, step, root)] = name
+            if not running:
+                block_dependents()
+                if not ready():
+                    break
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                duration = time.perf_counter() - started[name]
+                try:
+                    returncode = future.result().returncode
+                except OSError as e:
+                    logger.error(f"Step '{name}' could not be started: {e}")
+                    returncode = -1
+                if returncode == 0:
+                    status[name] = "ran"
+                    state.steps[name] = {
+                        "key": keys[name],
+                        "outputs": state.digest(steps[name].outputs),
+                        "duration": round(duration, 3),
+                        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    }
+                    state.save()
+                    logger.info(f"Step '{name}' finished in {duration:.1f}s")
+                else:
+                    status[name] = "failed"
+                    state.steps.pop(name, None)
+                    state.save()
+                    logger.error(f"Step '{name}' failed with exit code {returncode}, "
+                                 f"see {STATE_DIR / (name + '.log')}")
+            block_dependents()
+    return status
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point; returns the process exit code."""
+    parser = argparse.ArgumentParser(description="Run the pipeline declared in [execution.steps] of cresp.toml.")
+    parser.add_argument("steps", nargs="*", help="steps to run together with their upstream steps (default: all)")
+    parser.add_argument("--config", default=str(PROJECT_DIR / "cresp.toml"), help="CRESP configuration file")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of steps running at once")
+    parser.add_argument("--force", action="store_true", help="run steps even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only show which steps would run")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    config_path = Path(args.config)
+    steps = load_steps(config_path)
+    if not steps:
+        logger.warning(f"No steps with a command in [execution.steps] of {config_path}")
+        return 0
+    status = run_pipeline(steps, root=config_path.resolve().parent, only=args.steps or None,
+                          n_workers=args.workers, force=args.force, dry_run=args.dry_run)
+    for name, outcome in status.items():
+        logger.info(f"  {name}: {outcome}")
+    return 1 if any(outcome in ("failed", "blocked") for outcome in status.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Mergeable streaming quantile sketch.
+
+``KLLSketch`` implements the KLL sketch of Karnin, Lang and Liberty: values
+are kept in a hierarchy of compactors, and whenever a level overflows it is
+sorted and every other value is promoted, with twice the weight, to the
+level above. Memory use is O(k log(n / k)) per column instead of O(n), any
+quantile can be queried at the end, and sketches built on separate chunks
+or in separate processes can be merged.
+
+Accuracy
+--------
+The error is bounded in rank: a quantile estimate for ``q`` is a value
+whose rank lies within ``rank_error * n`` of ``q * n``. With
+``k = ceil(1.65 / rank_error)`` this holds with about 99% probability; use
+``k_for_error`` to derive ``k``. Until the first compaction (at most
+``k`` values) the sketch holds every value and answers exactly, with the
+same linear interpolation as ``pandas.Series.quantile``.
+
+Compaction is randomised with a seeded generator, so a given sequence of
+updates and merges always yields the same sketch.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Iterable, List
+
+from .utils import lazy_import
+
+np = lazy_import("numpy")
+
+# Rank error of KLL at ~99% confidence is about this constant divided by k
+_ERROR_CONSTANT = 1.65
+
+
+def k_for_error(rank_error: float) -> int:
+    """
+    Return the sketch size ``k`` that achieves a normalized rank error.
+
+    Parameters
+    ----------
+    rank_error : float
+        Maximum normalized rank error, e.g. 0.01 for 1%
+
+    Returns
+    -------
+    int
+        Sketch size parameter
+    """
+    if not 0 < rank_error < 1:
+        raise ValueError("rank_error must be between 0 and 1")
+    return max(8, math.ceil(_ERROR_CONSTANT / rank_error))
+
+
+class KLLSketch:
+    """
+    Streaming quantile sketch over a single numeric column.
+
+    Parameters
+    ----------
+    k : int, optional
+        Capacity of the top compactor, by default 200 (about 0.8% rank error)
+    seed : int, optional
+        Seed for the compaction coin flips, by default 0
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self) -> None:
+        # Compact lazily: only while the sketch as a whole is over budget,
+        # and then the lowest overfull level first. This keeps as many
+        # values as the budget allows, which is what the error bound needs.
+        while sum(items.size for items in self.levels) > sum(self._capacity(h) for h in range(len(self.levels))):
+            level = next(h for h, items in enumerate(self.levels) if items.size >= self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # With an odd count one value stays behind at this level
+            keep, items = items[:items.size % 2], items[items.size % 2:]
+            offset = int(self._rng.integers(2))
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+            self.levels[level] = keep
+
+    def update(self, values: Iterable[float]) -> "KLLSketch":
+        """
+        Add values to the sketch; NaN values are ignored.
+
+        Returns
+        -------
+        KLLSketch
+            This sketch, for chaining
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.n += values.size
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """
+        Fold another sketch into this one.
+
+        Returns
+        -------
+        KLLSketch
+            This sketch, for chaining
+        """
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    @property
+    def is_exact(self) -> bool:
+        """True while every value seen is still held by the sketch."""
+        return len(self.levels) == 1
+
+    def quantiles(self, qs: Iterable[float]) -> np.ndarray:
+        """
+        Estimate quantiles.
+
+        Parameters
+        ----------
+        qs : Iterable[float]
+            Quantiles to estimate, between 0 and 1
+
+        Returns
+        -------
+        np.ndarray
+            Estimated values, NaN if the sketch is empty
+        """
+        qs = np.asarray(list(qs), dtype=np.float64)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        if self.is_exact:
+            return np.percentile(self.levels[0], qs * 100)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * (self.n - 1), side="right")
+        return items[np.minimum(positions, items.size - 1)]
@@ -0,0 +1,262 @@
+"""
+Headless rendering for large datasets.
+
+The interactive plots in ``visualize_data`` draw every row with seaborn and
+open a window at the end, which is slow for millions of points and blocks
+on machines without a display. ``render_batch`` produces the same two-panel
+figure for batch jobs:
+
+- Figures are drawn on the Agg canvas directly, without pyplot, so no GUI
+  backend is loaded and nothing is shown.
+- Above ``max_points`` rows the scatter plot becomes a hexbin density plot,
+  whose cost barely depends on the number of points once they are binned.
+- Densities are Gaussian KDEs evaluated on a grid: the values are binned
+  linearly onto the grid and convolved with the kernel by FFT, which takes
+  O(n + g log g) time for ``n`` values and ``g`` grid points instead of
+  O(n * g). The bandwidth follows Scott's rule, as in ``sns.kdeplot``.
+- Each panel is rendered in its own process and the panels are joined
+  side by side into the final image.
+- A digest of the plotted columns and the plot parameters is stored next
+  to the figure; when both are unchanged the figure is not rendered again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+from .log_setup import worker_logging
+from .utils import atomic_path, lazy_import, options_digest
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+# Loaded by the rendering processes only
+backend_agg = lazy_import("matplotlib.backends.backend_agg")
+figure = lazy_import("matplotlib.figure")
+image = lazy_import("matplotlib.image")
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering itself changes, so that stored figures are redrawn
+RENDER_VERSION = 1
+
+# Above this many rows the scatter plot is replaced by a hexbin density plot
+MAX_POINTS = 100_000
+
+# Same extent as seaborn's default ``cut=3``: the grid reaches three
+# bandwidths beyond the data
+_KDE_CUT = 3.0
+
+
+def scott_bandwidth(values: np.ndarray) -> float:
+    """Kernel bandwidth by Scott's rule, ``std * n ** (-1/5)``."""
+    n = values.size
+    if n < 2:
+        return 0.0
+    return float(np.std(values, ddof=1) * n ** (-1 / 5))
+
+
+def binned_kde(
+    values: np.ndarray,
+    grid_size: int = 512,
+    bandwidth: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gaussian kernel density estimate on a regular grid.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Samples; NaN values are ignored
+    grid_size : int, optional
+        Number of grid points, by default 512
+    bandwidth : float, optional
+        Kernel standard deviation, by default Scott's rule
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Grid points and the density at each of them; both empty when there
+        are fewer than two distinct values
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    values = values[~np.isnan(values)]
+    if bandwidth is None:
+        bandwidth = scott_bandwidth(values)
+    if values.size < 2 or not bandwidth > 0:
+        return np.empty(0), np.empty(0)
+
+    low = values.min() - _KDE_CUT * bandwidth
+    high = values.max() + _KDE_CUT * bandwidth
+    grid = np.linspace(low, high, grid_size)
+    step = grid[1] - grid[0]
+
+    # Linear binning: each value is split between its two neighbouring grid
+    # points in proportion to its distance from them
+    position = (values - low) / step
+    left = np.minimum(np.floor(position).astype(np.int64), grid_size - 2)
+    fraction = position - left
+    counts = np.bincount(left, weights=1.0 - fraction, minlength=grid_size)
+    counts += np.bincount(left + 1, weights=fraction, minlength=grid_size)
+
+    # Kernel sampled at every grid offset, then a linear convolution via FFT
+    # (zero padding to twice the grid avoids wrap-around)
+    offsets = np.arange(-(grid_size - 1), grid_size) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = 2 * grid_size - 1 + grid_size - 1
+    n_fft = 1 << (size - 1).bit_length()
+    density = np.fft.irfft(np.fft.rfft(counts, n_fft) * np.fft.rfft(kernel, n_fft), n_fft)
+    density = density[grid_size - 1:2 * grid_size - 1] / values.size
+    return grid, np.maximum(density, 0.0)
+
+
+def _new_figure(params: Dict[str, Any]) -> Tuple[Figure, Any]:
+    fig = figure.Figure(figsize=tuple(params["panel_size"]))
+    backend_agg.FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.grid(True, alpha=0.3)
+    return fig, ax
+
+
+def _render_scatter(columns: Dict[str, np.ndarray], path: str, params: Dict[str, Any]) -> str:
+    fig, ax = _new_figure(params)
+    x, y = columns["x"], columns["y"]
+    if x.size > params["max_points"]:
+        mappable = ax.hexbin(x, y, gridsize=params["hexbin_gridsize"], bins="log", mincnt=1, cmap="viridis")
+        fig.colorbar(mappable, ax=ax, label="count")
+        ax.set_title(f"Scatter Plot (density of {x.size:,} points)")
+    else:
+        ax.scatter(x, y, s=12, alpha=0.7, edgecolors="none")
+        ax.set_title("Scatter Plot")
+    ax.set_xlabel("x")
+    ax.set_ylabel("y")
+    fig.tight_layout()
+    fig.savefig(path, dpi=params["dpi"])
+    return path
+
+
+def _render_density(columns: Dict[str, np.ndarray], path: str, params: Dict[str, Any]) -> str:
+    fig, ax = _new_figure(params)
+    for name, values in columns.items():
+        grid, density = binned_kde(values, grid_size=params["kde_grid_size"])
+        if grid.size:
+            ax.plot(grid, density, label=name)
+    ax.set_title("Distribution Plot")
+    ax.set_ylabel("Density")
+    if columns:
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=params["dpi"])
+    return path
+
+
+_PANELS = {"scatter": _render_scatter, "density": _render_density}
+
+
+def _render_panel(kind: str, columns: Dict[str, np.ndarray], path: str, params: Dict[str, Any]) -> str:
+    """Worker entry point for ``render_batch``."""
+    return _PANELS[kind](columns, path, params)
+
+
+def _panel_columns(data: pd.DataFrame) -> Dict[str, Dict[str, np.ndarray]]:
+    panels = {}
+    if "x" in data.columns and "y" in data.columns:
+        panels["scatter"] = {name: data[name].to_numpy(dtype=np.float64) for name in ("x", "y")}
+    numeric = data.select_dtypes(include=[np.number]).columns[:3]  # Limit to first 3 numeric columns
+    panels["density"] = {str(name): data[name].to_numpy(dtype=np.float64) for name in numeric}
+    return panels
+
+
+def _render_key(panels: Dict[str, Dict[str, np.ndarray]], params: Dict[str, Any]) -> str:
+    digest = hashlib.sha256()
+    for kind, columns in panels.items():
+        for name, values in columns.items():
+            digest.update(f"{kind}/{name}/{values.size}".encode())
+            digest.update(np.ascontiguousarray(values).data)
+    return f"{digest.hexdigest()}-{options_digest(params)}"
+
+
+def render_batch(
+    data: pd.DataFrame,
+    figure_path: Union[str, Path],
+    max_points: int = MAX_POINTS,
+    dpi: int = 300,
+    n_workers: Optional[int] = None,
+    force: bool = False,
+) -> bool:
+    """
+    Render the scatter and distribution panels of ``data`` to a PNG file.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Data to plot
+    figure_path : str or Path
+        Output image
+    max_points : int, optional
+        Largest number of rows drawn as individual points, by default 100,000
+    dpi : int, optional
+        Resolution of the image, by default 300
+    n_workers : int, optional
+        Number of rendering processes, by default one per panel. With 1 the
+        panels are rendered in the calling process.
+    force : bool, optional
+        Render even if the stored digest matches
+
+    Returns
+    -------
+    bool
+        True if the figure was rendered, False if the existing one was kept
+    """
+    figure_path = Path(figure_path)
+    key_path = figure_path.with_suffix(".render.json")
+    params = {
+        "version": RENDER_VERSION,
+        "max_points": max_points,
+        "dpi": dpi,
+        "panel_size": [6, 5],
+        "hexbin_gridsize": 100,
+        "kde_grid_size": 512,
+    }
+    panels = _panel_columns(data)
+    key = _render_key(panels, params)
+
+    if not force and figure_path.exists():
+        try:
+            with open(key_path, "r") as f:
+                if json.load(f).get("key") == key:
+                    logger.info(f"Data and plot parameters unchanged, keeping {figure_path}")
+                    return False
+        except (OSError, ValueError):
+            pass
+
+    figure_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=figure_path.parent, prefix=".render-") as tmp_dir:
+        jobs = [(kind, columns, os.path.join(tmp_dir, f"{kind}.png"), params) for kind, columns in panels.items()]
+        n_workers = min(n_workers or len(jobs), len(jobs))
+        if n_workers <= 1:
+            paths = [_render_panel(*job) for job in jobs]
+        else:
+            logger.info(f"Rendering {len(jobs)} panels on {n_workers} processes")
+            with ProcessPoolExecutor(max_workers=n_workers, **worker_logging()) as pool:
+                paths = list(pool.map(_render_panel, *zip(*jobs)))
+
+        # All panels share one size, so their pixels can be joined directly
+        images: List[np.ndarray] = [image.imread(path) for path in paths]
+        with atomic_path(figure_path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                image.imsave(f, np.concatenate(images, axis=1), format="png", dpi=dpi)
+
+    with atomic_path(key_path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump({"key": key, "params": params}, f, indent=2)
+    return True
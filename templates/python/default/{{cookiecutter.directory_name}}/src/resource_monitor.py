@@ -0,0 +1,327 @@
+"""
+Background sampling of the resources used by a run.
+
+``ResourceMonitor`` implements ``[execution.resource_monitoring]`` of
+``cresp.toml``. While ``main()`` runs, a daemon thread reads ``/proc``
+every ``logging_interval`` and appends one row to a CSV file in
+``data/results``:
+
+=====================  ===================================================
+``time``               seconds since the monitor started
+``stage``              pipeline stage running at that moment
+``cpu_percent``        CPU used by this process and its children, in
+                       percent of one core (as ``top`` shows it)
+``system_cpu_percent`` CPU used by the whole machine, 0-100
+``rss_bytes``          resident memory of this process and its children
+``memory_percent``     memory in use on the whole machine, 0-100
+``read_bytes``         bytes read from storage since the previous row
+``write_bytes``        bytes written to storage since the previous row
+``net_rx_bytes``       bytes received over the network since the previous
+                       row (all interfaces except loopback)
+``net_tx_bytes``       bytes sent, likewise
+=====================  ===================================================
+
+An extra row is taken whenever ``set_stage()`` switches to a new stage, so
+stage boundaries appear in the series at their exact time. Rows are
+flushed as they are written, so the series survives a crash.
+
+``alert_thresholds`` in ``[reproduction.cloud.resource_monitoring]`` are
+checked on every sample: ``cpu_usage`` against ``system_cpu_percent``
+(e.g. ``"90%"``) and ``memory_usage`` against ``memory_percent`` (e.g.
+``"85%"``) or against ``rss_bytes`` when given as a size (e.g.
+``"16GB"``). Crossing a threshold logs a warning; empty values are not
+checked.
+
+The sampler reads a handful of small ``/proc`` files per sample and needs
+no external command, so ``monitoring_command`` is not run. On systems
+without ``/proc`` the monitor is disabled.
+"""
+
+import csv
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import load_config, parse_size
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = [
+    "time", "stage", "cpu_percent", "system_cpu_percent", "rss_bytes", "memory_percent",
+    "read_bytes", "write_bytes", "net_rx_bytes", "net_tx_bytes",
+]
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def parse_duration(value: Any) -> float:
+    """Parse an interval such as ``"10s"``, ``"500ms"``, ``"2m"`` or ``5`` into seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*(ms|s|m|h)?\s*", str(value))
+    if not match:
+        raise ValueError(f"Invalid interval '{value}', expected e.g. '10s'")
+    factor = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[match.group(2) or "s"]
+    return float(match.group(1)) * factor
+
+
+def _read(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
+
+def _descendants(pid: int) -> List[int]:
+    """``pid`` and all its descendants, via ``/proc/<pid>/task/<tid>/children``."""
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                stack.extend(int(child) for child in _read(f"/proc/{current}/task/{task}/children").split())
+        except OSError:
+            continue  # exited meanwhile, or children not available
+    return pids
+
+
+def _process_counters(pids: List[int]) -> Tuple[float, int, int, int]:
+    """CPU seconds, RSS bytes, storage bytes read and written of ``pids`` (the first one's reaped children included)."""
+    cpu, rss, read_bytes, write_bytes = 0.0, 0, 0, 0
+    for i, pid in enumerate(pids):
+        try:
+            fields = _read(f"/proc/{pid}/stat").rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # Fields from the 3rd on: utime is the 14th, rss the 24th
+        ticks = int(fields[11]) + int(fields[12])
+        if i == 0:
+            ticks += int(fields[13]) + int(fields[14])  # children already waited for
+        cpu += ticks / CLOCK_TICKS
+        rss += int(fields[21]) * PAGE_SIZE
+        try:
+            io = dict(line.split(": ") for line in _read(f"/proc/{pid}/io").splitlines())
+            read_bytes += int(io["read_bytes"])
+            write_bytes += int(io["write_bytes"])
+        except (OSError, KeyError, ValueError):
+            pass  # /proc/<pid>/io can be restricted
+    return cpu, rss, read_bytes, write_bytes
+
+
+def _system_counters() -> Tuple[int, int, float, int, int]:
+    """Busy and total CPU ticks, memory in use (%), network bytes received and sent."""
+    cpu = [int(value) for value in _read("/proc/stat").split("\n", 1)[0].split()[1:]]
+    total = sum(cpu[:8])  # guest time is already included in user time
+    busy = total - cpu[3] - cpu[4]  # idle, iowait
+    meminfo = {}
+    for line in _read("/proc/meminfo").splitlines():
+        name, value = line.split(":", 1)
+        meminfo[name] = int(value.split()[0])
+    memory = 100 * (1 - meminfo.get("MemAvailable", meminfo["MemFree"]) / meminfo["MemTotal"])
+    rx = tx = 0
+    try:
+        for line in _read("/proc/net/dev").splitlines()[2:]:
+            name, values = line.split(":", 1)
+            if name.strip() != "lo":
+                values = values.split()
+                rx += int(values[0])
+                tx += int(values[8])
+    except OSError:
+        pass
+    return busy, total, memory, rx, tx
+
+
+class ResourceMonitor:
+    """
+    Sample resource usage on a background thread.
+
+    Use as a context manager, or call ``start()`` and ``stop()``.
+
+    Parameters
+    ----------
+    output_path : Path
+        CSV file the samples are written to
+    interval : float, optional
+        Seconds between samples, by default 10
+    thresholds : Dict[str, str], optional
+        ``alert_thresholds`` from ``cresp.toml``
+    enabled : bool, optional
+        When False, nothing is sampled or written
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        interval: float = 10.0,
+        thresholds: Optional[Dict[str, str]] = None,
+        enabled: bool = True,
+    ):
+        self.output_path = Path(output_path)
+        self.interval = interval
+        self.enabled = enabled and os.path.exists("/proc/stat")
+        if enabled and not self.enabled:
+            logger.warning("Resource monitoring needs /proc and is not available on this system")
+        self.alerts: List[Dict[str, Any]] = []
+        self._checks = self._parse_thresholds(thresholds or {})
+        self._stage = "startup"
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._writer = None
+        self._previous: Optional[Tuple] = None
+        self._breached: Dict[str, bool] = {}
+        self._peak = {"cpu_percent": 0.0, "rss_bytes": 0, "memory_percent": 0.0}
+        self._n_samples = 0
+
+    @classmethod
+    def from_config(cls, output_path: Path, config_path: Optional[Path] = None) -> "ResourceMonitor":
+        """
+        Create a monitor from ``cresp.toml``.
+
+        Uses ``enabled`` and ``logging_interval`` of
+        ``[execution.resource_monitoring]`` and the ``alert_thresholds`` of
+        ``[reproduction.cloud.resource_monitoring]``. Without a readable
+        configuration the monitor is disabled.
+        """
+        try:
+            config = load_config(config_path) if config_path else load_config()
+        except (OSError, ImportError, ValueError) as e:
+            logger.info(f"Resource monitoring disabled, cannot read the configuration: {e}")
+            return cls(output_path, enabled=False)
+        settings = config.get("execution", {}).get("resource_monitoring", {})
+        cloud = config.get("reproduction", {}).get("cloud", {}).get("resource_monitoring", {})
+        try:
+            interval = parse_duration(settings.get("logging_interval", "10s"))
+        except ValueError as e:
+            logger.warning(f"{e}; sampling every 10s")
+            interval = 10.0
+        return cls(output_path, interval=interval, thresholds=cloud.get("alert_thresholds", {}),
+                   enabled=bool(settings.get("enabled", False)))
+
+    @staticmethod
+    def _parse_thresholds(thresholds: Dict[str, str]) -> List[Tuple[str, str, float, str]]:
+        """``(threshold name, column, limit, text)`` for every threshold that is set."""
+        checks = []
+        for name, text in thresholds.items():
+            text = str(text).strip()
+            if not text:
+                continue
+            try:
+                if name == "cpu_usage":
+                    checks.append((name, "system_cpu_percent", float(text.rstrip("%")), text))
+                elif name == "memory_usage" and not text.endswith("%") and re.search(r"[A-Za-z]$", text):
+                    checks.append((name, "rss_bytes", float(parse_size(text)), text))
+                elif name == "memory_usage":
+                    checks.append((name, "memory_percent", float(text.rstrip("%")), text))
+                else:
+                    logger.info(f"Alert threshold '{name}' is not sampled by the resource monitor")
+            except ValueError:
+                logger.warning(f"Ignoring invalid alert threshold {name} = '{text}'")
+        return checks
+
+    def start(self) -> "ResourceMonitor":
+        """Start sampling."""
+        if not self.enabled or self._thread is not None:
+            return self
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.output_path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+        self._start_time = time.monotonic()
+        self._previous = self._counters()
+        self._thread = threading.Thread(target=self._run, name="resource-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Monitoring resources every {self.interval:g}s to {self.output_path}")
+        return self
+
+    def stop(self) -> None:
+        """Take a final sample and stop sampling."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self.sample()
+        self._file.close()
+
+    def __enter__(self) -> "ResourceMonitor":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def set_stage(self, name: str) -> None:
+        """Mark the start of a pipeline stage; the samples from now on carry its name."""
+        if name == self._stage:
+            return
+        if self._thread is not None:
+            self.sample()  # closes the previous stage
+        self._stage = name
+        if self._thread is not None:
+            self.sample()  # opens the new one
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Resource monitoring stopped: {e}")
+                return
+
+    def _counters(self) -> Tuple:
+        return (time.monotonic(),) + _process_counters(_descendants(os.getpid())) + _system_counters()
+
+    def sample(self) -> Optional[Dict[str, Any]]:
+        """Take one sample now, write it and check the alert thresholds."""
+        if self._writer is None:
+            return None
+        with self._lock:
+            current = self._counters()
+            (now, cpu, rss, read_bytes, write_bytes, busy, total, memory, rx, tx) = current
+            (then, cpu0, _, read0, write0, busy0, total0, _, rx0, tx0) = self._previous
+            self._previous = current
+            elapsed = max(now - then, 1e-9)
+            row = {
+                "time": round(now - self._start_time, 3),
+                "stage": self._stage,
+                "cpu_percent": round(100 * max(cpu - cpu0, 0) / elapsed, 1),
+                "system_cpu_percent": round(100 * (busy - busy0) / max(total - total0, 1), 1),
+                "rss_bytes": rss,
+                "memory_percent": round(memory, 1),
+                "read_bytes": max(read_bytes - read0, 0),
+                "write_bytes": max(write_bytes - write0, 0),
+                "net_rx_bytes": max(rx - rx0, 0),
+                "net_tx_bytes": max(tx - tx0, 0),
+            }
+            self._writer.writerow([row[column] for column in COLUMNS])
+            self._file.flush()
+            self._n_samples += 1
+            for name in self._peak:
+                self._peak[name] = max(self._peak[name], row[name])
+            self._check(row)
+        return row
+
+    def _check(self, row: Dict[str, Any]) -> None:
+        for name, column, limit, text in self._checks:
+            breached = row[column] > limit
+            if breached and not self._breached.get(name):
+                logger.warning(f"Resource alert: {name} {row[column]:g} exceeds {text} during {row['stage']}")
+                self.alerts.append({"threshold": name, "limit": text, "value": row[column],
+                                    "time": row["time"], "stage": row["stage"]})
+            self._breached[name] = breached
+
+    def summary(self) -> Dict[str, Any]:
+        """Number of samples, peak usage and alerts so far."""
+        return {
+            "samples": self._n_samples,
+            "file": self.output_path.name,
+            "peak_cpu_percent": self._peak["cpu_percent"],
+            "peak_rss_bytes": self._peak["rss_bytes"],
+            "peak_memory_percent": self._peak["memory_percent"],
+            "alerts": list(self.alerts),
+        }
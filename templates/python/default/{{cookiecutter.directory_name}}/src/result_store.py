@@ -0,0 +1,215 @@
+"""
+Structured result store.
+
+A results dictionary is saved as a small JSON manifest plus one binary
+file per array-like entry:
+
+- DataFrames and Series are written as Parquet (CSV without pyarrow)
+- NumPy arrays are written as ``.npy``
+- JSON-compatible values (numbers, strings, lists, dicts, ...) are stored
+  directly in the manifest
+
+The manifest records the kind, file, shape, dtypes and SHA-256 of every
+entry, so a single statistic can be read without loading anything else::
+
+    results = load_results("data/results/analysis_results.json")
+    results["summary"].loc["mean", "x"]   # only reads summary.parquet
+
+Data files are named after their content hash and the manifest is
+replaced atomically after all of them are written, so readers always see
+a complete, consistent set of results, even if a write is interrupted.
+"""
+
+import json
+import logging
+import os
+import re
+from collections.abc import Mapping
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Union
+
+from .utils import atomic_path, file_digest, lazy_import
+
+np = lazy_import("numpy", optional=True)
+pd = lazy_import("pandas", optional=True)
+
+# Used by pandas for Parquet
+HAS_PARQUET = lazy_import("pyarrow", optional=True) is not None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def _file_stem(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "entry"
+
+
+def _json_value(value: Any) -> Any:
+    """Convert ``value`` to plain JSON types, raising TypeError if impossible."""
+    if np is not None and isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _json_value(item) for key, item in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _write_data_file(directory: Path, name: str, suffix: str, write: Callable[[Path], None]) -> Dict[str, Any]:
+    """Write an entry through ``write(path)`` and move it to a content-addressed name."""
+    stem = _file_stem(name)
+    tmp_path = directory / f".{stem}.tmp{suffix}"
+    try:
+        write(tmp_path)
+        digest = file_digest(tmp_path)
+        final_path = directory / f"{stem}-{digest[:12]}{suffix}"
+        os.replace(tmp_path, final_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return {"path": f"{directory.name}/{final_path.name}", "sha256": digest}
+
+
+def _save_npy(path: Path, value: Any) -> None:
+    with open(path, "wb") as f:
+        np.save(f, value, allow_pickle=False)
+
+
+def _write_entry(directory: Path, name: str, value: Any) -> Dict[str, Any]:
+    if pd is not None and isinstance(value, (pd.DataFrame, pd.Series)):
+        kind = "series" if isinstance(value, pd.Series) else "dataframe"
+        frame = value.to_frame() if kind == "series" else value
+        if HAS_PARQUET:
+            # Parquet needs string column names
+            frame = frame.set_axis([str(column) for column in frame.columns], axis=1)
+            entry = _write_data_file(directory, name, ".parquet", frame.to_parquet)
+        else:
+            entry = _write_data_file(directory, name, ".csv", frame.to_csv)
+        entry.update({
+            "kind": kind,
+            "shape": list(value.shape),
+            "dtypes": {str(column): str(dtype) for column, dtype in frame.dtypes.items()},
+        })
+        return entry
+
+    if np is not None and isinstance(value, np.ndarray):
+        entry = _write_data_file(directory, name, ".npy", partial(_save_npy, value=value))
+        entry.update({"kind": "ndarray", "shape": list(value.shape), "dtype": str(value.dtype)})
+        return entry
+
+    try:
+        return {"kind": "value", "value": _json_value(value)}
+    except TypeError:
+        logger.warning(f"Result '{name}' of type {type(value).__name__} is not serializable, storing its repr")
+        return {"kind": "repr", "value": repr(value)}
+
+
+def write_results(results: Dict[str, Any], manifest_path: Union[str, Path]) -> Path:
+    """
+    Save a results dictionary as a manifest plus binary data files.
+
+    Parameters
+    ----------
+    results : Dict[str, Any]
+        Results to save, keyed by name
+    manifest_path : str or Path
+        Location of the JSON manifest; data files go into a directory of the
+        same name without the ``.json`` suffix
+
+    Returns
+    -------
+    Path
+        Path of the manifest
+    """
+    manifest_path = Path(manifest_path)
+    data_dir = manifest_path.with_suffix("")
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    entries = {str(name): _write_entry(data_dir, str(name), value) for name, value in results.items()}
+    manifest = {"format_version": FORMAT_VERSION, "entries": entries}
+    with atomic_path(manifest_path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, allow_nan=True)
+
+    # Files of earlier runs are no longer referenced once the manifest is in place
+    referenced = {Path(entry["path"]).name for entry in entries.values() if "path" in entry}
+    for path in data_dir.iterdir():
+        if path.is_file() and path.name not in referenced and not path.name.startswith("."):
+            path.unlink()
+    return manifest_path
+
+
+class LazyResults(Mapping):
+    """
+    Read-only view of saved results that loads entries on first access.
+
+    Parameters
+    ----------
+    manifest_path : str or Path
+        Manifest written by ``write_results``
+    verify : bool, optional
+        Check each data file against its recorded SHA-256 before loading it,
+        by default False
+    """
+
+    def __init__(self, manifest_path: Union[str, Path], verify: bool = False):
+        self.manifest_path = Path(manifest_path)
+        self.verify = verify
+        with open(self.manifest_path, "r") as f:
+            self.manifest = json.load(f)
+        self._loaded: Dict[str, Any] = {}
+
+    def info(self, name: str) -> Dict[str, Any]:
+        """Return the manifest entry (kind, shape, dtypes, hash, ...) of ``name``."""
+        return self.manifest["entries"][name]
+
+    def _load(self, name: str) -> Any:
+        entry = self.info(name)
+        if entry["kind"] in ("value", "repr"):
+            return entry["value"]
+
+        path = self.manifest_path.parent / entry["path"]
+        if self.verify and file_digest(path) != entry["sha256"]:
+            raise ValueError(f"Result file {path} does not match its recorded hash")
+        if entry["kind"] == "ndarray":
+            return np.load(path, mmap_mode="r")
+        if path.suffix == ".parquet":
+            frame = pd.read_parquet(path)
+        else:
+            frame = pd.read_csv(path, index_col=0)
+        return frame.iloc[:, 0] if entry["kind"] == "series" else frame
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._loaded:
+            self._loaded[name] = self._load(name)
+        return self._loaded[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.manifest["entries"])
+
+    def __len__(self) -> int:
+        return len(self.manifest["entries"])
+
+
+def load_results(manifest_path: Union[str, Path], verify: bool = False) -> LazyResults:
+    """
+    Open results saved by ``write_results`` without loading any data files.
+
+    Parameters
+    ----------
+    manifest_path : str or Path
+        Manifest written by ``write_results``
+    verify : bool, optional
+        Check data files against their recorded hashes when loading them
+
+    Returns
+    -------
+    LazyResults
+        Mapping from result names to values, loaded on first access
+    """
+    return LazyResults(manifest_path, verify=verify)
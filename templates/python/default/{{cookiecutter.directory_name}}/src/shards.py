@@ -0,0 +1,287 @@
+"""
+Loading many small input files at once.
+
+Instruments often write thousands of small CSV shards. ``load_data``
+accepts a glob pattern (``raw/run-*.csv``) or a directory of such files
+and hands them to this module:
+
+- Shards are parsed concurrently on a thread pool (pandas' parsers
+  release the GIL for most of their work) or, for parsers that do not, on
+  a process pool.
+- The shard order is fixed by a natural sort of the file names
+  (``run-2`` before ``run-10``), independent of which parse finishes first.
+- The parsed shards are concatenated once at the end, with one allocation
+  per column, instead of growing a frame file by file.
+- A shard that fails to parse does not abort the load. It is skipped and
+  reported in the log and in ``data.attrs["failed_shards"]`` (or, when
+  streaming, in the ``failed_shards`` attribute of the chunk iterator);
+  only when no shard can be read is ``ShardLoadError`` raised.
+"""
+
+from __future__ import annotations
+
+import glob
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .log_setup import worker_logging
+from .utils import lazy_import
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# File types that can be loaded as shards
+SHARD_SUFFIXES = (".csv", ".tsv", ".xls", ".xlsx", ".parquet", ".feather")
+
+
+class ShardLoadError(Exception):
+    """No shard of a multi-file input could be loaded."""
+
+    def __init__(self, message: str, failed: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.failed = failed or {}
+
+
+def _natural_key(path: Path) -> List[Any]:
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", str(path))]
+
+
+def find_shards(data_dir: Path, pattern: str) -> Optional[List[Path]]:
+    """
+    Resolve a multi-file input.
+
+    Parameters
+    ----------
+    data_dir : Path
+        Directory that ``pattern`` is relative to
+    pattern : str
+        Glob pattern, or a directory whose files are the shards
+
+    Returns
+    -------
+    List[Path] or None
+        Shard files in natural sort order, or None if ``pattern`` is
+        neither a glob pattern nor a directory of shard files (a single
+        file, or a Parquet/Arrow dataset directory)
+    """
+    path = data_dir / pattern
+    if glob.has_magic(pattern):
+        paths = [Path(name) for name in glob.glob(str(path), recursive=True)]
+    elif path.is_dir():
+        paths = list(path.iterdir())
+        # Directories of Parquet/Arrow files (possibly partitioned) are datasets
+        if any(p.is_dir() for p in paths) or not any(p.suffix in (".csv", ".tsv", ".xls", ".xlsx") for p in paths):
+            return None
+    else:
+        return None
+    shards = [p for p in paths if p.is_file() and p.suffix in SHARD_SUFFIXES and not p.name.startswith(".")]
+    return sorted(shards, key=_natural_key)
+
+
+def read_shard(path: Path, dtype: Optional[Dict[str, Any]] = None, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+    """Parse a single shard according to its suffix."""
+    if path.suffix in (".csv", ".tsv"):
+        return pd.read_csv(path, sep="\t" if path.suffix == ".tsv" else ",", dtype=dtype, usecols=usecols)
+    if path.suffix in (".xls", ".xlsx"):
+        return pd.read_excel(path, dtype=dtype, usecols=usecols)
+    if path.suffix == ".parquet":
+        data = pd.read_parquet(path, columns=usecols)
+    else:
+        data = pd.read_feather(path, columns=usecols)
+    return data.astype(dtype) if dtype else data
+
+
+def _executor(parallel: str, n_workers: Optional[int]) -> Tuple[Executor, int]:
+    if parallel == "processes":
+        n_workers = n_workers or os.cpu_count() or 1
+        return ProcessPoolExecutor(max_workers=n_workers, **worker_logging()), n_workers
+    if parallel == "threads":
+        n_workers = n_workers or min(32, (os.cpu_count() or 1) + 4)
+        return ThreadPoolExecutor(max_workers=n_workers), n_workers
+    raise ValueError(f"parallel must be 'threads' or 'processes', not {parallel!r}")
+
+
+def _parsed(
+    paths: List[Path],
+    dtype: Optional[Dict[str, Any]],
+    usecols: Optional[List[str]],
+    parallel: str,
+    n_workers: Optional[int],
+    failed: Dict[str, str],
+) -> Iterator[Tuple[Path, pd.DataFrame]]:
+    """Parse shards concurrently and yield them in input order; failures go to ``failed``."""
+    pool, n_workers = _executor(parallel, n_workers)
+    with pool:
+        # Bound the number of parsed shards waiting to be consumed
+        window = 4 * n_workers
+        pending: "deque[Tuple[Path, Future]]" = deque()
+        paths_left = iter(paths)
+        for path in paths_left:
+            pending.append((path, pool.submit(read_shard, path, dtype, usecols)))
+            if len(pending) >= window:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(paths_left, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(read_shard, next_path, dtype, usecols)))
+            try:
+                yield path, future.result()
+            except Exception as e:
+                logger.warning(f"Could not load shard {path.name}: {e}")
+                failed[str(path)] = str(e)
+
+
+def _report(failed: Dict[str, str], n_shards: int) -> None:
+    if failed:
+        logger.error(f"{len(failed)} of {n_shards} shards failed to load: "
+                     + ", ".join(Path(path).name for path in failed))
+    if len(failed) == n_shards:
+        raise ShardLoadError(f"None of the {n_shards} shards could be loaded", failed)
+
+
+def read_shards(
+    paths: List[Path],
+    dtype: Optional[Dict[str, Any]] = None,
+    usecols: Optional[List[str]] = None,
+    parallel: str = "threads",
+    n_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Parse shards concurrently and concatenate them in order.
+
+    Parameters
+    ----------
+    paths : List[Path]
+        Shard files, in the order their rows should appear
+    dtype : Dict[str, Any], optional
+        Column types, passed to the parser
+    usecols : List[str], optional
+        Only read these columns
+    parallel : str, optional
+        ``"threads"`` (default) or ``"processes"``
+    n_workers : int, optional
+        Pool size, by default the executor's default
+
+    Returns
+    -------
+    pd.DataFrame
+        All rows with a fresh RangeIndex. Shards that failed are listed in
+        ``attrs["failed_shards"]`` (path -> error message).
+    """
+    if not paths:
+        raise ShardLoadError("No input files matched")
+    logger.info(f"Loading {len(paths)} shards using {parallel}")
+    failed: Dict[str, str] = {}
+    frames = [frame for _, frame in _parsed(paths, dtype, usecols, parallel, n_workers, failed)]
+    _report(failed, len(paths))
+    data = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0].reset_index(drop=True)
+    data.attrs["failed_shards"] = failed
+    return data
+
+
+class ShardChunks:
+    """
+    Iterator over the chunks of ``iter_shards``.
+
+    ``failed_shards`` (path -> error message) fills up as shards fail and
+    is complete once the iterator is exhausted.
+    """
+
+    def __init__(self, chunks: Iterator[pd.DataFrame], failed_shards: Dict[str, str]):
+        self._chunks = chunks
+        self.failed_shards = failed_shards
+
+    def __iter__(self) -> "ShardChunks":
+        return self
+
+    def __next__(self) -> pd.DataFrame:
+        return next(self._chunks)
+
+    def close(self) -> None:
+        self._chunks.close()
+
+
+def iter_shards(
+    paths: List[Path],
+    chunksize: int,
+    dtype: Optional[Dict[str, Any]] = None,
+    usecols: Optional[List[str]] = None,
+    parallel: str = "threads",
+    n_workers: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream shards in order, regrouped into chunks of about ``chunksize`` rows.
+
+    Small shards are combined and large ones passed on whole, so a chunk
+    can exceed ``chunksize`` by up to one shard. Shards are parsed ahead on
+    the pool while earlier chunks are processed.
+
+    Parameters
+    ----------
+    paths : List[Path]
+        Shard files, in order
+    chunksize : int
+        Target number of rows per chunk
+    dtype, usecols, parallel, n_workers
+        As for ``read_shards``
+
+    Returns
+    -------
+    ShardChunks
+        Consecutive chunks of all shards; shards that failed are listed in
+        its ``failed_shards`` attribute
+    """
+    if not paths:
+        raise ShardLoadError("No input files matched")
+    if parallel not in ("threads", "processes"):
+        raise ValueError(f"parallel must be 'threads' or 'processes', not {parallel!r}")
+    failed: Dict[str, str] = {}
+    return ShardChunks(_iter_chunks(paths, chunksize, dtype, usecols, parallel, n_workers, failed), failed)
+
+
+def _iter_chunks(
+    paths: List[Path],
+    chunksize: int,
+    dtype: Optional[Dict[str, Any]],
+    usecols: Optional[List[str]],
+    parallel: str,
+    n_workers: Optional[int],
+    failed: Dict[str, str],
+) -> Iterator[pd.DataFrame]:
+    buffer: List[pd.DataFrame] = []
+    buffered = 0
+    start = 0
+
+    def flush() -> pd.DataFrame:
+        nonlocal buffer, buffered, start
+        chunk = pd.concat(buffer, ignore_index=True) if len(buffer) > 1 else buffer[0].reset_index(drop=True)
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        buffer, buffered = [], 0
+        return chunk
+
+    for _, frame in _parsed(paths, dtype, usecols, parallel, n_workers, failed):
+        buffer.append(frame)
+        buffered += len(frame)
+        if buffered >= chunksize:
+            yield flush()
+    if buffer:
+        yield flush()
+    _report(failed, len(paths))
+
+
+def rows_per_budget(paths: List[Path], memory_budget: int, dtype: Optional[Dict[str, Any]] = None,
+                    usecols: Optional[List[str]] = None) -> int:
+    """Estimate how many rows of the shards fit into ``memory_budget`` bytes, from the first shard."""
+    sample = read_shard(paths[0], dtype, usecols)
+    if sample.empty:
+        return 1000
+    bytes_per_row = sample.memory_usage(index=False, deep=True).sum() / len(sample)
+    return max(1, int(memory_budget // max(bytes_per_row, 1)))
@@ -0,0 +1,306 @@
+"""
+Out-of-core summary statistics and correlation.
+
+``MomentAccumulator`` keeps count, mean, sum of squared deviations, minimum
+and maximum per column plus the pairwise co-moments needed for the Pearson
+correlation matrix, and optionally a ``KLLSketch`` per column for
+percentiles (see ``src/quantiles.py`` for their error bound).
+Accumulators computed on separate chunks can be merged with the parallel
+update formulas of Chan, Golub and LeVeque (the multi-chunk form of
+Welford's algorithm), so a dataset can be reduced one chunk at a time and
+the chunks can be processed on several cores.
+
+Missing values are handled like pandas does: each statistic of a column
+uses the rows where that column is present, and each correlation
+coefficient uses the rows where both columns are present.
+
+Tolerance
+---------
+Results agree with ``DataFrame.describe()`` and ``DataFrame.corr()`` on
+the same data up to floating-point rounding: counts, minima and maxima are
+exact, means and standard deviations agree to a relative tolerance of
+1e-9 and correlation coefficients to an absolute tolerance of 1e-9.
+Chunks are centred on their own means before any products are formed, so
+large offsets do not cause cancellation; the bound only degrades when a
+column's mean exceeds its standard deviation by many orders of magnitude
+(beyond about 1e6), where the input values themselves carry too few
+significant digits. ``tests/test_main.py`` checks these tolerances.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from .log_setup import worker_logging
+from .quantiles import KLLSketch, k_for_error
+from .utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+
+class MomentAccumulator:
+    """
+    Mergeable first and second moments of a set of numeric columns.
+
+    All pairwise state is kept in ``p x p`` matrices whose entry ``[i, j]``
+    refers to column ``i`` restricted to the rows where column ``j`` is also
+    present; the diagonal holds the plain per-column statistics.
+
+    Parameters
+    ----------
+    columns : List[str]
+        Names of the columns being accumulated
+    quantile_k : int, optional
+        Size of the per-column quantile sketches; without it no percentiles
+        are tracked
+    """
+
+    def __init__(self, columns: List[str], quantile_k: Optional[int] = None):
+        p = len(columns)
+        self.columns = list(columns)
+        self.n = np.zeros((p, p))
+        self.mean = np.zeros((p, p))
+        self.m2 = np.zeros((p, p))
+        self.comoment = np.zeros((p, p))
+        self.min = np.full(p, np.inf)
+        self.max = np.full(p, -np.inf)
+        self.sketches = None if quantile_k is None else [KLLSketch(quantile_k) for _ in columns]
+
+    @classmethod
+    def from_array(cls, values: np.ndarray, columns: List[str], quantile_k: Optional[int] = None) -> "MomentAccumulator":
+        """
+        Compute the moments of one chunk.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Chunk as a 2-D float array with NaN for missing values
+        columns : List[str]
+            Column names matching the second axis of ``values``
+        quantile_k : int, optional
+            Size of the per-column quantile sketches
+
+        Returns
+        -------
+        MomentAccumulator
+            Moments of the chunk
+        """
+        acc = cls(columns, quantile_k)
+        present = ~np.isnan(values)
+        weights = present.astype(np.float64)
+        count = weights.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Centre each column on its chunk mean so that the products
+            # below do not lose precision to large offsets
+            shift = np.where(count > 0, np.where(present, values, 0.0).sum(axis=0) / count, 0.0)
+        centred = np.where(present, values - shift, 0.0)
+
+        acc.n = weights.T @ weights
+        sums = centred.T @ weights
+        squares = (centred ** 2).T @ weights
+        cross = centred.T @ centred
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pair_mean = np.where(acc.n > 0, sums / acc.n, 0.0)
+        acc.mean = shift[:, None] + pair_mean
+        acc.m2 = squares - acc.n * pair_mean ** 2
+        acc.comoment = cross - acc.n * pair_mean * pair_mean.T
+        acc.min = np.where(present, values, np.inf).min(axis=0, initial=np.inf)
+        acc.max = np.where(present, values, -np.inf).max(axis=0, initial=-np.inf)
+        if acc.sketches is not None:
+            for i, sketch in enumerate(acc.sketches):
+                sketch.update(values[:, i])
+        return acc
+
+    @classmethod
+    def from_frame(
+        cls,
+        data: pd.DataFrame,
+        columns: Optional[List[str]] = None,
+        quantile_k: Optional[int] = None,
+    ) -> "MomentAccumulator":
+        """Compute the moments of the numeric columns (or ``columns``) of a DataFrame."""
+        if columns is None:
+            columns = list(data.select_dtypes(include=[np.number]).columns)
+        return cls.from_array(data[columns].to_numpy(dtype=np.float64), columns, quantile_k)
+
+    def merge(self, other: "MomentAccumulator") -> "MomentAccumulator":
+        """
+        Fold the moments of ``other`` into this accumulator.
+
+        Parameters
+        ----------
+        other : MomentAccumulator
+            Moments of a disjoint set of rows with the same columns
+
+        Returns
+        -------
+        MomentAccumulator
+            This accumulator, for chaining
+        """
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge accumulators over different columns")
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(n > 0, self.n * other.n / n, 0.0)
+            self.mean = self.mean + delta * np.where(n > 0, other.n / n, 0.0)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * weight
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.n = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        if self.sketches is not None and other.sketches is not None:
+            for sketch, other_sketch in zip(self.sketches, other.sketches):
+                sketch.merge(other_sketch)
+        else:
+            self.sketches = None
+        return self
+
+    @property
+    def count(self) -> np.ndarray:
+        """Number of non-missing values per column."""
+        return np.diag(self.n).copy()
+
+    def summary(self, percentiles: Sequence[float] = (0.25, 0.5, 0.75)) -> pd.DataFrame:
+        """
+        Per-column summary in the layout of ``DataFrame.describe()``.
+
+        Parameters
+        ----------
+        percentiles : Sequence[float], optional
+            Percentiles to estimate from the quantile sketches, by default
+            the quartiles. Ignored when no sketches are tracked.
+
+        Returns
+        -------
+        pd.DataFrame
+            Rows ``count``, ``mean``, ``std``, ``min``, one row per
+            percentile (e.g. ``25%``) and ``max``
+        """
+        count = self.count
+        has_values = count > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.where(count > 1, np.sqrt(np.maximum(np.diag(self.m2), 0.0) / (count - 1)), np.nan)
+        rows = {
+            "count": count,
+            "mean": np.where(has_values, np.diag(self.mean), np.nan),
+            "std": std,
+            "min": np.where(has_values, self.min, np.nan),
+        }
+        if self.sketches is not None:
+            estimates = np.array([sketch.quantiles(percentiles) for sketch in self.sketches]).reshape(len(self.columns), -1)
+            for i, q in enumerate(percentiles):
+                rows[format_percentile(q)] = estimates[:, i]
+        rows["max"] = np.where(has_values, self.max, np.nan)
+        return pd.DataFrame(list(rows.values()), index=list(rows), columns=self.columns)
+
+    def correlation(self) -> pd.DataFrame:
+        """
+        Pearson correlation matrix with pairwise-complete observations.
+
+        Returns
+        -------
+        pd.DataFrame
+            Correlation matrix, NaN where a pair has no variance
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, np.where(np.diag(self.m2) > 0, 1.0, np.nan))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+def format_percentile(q: float) -> str:
+    """Label a percentile the way ``describe()`` does, e.g. 0.25 -> ``"25%"``."""
+    return f"{q * 100:g}%"
+
+
+def _chunk_moments(values: np.ndarray, columns: List[str], quantile_k: Optional[int]) -> MomentAccumulator:
+    """Worker entry point for ``accumulate_chunks``."""
+    return MomentAccumulator.from_array(values, columns, quantile_k)
+
+
+def accumulate_chunks(
+    chunks: Iterable[pd.DataFrame],
+    n_workers: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    quantile_error: Optional[float] = None,
+    initial: Optional[MomentAccumulator] = None,
+    on_progress: Optional[Callable[[int, MomentAccumulator], None]] = None,
+) -> Optional[MomentAccumulator]:
+    """
+    Reduce a stream of chunks to a single ``MomentAccumulator``.
+
+    With more than one worker, the per-chunk moments are computed on a
+    process pool while the caller keeps reading chunks. At most two chunks
+    per worker are in flight, which bounds memory use, and partial results
+    are merged in chunk order so the outcome does not depend on scheduling.
+
+    Parameters
+    ----------
+    chunks : Iterable[pd.DataFrame]
+        Chunks of the dataset
+    n_workers : int, optional
+        Number of worker processes, by default one per CPU. With 1 the
+        chunks are processed in the calling process.
+    columns : List[str], optional
+        Columns to accumulate, by default the numeric columns of the first
+        chunk
+    quantile_error : float, optional
+        Normalized rank error of the per-column quantile sketches, e.g.
+        0.01. Without it no percentiles are tracked.
+    initial : MomentAccumulator, optional
+        Moments of earlier chunks to continue from, e.g. from a checkpoint
+    on_progress : Callable[[int, MomentAccumulator], None], optional
+        Called with the number of chunks consumed and the moments so far
+        each time a chunk has been merged
+
+    Returns
+    -------
+    MomentAccumulator or None
+        Moments of all chunks, or None if there were no chunks
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    quantile_k = None if quantile_error is None else k_for_error(quantile_error)
+    total = initial
+    if initial is not None:
+        columns = initial.columns
+
+    def fold(position: int, partial: MomentAccumulator) -> None:
+        nonlocal total
+        total = partial if total is None else total.merge(partial)
+        if on_progress is not None:
+            on_progress(position, total)
+
+    def arrays():
+        nonlocal columns
+        for position, chunk in enumerate(chunks, start=1):
+            if columns is None:
+                columns = list(chunk.select_dtypes(include=[np.number]).columns)
+            if len(chunk):
+                yield position, chunk[columns].to_numpy(dtype=np.float64)
+
+    if n_workers == 1:
+        for position, values in arrays():
+            fold(position, _chunk_moments(values, columns, quantile_k))
+        return total
+
+    logger.info(f"Accumulating statistics on {n_workers} worker processes")
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=n_workers, **worker_logging()) as pool:
+        for position, values in arrays():
+            pending.append((position, pool.submit(_chunk_moments, values, columns, quantile_k)))
+            if len(pending) >= 2 * n_workers:
+                position, future = pending.popleft()
+                fold(position, future.result())
+        while pending:
+            position, future = pending.popleft()
+            fold(position, future.result())
+    return total
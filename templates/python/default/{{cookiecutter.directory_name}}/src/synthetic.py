@@ -0,0 +1,200 @@
+"""
+Reproducible synthetic datasets of any size.
+
+``generate_sample_data`` in ``src/main.py`` builds its demo data here. For
+load tests the same model (``y = sin(x) + noise`` on ``x`` evenly spaced
+over [0, 10]) can be generated with hundreds of millions of rows and
+written straight to disk by ``write_sample_data``.
+
+The rows are split into fixed-size chunks and chunk ``i`` draws its noise
+from the ``i``-th child of ``np.random.SeedSequence(seed).spawn(...)``.
+Each chunk therefore depends only on the seed, the chunk size and its own
+index, never on which process produced it or in what order, so the output
+is bit-identical for any number of workers. Changing ``chunk_rows``
+changes the random streams and thus the data, so it is recorded together
+with the seed.
+
+Chunks are produced on a process pool and written in order: ``.npy``
+outputs are filled in place by the workers through a memory map,
+``.parquet`` and ``.csv`` outputs are appended by the calling process
+with at most two chunks per worker in flight.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from .log_setup import worker_logging
+from .utils import atomic_path, lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow", optional=True)
+pq = lazy_import("pyarrow.parquet", optional=True)
+
+logger = logging.getLogger(__name__)
+
+# Rows per chunk; part of the dataset's identity together with the seed
+CHUNK_ROWS = 1_000_000
+
+# Row layout of .npy outputs
+SAMPLE_DTYPE = [("x", "<f8"), ("y", "<f8")]
+
+
+def _seeds(n_samples: int, chunk_rows: int, seed: int):
+    return np.random.SeedSequence(seed).spawn(-(-n_samples // chunk_rows))
+
+
+def _make_chunk(n_samples: int, start: int, stop: int, seed_seq: np.random.SeedSequence) -> np.ndarray:
+    """Rows ``start:stop`` of the dataset as a structured array."""
+    rng = np.random.default_rng(seed_seq)
+    chunk = np.empty(stop - start, dtype=SAMPLE_DTYPE)
+    chunk["x"] = np.arange(start, stop) * (10 / max(n_samples - 1, 1))
+    chunk["y"] = np.sin(chunk["x"]) + 0.1 * rng.standard_normal(stop - start)
+    return chunk
+
+
+def _fill_npy(path: str, n_samples: int, start: int, stop: int, seed_seq: np.random.SeedSequence) -> None:
+    """Worker entry point: write one chunk into the memory-mapped output."""
+    out = np.load(path, mmap_mode="r+")
+    out[start:stop] = _make_chunk(n_samples, start, stop, seed_seq)
+    out.flush()
+
+
+def iter_sample_chunks(
+    n_samples: int,
+    chunk_rows: int = CHUNK_ROWS,
+    seed: int = 42,
+    n_workers: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Generate the synthetic dataset chunk by chunk.
+
+    Parameters
+    ----------
+    n_samples : int
+        Total number of rows
+    chunk_rows : int, optional
+        Rows per chunk, by default 1,000,000
+    seed : int, optional
+        Root seed, by default 42
+    n_workers : int, optional
+        Number of worker processes, by default one per CPU. With 1 the
+        chunks are generated in the calling process.
+
+    Yields
+    ------
+    pd.DataFrame
+        Consecutive chunks with columns ``x`` and ``y``
+    """
+    tasks = [
+        (n_samples, start, min(start + chunk_rows, n_samples), seed_seq)
+        for start, seed_seq in zip(range(0, n_samples, chunk_rows), _seeds(n_samples, chunk_rows, seed))
+    ]
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(tasks), 1))
+
+    def frame(chunk: np.ndarray, start: int) -> pd.DataFrame:
+        return pd.DataFrame(chunk, index=pd.RangeIndex(start, start + len(chunk)))
+
+    if n_workers == 1:
+        for task in tasks:
+            yield frame(_make_chunk(*task), task[1])
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=n_workers, **worker_logging()) as pool:
+        for task in tasks:
+            pending.append((task[1], pool.submit(_make_chunk, *task)))
+            if len(pending) >= 2 * n_workers:
+                start, future = pending.popleft()
+                yield frame(future.result(), start)
+        while pending:
+            start, future = pending.popleft()
+            yield frame(future.result(), start)
+
+
+def write_sample_data(
+    path: Union[str, Path],
+    n_samples: int,
+    chunk_rows: int = CHUNK_ROWS,
+    seed: int = 42,
+    n_workers: Optional[int] = None,
+) -> Path:
+    """
+    Write the synthetic dataset to ``.npy``, ``.parquet`` or ``.csv``.
+
+    The file appears atomically once it is complete.
+
+    Parameters
+    ----------
+    path : str or Path
+        Output file; the suffix selects the format
+    n_samples : int
+        Total number of rows
+    chunk_rows : int, optional
+        Rows per chunk, by default 1,000,000
+    seed : int, optional
+        Root seed, by default 42
+    n_workers : int, optional
+        Number of worker processes, by default one per CPU
+
+    Returns
+    -------
+    Path
+        The written file
+    """
+    path = Path(path)
+    suffix = path.suffix
+    if suffix not in (".npy", ".parquet", ".csv"):
+        raise ValueError(f"Unsupported output format: {suffix}")
+    if suffix == ".parquet" and pa is None:
+        raise ImportError("Writing Parquet requires pyarrow. Install with: pip install pyarrow")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Generating {n_samples:,} rows into {path} (seed {seed}, {chunk_rows:,} rows per chunk)")
+
+    with atomic_path(path) as tmp_path:
+        if suffix == ".npy":
+            _write_npy(tmp_path, n_samples, chunk_rows, seed, n_workers)
+        elif suffix == ".parquet":
+            writer = pq.ParquetWriter(tmp_path, pa.schema([("x", pa.float64()), ("y", pa.float64())]))
+            try:
+                for chunk in iter_sample_chunks(n_samples, chunk_rows, seed, n_workers):
+                    writer.write_table(pa.Table.from_pandas(chunk, preserve_index=False))
+            finally:
+                writer.close()
+        else:
+            with open(tmp_path, "w", newline="") as f:
+                f.write("x,y\n")
+                for chunk in iter_sample_chunks(n_samples, chunk_rows, seed, n_workers):
+                    # repr-precision floats so the CSV round-trips exactly
+                    chunk.to_csv(f, header=False, index=False, float_format="%.17g")
+    logger.info(f"Synthetic dataset written to {path}")
+    return path
+
+
+def _write_npy(path: Path, n_samples: int, chunk_rows: int, seed: int, n_workers: Optional[int]) -> None:
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=SAMPLE_DTYPE, shape=(n_samples,))
+    del out  # header written; workers fill the rows
+    tasks = [
+        (str(path), n_samples, start, min(start + chunk_rows, n_samples), seed_seq)
+        for start, seed_seq in zip(range(0, n_samples, chunk_rows), _seeds(n_samples, chunk_rows, seed))
+    ]
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if n_workers == 1:
+        for task in tasks:
+            _fill_npy(*task)
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=n_workers, **worker_logging()) as pool:
+        for task in tasks:
+            pending.append(pool.submit(_fill_npy, *task))
+            if len(pending) >= 2 * n_workers:
+                pending.popleft().result()
+        while pending:
+            pending.popleft().result()
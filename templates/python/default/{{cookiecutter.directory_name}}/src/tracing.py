@@ -0,0 +1,209 @@
+"""
+Timing spans and opt-in profiling of the stages of a run.
+
+``main()`` wraps ``load_data``, ``analyze_data``, ``visualize_data`` and
+``save_results`` in ``Tracer.span``. Every span records its wall-clock and
+CPU time. Two kinds of profiling can be switched on with ``--profile`` or
+the ``CRESP_PROFILE`` environment variable (a comma-separated list):
+
+- ``cpu``: ``cProfile`` per span; the statistics are written to
+  ``data/results/profiles/<span>.prof`` (open them with ``snakeviz`` or
+  ``python -m pstats``) and the slowest functions are listed in the
+  summary.
+- ``memory``: ``tracemalloc`` per span, recording the peak and net
+  Python allocations. Tracing allocations slows Python code down
+  noticeably, so it is off by default. Python 3.8 cannot reset the peak,
+  so there a nested span reports the peak since tracing started.
+
+``Tracer.write`` exports the spans in the Chrome trace-event format, which
+``chrome://tracing`` and https://ui.perfetto.dev display as a timeline.
+``Tracer.summary`` returns one row per span; ``main()`` adds it to the
+results manifest and logs it as a table.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .utils import atomic_path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = "CRESP_PROFILE"
+PROFILE_KINDS = ("cpu", "memory")
+
+# Functions listed per span in the summary when profiling CPU time
+TOP_FUNCTIONS = 5
+
+
+def profile_kinds(value: Optional[str] = None) -> List[str]:
+    """
+    Parse a profiling selection such as ``"cpu,memory"``.
+
+    Parameters
+    ----------
+    value : str, optional
+        Comma-separated kinds, ``"all"`` for every kind; by default the
+        ``CRESP_PROFILE`` environment variable
+
+    Returns
+    -------
+    List[str]
+        Selected kinds out of ``PROFILE_KINDS``
+    """
+    if value is None:
+        value = os.environ.get(PROFILE_ENV, "")
+    kinds = [kind.strip().lower() for kind in value.split(",") if kind.strip()]
+    if "all" in kinds:
+        return list(PROFILE_KINDS)
+    unknown = sorted(set(kinds) - set(PROFILE_KINDS))
+    if unknown:
+        raise ValueError(f"Unknown profile kind(s) {', '.join(unknown)}; choose from {', '.join(PROFILE_KINDS)}")
+    return [kind for kind in PROFILE_KINDS if kind in kinds]
+
+
+def _top_functions(profile: cProfile.Profile, n: int = TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+    """The ``n`` functions with the most cumulative time."""
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    top = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in rows[:n]:
+        top.append({"function": f"{Path(filename).name}:{line}({function})", "calls": calls,
+                    "own_seconds": round(own, 4), "cumulative_seconds": round(cumulative, 4)})
+    return top
+
+
+class Tracer:
+    """
+    Record spans of a run, optionally with CPU and memory profiles.
+
+    Parameters
+    ----------
+    profile : Iterable[str], optional
+        Profiling to enable, out of ``"cpu"`` and ``"memory"``
+    profile_dir : Path, optional
+        Where ``cpu`` profiles are written, by default nowhere
+    """
+
+    def __init__(self, profile: Iterable[str] = (), profile_dir: Optional[Path] = None):
+        self.profile = frozenset(profile)
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.spans: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._profiling = False
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Time the ``with`` block as a span called ``name``.
+
+        Keyword arguments are stored with the span and shown in the trace
+        viewer. The yielded dictionary is the span's record; more
+        arguments can be added to its ``"args"`` inside the block.
+        """
+        record = {"name": name, "args": dict(args), "thread": threading.get_ident()}
+        # cProfile cannot nest, so only the outermost span is profiled
+        profiler = None
+        if "cpu" in self.profile and not self._profiling:
+            profiler = cProfile.Profile()
+            self._profiling = True
+        started_tracing = False
+        if "memory" in self.profile:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            memory_before = tracemalloc.get_traced_memory()[0]
+            if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                tracemalloc.reset_peak()
+
+        cpu_start = time.process_time()
+        start = time.perf_counter_ns()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError as e:  # another profiler, e.g. a coverage tool, is active
+                logger.warning(f"CPU profiling of {name} unavailable: {e}")
+                profiler = None
+                self._profiling = False
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            end = time.perf_counter_ns()
+            record["start_us"] = (start - self._origin) / 1000
+            record["duration_us"] = (end - start) / 1000
+            record["cpu_seconds"] = time.process_time() - cpu_start
+            if "memory" in self.profile:
+                current, peak = tracemalloc.get_traced_memory()
+                record["peak_allocated_bytes"] = max(peak - memory_before, 0)
+                record["net_allocated_bytes"] = current - memory_before
+                if started_tracing:
+                    tracemalloc.stop()
+            if profiler is not None:
+                record["top_functions"] = _top_functions(profiler)
+                if self.profile_dir is not None:
+                    self.profile_dir.mkdir(parents=True, exist_ok=True)
+                    record["profile"] = str(self.profile_dir / f"{name}.prof")
+                    profiler.dump_stats(record["profile"])
+            with self._lock:
+                self.spans.append(record)
+
+    def trace_events(self) -> List[Dict[str, Any]]:
+        """The spans as Chrome trace events (complete events, times in microseconds)."""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "src.main"}}]
+        for record in sorted(self.spans, key=lambda record: record["start_us"]):
+            args = dict(record["args"], cpu_seconds=round(record["cpu_seconds"], 4))
+            for key in ("peak_allocated_bytes", "net_allocated_bytes", "profile"):
+                if key in record:
+                    args[key] = record[key]
+            events.append({"name": record["name"], "cat": "stage", "ph": "X", "pid": pid,
+                           "tid": record["thread"], "ts": record["start_us"], "dur": record["duration_us"],
+                           "args": args})
+        return events
+
+    def write(self, path: Path) -> Path:
+        """Write the trace as a Chrome trace-event JSON file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "w") as f:
+                json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        return path
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """One row per span: wall-clock and CPU seconds, and the profiling results if enabled."""
+        rows = []
+        for record in self.spans:
+            row = {"span": record["name"], "seconds": round(record["duration_us"] / 1e6, 4),
+                   "cpu_seconds": round(record["cpu_seconds"], 4)}
+            for key in ("peak_allocated_bytes", "net_allocated_bytes", "top_functions", "profile"):
+                if key in record:
+                    row[key] = record[key]
+            rows.append(row)
+        return rows
+
+    def log_summary(self) -> None:
+        """Log the summary as a table."""
+        memory = "memory" in self.profile
+        header = f"{'span':<16} {'seconds':>9} {'cpu s':>9}" + (f" {'peak alloc':>12}" if memory else "")
+        logger.info(header)
+        for row in self.summary():
+            line = f"{row['span']:<16} {row['seconds']:>9.3f} {row['cpu_seconds']:>9.3f}"
+            if memory:
+                line += f" {row['peak_allocated_bytes'] / 1024 ** 2:>9.1f} MB"
+            logger.info(line)
+            for function in row.get("top_functions", [])[:3]:
+                logger.info(f"    {function['cumulative_seconds']:>8.3f}s  {function['function']}")
@@ -0,0 +1,239 @@
+"""
+Small helpers shared by the modules of {{ cookiecutter.project_name }}.
+"""
+
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Iterator, Optional, Union
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+
+class LazyModule(ModuleType):
+    """Placeholder for a module that is imported on first attribute access."""
+
+    def __getattr__(self, attr: str) -> Any:
+        module = importlib.import_module(self.__name__)
+        # Later lookups find the attributes directly instead of calling __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str, optional: bool = False) -> Optional[ModuleType]:
+    """
+    Import a module when it is first used rather than now.
+
+    Use it for heavy libraries, so ``import src.main`` and ``--help`` stay
+    fast and each library is only loaded by the stage that needs it::
+
+        pd = lazy_import("pandas")
+        pq = lazy_import("pyarrow.parquet", optional=True)
+
+    Annotations using the module need ``from __future__ import annotations``.
+
+    Parameters
+    ----------
+    name : str
+        Module name, e.g. ``"pandas"`` or ``"matplotlib.pyplot"``
+    optional : bool, optional
+        Return None if the package is not installed, replacing the usual
+        ``try: import ... except ImportError: ... = None``
+
+    Returns
+    -------
+    ModuleType or None
+        The module if already imported, a ``LazyModule`` otherwise
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if optional and importlib.util.find_spec(name.partition(".")[0]) is None:
+        return None
+    return LazyModule(name)
+
+
+def file_digest(path: Union[str, Path], algorithm: str = "sha256", block_size: int = 1 << 20) -> str:
+    """
+    Compute the hex digest of a file's contents.
+
+    The file is read in blocks, so memory use does not depend on its size.
+
+    Parameters
+    ----------
+    path : str or Path
+        File to hash
+    algorithm : str, optional
+        Any algorithm supported by ``hashlib``, by default "sha256"
+    block_size : int, optional
+        Number of bytes read at a time, by default 1 MiB
+
+    Returns
+    -------
+    str
+        Hex digest of the file contents
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def options_digest(options: Any, length: int = 16) -> str:
+    """
+    Compute a short, stable digest of a JSON-like structure of options.
+
+    Values that are not JSON serializable (dtypes, paths, ...) are hashed
+    through their ``str()`` representation.
+    """
+    encoded = json.dumps(options, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:length]
+
+
+def _umask_from_proc() -> Optional[int]:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _umask_at_import() -> int:
+    # os.umask can only read the umask by setting it, which would give files
+    # created meanwhile by other threads the wrong mode; at import no other
+    # threads of this package are running yet
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _umask_from_proc()
+if _UMASK is None:
+    _UMASK = _umask_at_import()
+
+
+def _current_umask() -> int:
+    """The process umask: read from /proc on Linux, else as it was at import."""
+    mask = _umask_from_proc()
+    return _UMASK if mask is None else mask
+
+
+@contextmanager
+def atomic_path(path: Union[str, Path]) -> Iterator[Path]:
+    """
+    Write a file atomically.
+
+    Yields a temporary path in the same directory as ``path``. When the
+    block exits without an exception the temporary file is renamed over
+    ``path`` in a single step, otherwise it is removed. Readers therefore
+    only ever see the old or the complete new file. The file gets the
+    permissions of a newly created one (0666 minus the umask), not the
+    owner-only mode of the temporary file.
+
+    Parameters
+    ----------
+    path : str or Path
+        Final location of the file
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        yield tmp_path
+        if tmp_path.exists():
+            os.chmod(tmp_path, 0o666 & ~_current_umask())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def file_lock(path: Union[str, Path]) -> Iterator[None]:
+    """
+    Hold an exclusive lock on ``path`` while the block runs.
+
+    The lock is shared by all processes and threads that lock the same
+    file, which is created if needed; use it around read-modify-write
+    updates of files that concurrent runs share.
+
+    Parameters
+    ----------
+    path : str or Path
+        Lock file
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load_config(path: Union[str, Path] = PROJECT_DIR / "cresp.toml") -> Dict[str, Any]:
+    """
+    Read the project's CRESP configuration.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Configuration file, by default ``cresp.toml`` in the project directory
+
+    Returns
+    -------
+    Dict[str, Any]
+        Parsed configuration
+    """
+    if tomllib is None:
+        raise ImportError("Reading cresp.toml requires Python 3.11+ or tomli. Install with: pip install tomli")
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as ``"512MB"`` or ``"2GB"`` into a number of bytes."""
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4, "B": 1}
+    value = value.strip().upper()
+    for unit, factor in units.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
@@ -0,0 +1,272 @@
+"""
+Correlation for wide datasets.
+
+``DataFrame.corr()`` returns a dense ``p x p`` float64 frame and loops over
+column pairs, which becomes impractical for tables with tens of thousands
+of columns. The functions here compute the Pearson correlation one stripe
+of ``block_size`` columns at a time, each stripe with a few matrix
+products so the heavy lifting is done by BLAS:
+
+- ``blocked_correlation`` builds the dense matrix, optionally in float32
+  and optionally straight into a ``.npy`` file on disk.
+- ``correlation_edges`` never materializes the matrix. It keeps the
+  strongest correlations of every column (``top_k``) and/or all pairs
+  with ``|r| >= threshold`` and appends them to a Parquet or CSV file as
+  each stripe is finished.
+
+Missing values are handled pairwise, as in pandas. Columns without missing
+values take a faster path with a single product per stripe.
+
+The float32 path halves memory and roughly doubles BLAS throughput; its
+coefficients differ from the float64 ones by about 1e-6 to 1e-5 for
+typical sizes. Pairwise counts of present values stay exact at any
+number of rows.
+"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+from .utils import atomic_path, lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow", optional=True)
+pq = lazy_import("pyarrow.parquet", optional=True)
+
+logger = logging.getLogger(__name__)
+
+# Default memory budget for one stripe of the correlation matrix
+STRIPE_BYTES = 256 * 1024 ** 2
+
+# Preferred format for edge lists written by correlation_edges
+EDGES_SUFFIX = ".csv" if pa is None else ".parquet"
+
+# Columns of the edge lists written by correlation_edges
+EDGE_COLUMNS = (("source", "string"), ("target", "string"), ("r", "float64"))
+
+# Counts summed in float32 are exact up to 2**24; taller inputs are counted
+# in blocks of this many rows whose counts are added up in float64
+EXACT_COUNT_ROWS = 2 ** 24
+
+
+def _prepare(data: pd.DataFrame, dtype: np.dtype) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Centre the numeric columns of ``data``.
+
+    Returns the centred values with missing entries set to 0 and, if any
+    value is missing, the float mask of present entries. Without missing
+    values the columns are also scaled to unit norm, so that the
+    correlation matrix is just ``Z.T @ Z``. The columns are converted a
+    block at a time, so the float64 temporaries stay within STRIPE_BYTES
+    and the float32 option really halves peak memory.
+    """
+    n, p = data.shape
+    centred = np.empty((n, p), dtype=dtype)
+    norms = np.empty(p, dtype=np.float64)
+    present = None
+    step = max(1, STRIPE_BYTES // max(n * 8, 1))
+    for start in range(0, p, step):
+        cols = slice(start, min(start + step, p))
+        values = data.iloc[:, cols].to_numpy(dtype=np.float64)
+        mask = ~np.isnan(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(mask, values, 0.0).sum(axis=0) / mask.sum(axis=0)
+        block = np.where(mask, values - mean, 0.0)
+        norms[cols] = np.sqrt((block ** 2).sum(axis=0))
+        centred[:, cols] = block
+        if not mask.all():
+            if present is None:
+                present = np.ones((n, p), dtype=dtype)
+            present[:, cols] = mask
+    if present is None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centred /= norms.astype(dtype, copy=False)
+    return centred, present
+
+
+def _pair_counts(present: np.ndarray, block: slice) -> np.ndarray:
+    """Number of rows where both columns are present, for the columns of ``block`` against all columns."""
+    rows = present.shape[0]
+    if present.dtype == np.float64 or rows <= EXACT_COUNT_ROWS:
+        return (present[:, block].T @ present).astype(np.float64, copy=False)
+    n = np.zeros((block.stop - block.start, present.shape[1]), dtype=np.float64)
+    for start in range(0, rows, EXACT_COUNT_ROWS):
+        part = present[start:start + EXACT_COUNT_ROWS]
+        n += part[:, block].T @ part
+    return n
+
+
+def _stripes(
+    data: pd.DataFrame,
+    block_size: Optional[int],
+    dtype: np.dtype,
+) -> Iterator[Tuple[slice, np.ndarray]]:
+    """Yield ``(columns, r)`` with ``r`` the correlation of a column stripe against all columns."""
+    centred, present = _prepare(data, dtype)
+    p = centred.shape[1]
+    if block_size is None:
+        block_size = max(1, STRIPE_BYTES // max(p * np.dtype(dtype).itemsize, 1))
+
+    if present is not None:
+        squares = centred ** 2
+    for start in range(0, p, block_size):
+        block = slice(start, min(start + block_size, p))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if present is None:
+                r = centred[:, block].T @ centred
+            else:
+                # Sums over the rows where both columns are present
+                n = _pair_counts(present, block)
+                sum_i = centred[:, block].T @ present
+                sum_j = present[:, block].T @ centred
+                cov = centred[:, block].T @ centred - sum_i * sum_j / n
+                var_i = squares[:, block].T @ present - sum_i ** 2 / n
+                var_j = present[:, block].T @ squares - sum_j ** 2 / n
+                r = cov / np.sqrt(var_i * var_j)
+        yield block, np.clip(r, -1.0, 1.0).astype(dtype, copy=False)
+
+
+def blocked_correlation(
+    data: pd.DataFrame,
+    block_size: Optional[int] = None,
+    dtype: Union[str, np.dtype] = "float64",
+    out: Optional[Union[str, Path]] = None,
+) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Dense Pearson correlation matrix computed in column stripes.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Numeric data, one variable per column
+    block_size : int, optional
+        Number of columns per stripe, by default as many as fit in 256 MiB
+    dtype : str or np.dtype, optional
+        float64 (default) or float32
+    out : str or Path, optional
+        Write the matrix to this ``.npy`` file instead of keeping it in
+        memory; it can be opened later with ``np.load(out, mmap_mode="r")``
+
+    Returns
+    -------
+    pd.DataFrame or np.ndarray
+        The correlation matrix, or a read-only memory map of ``out``
+    """
+    dtype = np.dtype(dtype)
+    columns = list(data.columns)
+    p = len(columns)
+    if out is None:
+        result = np.empty((p, p), dtype=dtype)
+        for block, r in _stripes(data, block_size, dtype):
+            result[block] = r
+        return pd.DataFrame(result, index=columns, columns=columns)
+
+    out = Path(out)
+    with atomic_path(out) as tmp_path:
+        result = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(p, p))
+        for block, r in _stripes(data, block_size, dtype):
+            result[block] = r
+        result.flush()
+        del result
+    logger.info(f"Correlation matrix written to {out}")
+    return np.load(out, mmap_mode="r")
+
+
+def _edge_frames(
+    data: pd.DataFrame,
+    top_k: Optional[int],
+    threshold: Optional[float],
+    block_size: Optional[int],
+    dtype: np.dtype,
+) -> Iterator[pd.DataFrame]:
+    """Yield the ``(source, target, r)`` edges of every column stripe, possibly empty."""
+    columns = np.asarray([str(column) for column in data.columns], dtype=object)
+    for block, r in _stripes(data, block_size, dtype):
+        sources = np.arange(block.start, block.stop)
+        strength = np.abs(np.nan_to_num(r, nan=0.0))
+        strength[np.arange(len(sources)), sources] = -1.0  # never pair a column with itself
+        if top_k is not None:
+            k = min(top_k, strength.shape[1] - 1)
+            targets = np.argpartition(-strength, k - 1, axis=1)[:, :k] if k > 0 else np.empty((len(sources), 0), int)
+            rows = np.repeat(np.arange(len(sources)), targets.shape[1])
+            targets = targets.ravel()
+        else:
+            rows, targets = np.nonzero(strength >= threshold)
+            keep = targets > sources[rows]
+            rows, targets = rows[keep], targets[keep]
+        if threshold is not None:
+            keep = strength[rows, targets] >= threshold
+            rows, targets = rows[keep], targets[keep]
+
+        yield pd.DataFrame({
+            "source": columns[sources[rows]],
+            "target": columns[targets],
+            "r": r[rows, targets],
+        })
+
+
+def correlation_edges(
+    data: pd.DataFrame,
+    path: Union[str, Path],
+    top_k: Optional[int] = None,
+    threshold: Optional[float] = None,
+    block_size: Optional[int] = None,
+    dtype: Union[str, np.dtype] = "float64",
+) -> int:
+    """
+    Write the strongest correlations as a sparse edge list.
+
+    Each row of the output is ``(source, target, r)``. With ``top_k`` the
+    ``k`` partners with the largest ``|r|`` are kept for every source
+    column; with ``threshold`` only pairs with ``|r| >= threshold`` are
+    kept. Given both, a column's top-k partners are further filtered by the
+    threshold. With a threshold alone each pair is listed once
+    (``source`` before ``target`` in column order).
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Numeric data, one variable per column
+    path : str or Path
+        Output file; ``.parquet`` (requires pyarrow) or ``.csv``
+    top_k : int, optional
+        Number of partners to keep per column
+    threshold : float, optional
+        Minimum absolute correlation to keep
+    block_size : int, optional
+        Number of columns per stripe, by default as many as fit in 256 MiB
+    dtype : str or np.dtype, optional
+        float64 (default) or float32
+
+    Returns
+    -------
+    int
+        Number of edges written
+    """
+    if top_k is None and threshold is None:
+        raise ValueError("correlation_edges needs top_k and/or threshold")
+    path = Path(path)
+    parquet = path.suffix == ".parquet"
+    if parquet and pa is None:
+        raise ImportError("Writing Parquet requires pyarrow. Install with: pip install pyarrow")
+
+    edge_frames = _edge_frames(data, top_k, threshold, block_size, np.dtype(dtype))
+    n_edges = 0
+    with atomic_path(path) as tmp_path:
+        if parquet:
+            # An explicit schema: a stripe without edges would otherwise type source/target as null
+            schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in EDGE_COLUMNS])
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for edges in edge_frames:
+                    if len(edges):
+                        writer.write_table(pa.Table.from_pandas(edges, schema=schema, preserve_index=False))
+                    n_edges += len(edges)
+        else:
+            for i, edges in enumerate(edge_frames):
+                edges.to_csv(tmp_path, mode="a", header=i == 0, index=False)
+                n_edges += len(edges)
+    logger.info(f"Wrote {n_edges} correlation edges to {path}")
+    return n_edges
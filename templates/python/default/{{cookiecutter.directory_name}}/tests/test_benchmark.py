@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the scaling benchmarks in src/benchmark.py.
+"""
+
+from src.benchmark import STAGES, case_key, compare, load_baseline, main, run_benchmarks, save_baseline
+
+
+def test_run_benchmarks_measures_every_stage():
+    """A tiny case yields time, memory and throughput per stage; oversized cases are skipped."""
+    results = run_benchmarks(rows=[500, 10 ** 9], columns=[3], repeat=1, max_cells=10 ** 6)
+    assert sorted(results) == sorted(case_key(stage, 500, 3) for stage in STAGES)
+    for values in results.values():
+        assert values["seconds"] > 0
+        assert values["peak_rss_bytes"] > 0
+        assert values["rows_per_second"] > 0
+
+
+def test_baseline_and_regression_check(tmp_path):
+    """Slowdowns above the threshold and the noise floor are reported; updates merge."""
+    path = tmp_path / "baseline.json"
+    save_baseline({"load_data/1000x2": {"seconds": 1.0}, "analyze_data/1000x2": {"seconds": 0.01}}, path)
+    save_baseline({"save_results/1000x2": {"seconds": 0.5}}, path)
+    baseline = load_baseline(path)
+    assert sorted(baseline["results"]) == ["analyze_data/1000x2", "load_data/1000x2", "save_results/1000x2"]
+
+    current = {
+        "load_data/1000x2": {"seconds": 1.5},       # 50% slower
+        "analyze_data/1000x2": {"seconds": 0.03},   # 3x slower, but only by 20 ms
+        "save_results/1000x2": {"seconds": 0.55},   # within 25%
+        "load_data/1000x64": {"seconds": 9.0},      # not in the baseline
+    }
+    regressions = compare(current, baseline, threshold=0.25, min_seconds=0.05)
+    assert len(regressions) == 1 and regressions[0].startswith("load_data/1000x2")
+    assert compare(current, baseline, threshold=0.6) == []
+
+
+def test_check_without_baseline_fails(tmp_path):
+    """--check needs a baseline to compare against."""
+    args = ["--rows", "200", "--columns", "2", "--repeat", "1", "--output", str(tmp_path / "run.json"),
+            "--baseline", str(tmp_path / "missing.json")]
+    assert main(args + ["--check"]) == 1
+    assert main(args + ["--update"]) == 0
+    assert main(args + ["--check", "--threshold", "100"]) == 0
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the dependency-free column storage in src/column_table.py.
+"""
+
+import math
+import random
+import statistics
+import sys
+from array import array
+
+import pytest
+
+from src.column_table import ColumnTable, RunningStats, iter_csv, read_csv, summarize
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    """CSV file with an int, a float (with gaps) and a text column."""
+    path = tmp_path / "data.csv"
+    lines = ["id,value,label"]
+    for i in range(1000):
+        value = "" if i % 10 == 0 else f"{i * 0.5}"
+        lines.append(f"{i},{value},item {i}")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_read_csv_infers_column_types(csv_path):
+    """Columns are stored as typed arrays with NaN for missing floats."""
+    table = read_csv(csv_path)
+    assert table.kinds == {"id": "int", "value": "float", "label": "str"}
+    assert table.n_rows == 1000
+    assert isinstance(table["id"], array) and table["id"].typecode == "q"
+    assert math.isnan(table["value"][0]) and table["value"][1] == 0.5
+    assert table.view("value").nbytes == 8000
+    assert list(table.rows())[1] == (1, 0.5, "item 1")
+
+
+def test_streamed_chunks_widen_types(tmp_path):
+    """A column typed int by its first chunk becomes float when needed."""
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,x\n2,y\n3.5,z\n")
+    chunks = list(iter_csv(path, chunksize=2, usecols=["a"]))
+    assert [chunk.kinds["a"] for chunk in chunks] == ["int", "float"]
+    table = read_csv(path)
+    assert table.kinds["a"] == "float"
+    assert list(table["a"]) == [1.0, 2.0, 3.5]
+
+
+def test_running_stats_match_statistics_module():
+    """Merged chunk statistics agree with a direct computation."""
+    values = [random.Random(0).gauss(1e3, 5.0) for _ in range(5000)]
+    merged = RunningStats().update(values[:1234]).merge(RunningStats().update(values[1234:]))
+    assert merged.n == len(values)
+    assert merged.mean == pytest.approx(statistics.fmean(values), rel=1e-12)
+    assert merged.std == pytest.approx(statistics.stdev(values), rel=1e-9)
+    assert (merged.min, merged.max) == (min(values), max(values))
+
+
+def test_summarize_stream_equals_whole_table(csv_path):
+    """Summaries of a chunk stream and of the whole table agree."""
+    whole = summarize(read_csv(csv_path))
+    streamed = summarize(iter_csv(csv_path, chunksize=77))
+    assert set(whole) == {"id", "value"}
+    assert whole["value"]["count"] == 900
+    for column, stats in whole.items():
+        assert streamed[column] == pytest.approx(stats, rel=1e-12)
+
+    # A column read as numbers at first that holds text in a later chunk
+    with open(csv_path, "a") as f:
+        f.write("1000,1.5,item 1000\nn/a,2.5,item 1001\n")
+    whole = summarize(read_csv(csv_path))
+    streamed = summarize(iter_csv(csv_path, chunksize=77))
+    assert set(whole) == set(streamed) == {"value"}
+    assert streamed["value"] == pytest.approx(whole["value"], rel=1e-12)
+
+
+def test_column_table_is_compact(csv_path):
+    """Typed storage is several times smaller than lists of strings."""
+    table = read_csv(csv_path, usecols=["id", "value"])
+    assert isinstance(table, ColumnTable) and list(table) == ["id", "value"]
+    rows = [line.split(",")[:2] for line in csv_path.read_text().splitlines()[1:]]
+    as_strings = sys.getsizeof(rows) + sum(sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in rows)
+    assert table.nbytes * 5 < as_strings
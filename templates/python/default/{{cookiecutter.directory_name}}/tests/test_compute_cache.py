@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the result cache in src/compute_cache.py.
+"""
+
+import pytest
+
+from src.compute_cache import ComputeCache, memoize
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Empty cache in a temporary directory."""
+    return ComputeCache(tmp_path / "cache")
+
+
+def test_hits_by_argument_contents(cache):
+    """Equal arguments hit, different ones miss, ignored ones do not matter."""
+    calls = []
+
+    @memoize(cache=cache, ignore=("n_workers",))
+    def total(values, scale=1, n_workers=None):
+        calls.append(values)
+        return sum(values) * scale
+
+    assert total([1, 2, 3]) == 6
+    assert total([1, 2, 3], n_workers=4) == 6
+    assert total(values=[1, 2, 3], scale=1) == 6
+    assert total([1, 2, 3], scale=2) == 12
+    assert len(calls) == 2
+    stats = cache.stats()["test_hits_by_argument_contents.<locals>.total"]
+    assert (stats["hits"], stats["misses"], stats["bypassed"]) == (2, 2, 0)
+
+    # Iterators cannot be hashed without consuming them
+    assert total(iter([1, 2])) == 3
+    assert cache.stats()["test_hits_by_argument_contents.<locals>.total"]["bypassed"] == 1
+
+
+def test_shared_between_instances_and_source_sensitive(cache):
+    """Another process (here: another wrapper) finds the entry; changed code does not."""
+    namespace = {}
+    exec("def double(x):\n    return 2 * x\n", namespace)
+    assert memoize(namespace["double"], cache=cache)(21) == 42
+    assert cache.usage()[0] == 1
+
+    fresh = ComputeCache(cache.directory)
+    assert memoize(namespace["double"], cache=fresh)(21) == 42
+    assert fresh.stats()["double"]["hits"] == 1
+
+    exec("def double(x):\n    return 3 * x\n", namespace)
+    assert memoize(namespace["double"], cache=fresh)(21) == 63
+
+
+def test_dataframe_arguments(cache):
+    """Frames are keyed by content, including column names and dtypes."""
+    pd = pytest.importorskip("pandas")
+    calls = []
+
+    @memoize(cache=cache)
+    def column_sums(frame):
+        calls.append(1)
+        return frame.sum()
+
+    frame = pd.DataFrame({"x": [1.0, 2.0], "y": [3.0, 4.0]})
+    column_sums(frame)
+    column_sums(frame.copy())
+    column_sums(frame.rename(columns={"y": "z"}))
+    column_sums(frame.astype("float32"))
+    assert len(calls) == 3
+
+
+def test_lru_eviction(cache):
+    """Above the budget the least recently used entries go first."""
+    @memoize(cache=cache)
+    def payload(name):
+        return name * 1000
+
+    for name in "abc":
+        payload(name)
+    entries, size = cache.usage()
+    assert entries == 3
+
+    cache.max_bytes = size  # room for exactly three entries
+    payload("a")  # hit: now the most recently used
+    payload("d")  # evicts b, the least recently used
+    assert cache.usage()[0] == 3
+    payload("a")
+    payload("b")
+    stats = cache.stats()["test_lru_eviction.<locals>.payload"]
+    assert stats["hits"] == 2 and stats["misses"] == 5
+
+    cache.clear()
+    assert cache.usage() == (0, 0)
+
+
+def test_on_disk_array_arguments(cache, tmp_path, monkeypatch):
+    """Memory-mapped and Zarr arrays are keyed by their files, without reading them."""
+    np = pytest.importorskip("numpy")
+    zarr = pytest.importorskip("zarr")
+    from src import compute_cache
+    calls = []
+
+    @memoize(cache=cache)
+    def total(array):
+        calls.append(1)
+        return float(np.asarray(array[:]).sum())
+
+    def unread(*args):
+        raise AssertionError("array contents were read")
+
+    npy = tmp_path / "values.npy"
+    np.save(npy, np.ones((100, 3)))
+    store = str(tmp_path / "values.zarr")
+    array = zarr.open(store, mode="w", shape=(100, 3), chunks=(10, 3), dtype="f8")
+    array[:] = 1.0
+    with monkeypatch.context() as patch:
+        patch.setattr(compute_cache, "_update_array", unread)
+        patch.setattr(compute_cache, "_update_array_like", unread)
+        for _ in range(2):
+            assert total(np.load(npy, mmap_mode="r")) == 300.0
+            assert total(zarr.open(store, mode="r")) == 300.0
+    assert len(calls) == 2
+
+    values = np.load(npy, mmap_mode="r+")
+    values[5, 1] = 101.0
+    values.flush()
+    del values
+    array[5, 1] = 101.0
+    assert total(np.load(npy, mmap_mode="r")) == 400.0
+    assert total(zarr.open(store, mode="r")) == 400.0
+    assert len(calls) == 4
+
+    # Part of a mapping is hashed by content
+    assert total(np.load(npy, mmap_mode="r")[:50]) == 250.0
+    assert total(np.load(npy, mmap_mode="r")[50:]) == 150.0
+    assert len(calls) == 6
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Startup cost of the package: ``import src.main`` must stay cheap.
+
+Heavy libraries are imported by the stages that use them (see
+``lazy_import`` in src/utils.py). The budget can be changed with the
+``IMPORT_TIME_BUDGET_MS`` environment variable, e.g. on slow CI machines.
+"""
+
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 250))
+
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "matplotlib", "seaborn", "scipy", "zarr", "h5py")
+
+
+def _run(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *options, "-c", code], cwd=PROJECT_DIR,
+                          capture_output=True, text=True, check=True)
+
+
+def import_time_ms(module: str = "src.main") -> float:
+    """Cumulative import time of the package's top-level imports, from ``python -X importtime``."""
+    report = _run(f"import {module}", "-X", "importtime").stderr
+    total = 0
+    for line in report.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S+)$", line)
+        if match and match.group(2).split(".")[0] == module.split(".")[0]:
+            total += int(match.group(1))
+    return total / 1000
+
+
+def test_no_heavy_imports():
+    """Importing the entry point loads none of the heavy libraries."""
+    code = f"import sys, src.main; print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    assert _run(code).stdout.strip() == "[]"
+
+
+def test_import_time_budget():
+    """``import src.main`` stays within the budget (best of three, to ignore noise)."""
+    best = min(import_time_ms() for _ in range(3))
+    assert 0 < best <= IMPORT_TIME_BUDGET_MS, (
+        f"import src.main took {best:.0f} ms, over the budget of {IMPORT_TIME_BUDGET_MS:.0f} ms; "
+        "run `python -X importtime -c 'import src.main'` to find the slow import"
+    )
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the queue-based logging in src/log_setup.py.
+"""
+
+import json
+import logging
+import subprocess
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from src.log_setup import configure_logging, set_log_stage, worker_logging
+
+logger = logging.getLogger("test_log_setup")
+
+
+def test_importing_main_configures_nothing(tmp_path):
+    """Only the entry point sets up handlers; importing the module does not open a log file."""
+    project = Path(__file__).resolve().parent.parent
+    code = f"import sys, logging; sys.path.insert(0, {str(project)!r}); import src.main; print(logging.getLogger().handlers)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+    assert not (tmp_path / "output.log").exists()
+
+
+def test_json_lines_with_stage(tmp_path):
+    """Records from any thread carry the current stage; handlers are removed afterwards."""
+    log_file = tmp_path / "run.log"
+    root_handlers = list(logging.getLogger().handlers)
+    with configure_logging(log_file, json_lines=True, console=False):
+        logger.info("before")
+        set_log_stage("analysis")
+        worker = threading.Thread(target=lambda: logger.warning("from a thread: %d", 42))
+        worker.start()
+        worker.join()
+        logger.debug("below the level")
+    assert logging.getLogger().handlers == root_handlers
+
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [entry["message"] for entry in entries] == ["before", "from a thread: 42"]
+    assert [entry["stage"] for entry in entries] == ["-", "analysis"]
+    assert entries[1]["level"] == "WARNING" and entries[1]["logger"] == "test_log_setup"
+
+
+def _log_in_worker(message):
+    logging.getLogger("test_log_setup.worker").warning(message)
+
+
+def test_worker_process_records(tmp_path):
+    """Records logged in pool workers reach the log file with the parent's stage."""
+    log_file = tmp_path / "run.log"
+    with configure_logging(log_file, json_lines=True, console=False):
+        set_log_stage("analysis")
+        with ProcessPoolExecutor(max_workers=2, **worker_logging()) as pool:
+            list(pool.map(_log_in_worker, ["first", "second"]))
+    assert worker_logging() == {}
+
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert sorted(entry["message"] for entry in entries) == ["first", "second"]
+    assert {entry["stage"] for entry in entries} == {"analysis"}
+
+
+def test_rotation(tmp_path):
+    """The log file is rotated by size, keeping the configured number of backups."""
+    log_file = tmp_path / "run.log"
+    with configure_logging(log_file, max_bytes=2000, backup_count=2, console=False):
+        for i in range(200):
+            logger.info(f"message {i:04d} " + "x" * 40)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["run.log", "run.log.1", "run.log.2"]
+    assert all(path.stat().st_size <= 2000 for path in tmp_path.iterdir())
+    assert "message 0199" in log_file.read_text()
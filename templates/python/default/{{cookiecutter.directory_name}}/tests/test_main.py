@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the analysis pipeline in src/main.py.
+"""
+
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from src import main
+
+if not hasattr(main, "analyze_data"):
+    pytest.skip("project generated without data analysis", allow_module_level=True)
+
+
+@pytest.fixture
+def csv_file(tmp_path, monkeypatch):
+    """Write a small CSV file into a temporary data directory."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(1000, 3)), columns=["x", "y", "z"])
+    data.loc[::7, "y"] = np.nan
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    data.to_csv(data_dir / "sample.csv", index=False)
+    # load_data resolves files relative to the package directory
+    monkeypatch.setattr(main, "__file__", str(tmp_path / "src" / "main.py"))
+    return data
+
+
+def test_streaming_matches_in_memory(csv_file):
+    """Chunked analysis agrees with the in-memory describe()/corr()."""
+    expected = main.analyze_data(main.load_data("sample.csv"))
+    chunks = main.load_data("sample.csv", chunksize=128)
+    assert not isinstance(chunks, pd.DataFrame)
+    results = main.analyze_data(chunks)
+    moments = ["count", "mean", "std", "min", "max"]
+    pd.testing.assert_frame_equal(results["summary"].loc[moments], expected["summary"].loc[moments], rtol=1e-9)
+    pd.testing.assert_frame_equal(results["correlation"], expected["correlation"], rtol=1e-9)
+
+
+def test_memory_budget_limits_chunk_size(csv_file):
+    """A small memory budget yields several chunks covering every row."""
+    chunks = list(main.load_data("sample.csv", memory_budget=4096))
+    assert len(chunks) > 1
+    assert sum(len(chunk) for chunk in chunks) == len(csv_file)
+
+
+def test_columnar_cache_reuses_and_invalidates(csv_file, tmp_path):
+    """The second load hits the cache; changing the source invalidates it."""
+    pytest.importorskip("pyarrow")
+    cache_dir = tmp_path / "data" / "processed" / ".columnar"
+    first = main.load_data("sample.csv")
+    cached = list(cache_dir.glob("*.arrow"))
+    assert len(cached) == 1
+    pd.testing.assert_frame_equal(main.load_data("sample.csv"), first)
+
+    csv_file.iloc[:10].to_csv(tmp_path / "data" / "sample.csv", index=False)
+    assert len(main.load_data("sample.csv")) == 10
+    assert not cached[0].exists()
+
+
+def test_columnar_index_updates_are_not_lost(tmp_path):
+    """Concurrent index updates keep every entry."""
+    from concurrent.futures import ThreadPoolExecutor
+    from src.columnar_cache import _load_index, source_digest
+
+    sources = []
+    for i in range(16):
+        sources.append(tmp_path / f"source-{i}.csv")
+        sources[-1].write_text(f"x\n{i}\n")
+    cache_dir = tmp_path / "cache"
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda source: source_digest(source, cache_dir), sources))
+    assert len(_load_index(cache_dir)) == len(sources)
+
+
+def test_parallel_moments_within_tolerance():
+    """Merged chunk moments match pandas on offset data with missing values."""
+    from src.streaming_stats import accumulate_chunks
+
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame(rng.normal(size=(5000, 3)) * [1.0, 10.0, 1e-3] + [0.0, 1e5, 5.0], columns=["a", "b", "c"])
+    data.loc[rng.random(5000) < 0.2, "b"] = np.nan
+    chunks = (data.iloc[start:start + 333] for start in range(0, len(data), 333))
+    moments = accumulate_chunks(chunks, n_workers=2)
+    expected = data.describe().loc[["count", "mean", "std", "min", "max"]]
+    pd.testing.assert_frame_equal(moments.summary(), expected, rtol=1e-9)
+    pd.testing.assert_frame_equal(moments.correlation(), data.corr(), rtol=1e-9, atol=1e-9)
+
+
+def test_exact_mode_is_bit_identical(csv_file):
+    """Exact mode reproduces describe() on streamed chunks bit for bit."""
+    expected = main.analyze_data(main.load_data("sample.csv"))["summary"]
+    results = main.analyze_data(main.load_data("sample.csv", chunksize=100), exact=True)
+    pd.testing.assert_frame_equal(results["summary"], expected, check_exact=True)
+
+
+def test_sketched_percentiles_within_rank_error():
+    """Merged quantile sketches stay within their rank error bound."""
+    from src.quantiles import KLLSketch, k_for_error
+
+    values = np.random.default_rng(2).lognormal(size=200_000)
+    sketch = KLLSketch(k_for_error(0.01))
+    for start in range(0, len(values), 10_000):
+        sketch.merge(KLLSketch(k_for_error(0.01)).update(values[start:start + 10_000]))
+    qs = np.array([0.05, 0.25, 0.5, 0.75, 0.95])
+    ranks = np.searchsorted(np.sort(values), sketch.quantiles(qs)) / len(values)
+    assert np.abs(ranks - qs).max() < 0.01
+
+
+def test_wide_correlation_matches_pandas(tmp_path, monkeypatch):
+    """Blocked correlation and its edge list agree with DataFrame.corr()."""
+    from src import wide_correlation
+    from src.wide_correlation import blocked_correlation, correlation_edges
+
+    rng = np.random.default_rng(3)
+    data = pd.DataFrame(rng.normal(size=(200, 50)), columns=[f"g{i}" for i in range(50)])
+    data["g1"] += data["g0"]
+    expected = data.corr()
+    pd.testing.assert_frame_equal(blocked_correlation(data, block_size=7), expected, atol=1e-12)
+    data.iloc[::5, 3] = np.nan
+    pd.testing.assert_frame_equal(blocked_correlation(data, block_size=7), data.corr(), atol=1e-12)
+    assert np.allclose(blocked_correlation(data, dtype="float32"), data.corr(), atol=1e-5)
+    # Pairwise counts of tall float32 inputs are summed in float64 over blocks of rows
+    monkeypatch.setattr(wide_correlation, "EXACT_COUNT_ROWS", 64)
+    assert np.allclose(blocked_correlation(data, block_size=7, dtype="float32"), data.corr(), atol=1e-5)
+
+    edges_path = tmp_path / "edges.csv"
+    assert correlation_edges(data, edges_path, top_k=2, block_size=7) == 100
+    edges = pd.read_csv(edges_path)
+    strongest = edges[edges["source"] == "g0"].sort_values("r").iloc[-1]
+    assert strongest["target"] == "g1"
+    assert strongest["r"] == pytest.approx(data.corr().loc["g0", "g1"])
+
+
+def test_correlation_edges_first_stripe_without_edges(tmp_path):
+    """A stripe without edges does not fix the Parquet schema; float32 data stays float32."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    from src.wide_correlation import _prepare, correlation_edges
+
+    rng = np.random.default_rng(4)
+    data = pd.DataFrame(rng.normal(size=(300, 6)), columns=[f"g{i}" for i in range(6)])
+    data["g5"] = data["g4"] + 0.01 * data["g5"]
+    edges_path = tmp_path / "edges.parquet"
+    assert correlation_edges(data, edges_path, threshold=0.9, block_size=2) == 1
+    edges = pq.read_table(edges_path).to_pandas()
+    assert edges[["source", "target"]].values.tolist() == [["g4", "g5"]]
+
+    centred, present = _prepare(data, np.dtype("float32"))
+    assert centred.dtype == np.float32 and present is None
+
+
+def test_result_store_round_trip(tmp_path):
+    """Saved results load back lazily with their manifest metadata."""
+    from src.result_store import load_results, write_results
+
+    frame = pd.DataFrame({"x": [1.0, 2.0], "y": [3.0, 4.0]}, index=["mean", "std"])
+    array = np.arange(6.0).reshape(2, 3)
+    manifest = write_results({"summary": frame, "matrix": array, "flag": True, "n": np.int64(7)}, tmp_path / "results.json")
+
+    results = load_results(manifest, verify=True)
+    assert set(results) == {"summary", "matrix", "flag", "n"}
+    assert results.info("summary")["shape"] == [2, 2]
+    assert results["flag"] is True and results["n"] == 7
+    np.testing.assert_array_equal(results["matrix"], array)
+    pd.testing.assert_frame_equal(results["summary"], frame)
+
+    # Rewriting replaces the data files of the previous run
+    write_results({"summary": frame * 2}, manifest)
+    assert len(list((tmp_path / "results").iterdir())) == 1
+
+
+def test_binned_kde_matches_direct_kde():
+    """The FFT-binned KDE agrees with a direct sum over all points."""
+    rendering = pytest.importorskip("src.rendering")
+    values = np.random.default_rng(3).normal(size=5000)
+    grid, density = rendering.binned_kde(values, grid_size=1024)
+    bandwidth = rendering.scott_bandwidth(values)
+    z = (grid[:, None] - values[None, :]) / bandwidth
+    expected = np.exp(-0.5 * z ** 2).sum(axis=1) / (values.size * bandwidth * np.sqrt(2 * np.pi))
+    np.testing.assert_allclose(density, expected, atol=1e-3 * expected.max())
+
+
+def test_render_batch_skips_unchanged_data(tmp_path):
+    """Batch rendering redraws only when the data or parameters change."""
+    rendering = pytest.importorskip("src.rendering")
+    data = pd.DataFrame(np.random.default_rng(4).normal(size=(2000, 3)), columns=["x", "y", "z"])
+    figure = tmp_path / "figure.png"
+    assert rendering.render_batch(data, figure, max_points=500, dpi=50)
+    assert figure.exists()
+    assert not rendering.render_batch(data, figure, max_points=500, dpi=50)
+    assert rendering.render_batch(data, figure, max_points=5000, dpi=50, n_workers=1)
+    data.loc[0, "x"] = 10.0
+    assert rendering.render_batch(data, figure, max_points=5000, dpi=50, n_workers=1)
+
+
+def test_batch_sample_of_streamed_input_exceeds_max_points(tmp_path, monkeypatch):
+    """Streamed input is sampled to more than max_points rows, so batch figures show densities."""
+    pytest.importorskip("src.rendering")
+    if not hasattr(main, "visualize_data"):
+        pytest.skip("project generated without visualization")
+    plotted = []
+    monkeypatch.setattr(main, "render_batch", lambda data, *args, **kwargs: plotted.append(len(data)))
+    chunks = (pd.DataFrame(np.random.default_rng(i).normal(size=(1000, 2)), columns=["x", "y"]) for i in range(20))
+    main.visualize_data(chunks, batch=True, max_points=1000, figure_path=tmp_path / "figure.png")
+    assert plotted == [10_000]
+
+
+def test_synthetic_data_independent_of_workers(tmp_path):
+    """Generated files are bit-identical for any number of workers."""
+    from src.synthetic import write_sample_data
+    from src.utils import file_digest
+
+    serial = write_sample_data(tmp_path / "serial.npy", 10_000, chunk_rows=999, n_workers=1)
+    parallel = write_sample_data(tmp_path / "parallel.npy", 10_000, chunk_rows=999, n_workers=3)
+    assert file_digest(serial) == file_digest(parallel)
+
+    values = np.load(serial)
+    csv = write_sample_data(tmp_path / "data.csv", 10_000, chunk_rows=999, n_workers=2)
+    pd.testing.assert_frame_equal(pd.read_csv(csv), pd.DataFrame(values))
+    other_seed = write_sample_data(tmp_path / "other.npy", 10_000, chunk_rows=999, seed=7, n_workers=1)
+    assert not np.array_equal(np.load(other_seed)["y"], values["y"])
+
+
+def test_partitioned_dataset_pushdown(tmp_path, monkeypatch):
+    """Column selection and filters on a partitioned dataset match pandas."""
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    rng = np.random.default_rng(5)
+    data = pd.DataFrame({
+        "year": np.repeat([2023, 2024], 500),
+        "x": rng.normal(size=1000),
+        "y": rng.normal(size=1000),
+        "z": rng.normal(size=1000),
+    })
+    root = tmp_path / "data" / "processed" / "events"
+    pq.write_to_dataset(pa.Table.from_pandas(data, preserve_index=False), root, partition_cols=["year"])
+    monkeypatch.setattr(main, "__file__", str(tmp_path / "src" / "main.py"))
+
+    filters = [("year", "==", 2024), ("x", ">", 0)]
+    expected = data[(data["year"] == 2024) & (data["x"] > 0)][["x", "y"]]
+    loaded = main.load_data("processed/events", usecols=["x", "y"], filters=filters)
+    assert list(loaded.columns) == ["x", "y"]
+    np.testing.assert_allclose(np.sort(loaded["x"]), np.sort(expected["x"]))
+
+    chunks = list(main.load_data("processed/events", chunksize=50, usecols=["x", "y"], filters=filters))
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert sum(map(len, chunks)) == len(expected)
+    assert main.parse_filter("year==2024") == ("year", "==", 2024)
+    assert main.parse_filter("x<=0.5") == ("x", "<=", 0.5)
+
+
+def test_array_inputs_are_memory_mapped(tmp_path, monkeypatch):
+    """.npy/.npz inputs are opened as views and analyzed block by block."""
+    values = np.random.default_rng(6).normal(size=(5000, 3))
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    np.save(data_dir / "values.npy", values)
+    np.savez(data_dir / "values.npz", other=np.zeros(3), values=values)
+    monkeypatch.setattr(main, "__file__", str(tmp_path / "src" / "main.py"))
+
+    array = main.load_data("values.npy")
+    assert isinstance(array, np.memmap)
+    member = main.load_data("values.npz", key="values")
+    assert isinstance(member, np.memmap)
+    np.testing.assert_array_equal(member, values)
+
+    assert len(list(main.load_data("values.npz", key="values", chunksize=1000))) == 5
+    chunks = main.iter_array_chunks(member, chunksize=1000)
+    assert all(np.shares_memory(chunk.to_numpy(), member) for chunk in chunks)
+
+    results = main.analyze_data(array)
+    expected = pd.DataFrame(values).describe()
+    moments = ["count", "mean", "std", "min", "max"]
+    pd.testing.assert_frame_equal(results["summary"].loc[moments], expected.loc[moments], rtol=1e-9)
+
+    # Column selection applies whether or not the array is streamed
+    selected = main.load_data("values.npy", usecols=["0", "2"])
+    assert selected.shape == (5000, 2)
+    summary = main.analyze_data(selected)["summary"]
+    assert list(summary.columns) == [0, 2]
+    np.testing.assert_allclose(summary.loc["mean"], values[:, [0, 2]].mean(axis=0))
+    streamed = pd.concat(main.load_data("values.npy", usecols=["0", "2"], chunksize=1000))
+    np.testing.assert_array_equal(streamed.to_numpy(), values[:, [0, 2]])
+
+
+@pytest.mark.parametrize("suffix", [".zarr", ".h5"])
+def test_chunked_array_stores(tmp_path, suffix):
+    """Zarr and HDF5 arrays stream in blocks aligned to their storage chunks."""
+    from src.array_store import iter_array_chunks, open_array
+
+    values = np.arange(1000.0).reshape(500, 2)
+    path = tmp_path / f"values{suffix}"
+    if suffix == ".zarr":
+        zarr = pytest.importorskip("zarr")
+        zarr.open(str(path), mode="w", shape=values.shape, chunks=(64, 2), dtype="f8")[:] = values
+    else:
+        h5py = pytest.importorskip("h5py")
+        with h5py.File(path, "w") as f:
+            f.create_dataset("group/values", data=values, chunks=(64, 2))
+
+    chunks = list(iter_array_chunks(open_array(path), chunksize=100))
+    assert [len(chunk) for chunk in chunks[:-1]] == [64] * (len(chunks) - 1)
+    np.testing.assert_array_equal(pd.concat(chunks).to_numpy(), values)
+
+    with open_array(path, usecols=[1]) as array:
+        np.testing.assert_array_equal(np.asarray(array), values[:, [1]])
+    if suffix == ".h5":
+        # The file is closed, so it can be opened for writing again
+        assert not array.handle
+        with h5py.File(path, "a") as f:
+            f["group/values"][0, 0] = -1.0
+
+
+def test_multi_file_shards(tmp_path, monkeypatch):
+    """Shards load concurrently in natural order and failures are reported."""
+    raw = tmp_path / "data" / "raw"
+    raw.mkdir(parents=True)
+    for i in range(12):
+        pd.DataFrame({"shard": [i] * 3, "x": np.arange(3.0)}).to_csv(raw / f"run-{i}.csv", index=False)
+    (raw / "run-99.csv").write_bytes(b"\xff\xfe\x00broken")
+    monkeypatch.setattr(main, "__file__", str(tmp_path / "src" / "main.py"))
+
+    data = main.load_data("raw/run-*.csv", n_workers=4)
+    assert data["shard"].tolist() == [i for i in range(12) for _ in range(3)]
+    assert list(data.index) == list(range(36))
+    assert [Path(path).name for path in data.attrs["failed_shards"]] == ["run-99.csv"]
+    pd.testing.assert_frame_equal(main.load_data("raw"), data)
+
+    chunks = list(main.load_data("raw/run-*.csv", chunksize=10))
+    assert all(len(chunk) >= 10 for chunk in chunks[:-1])
+    pd.testing.assert_frame_equal(pd.concat(chunks), data)
+
+    # Streamed runs report the failed shards in the results too
+    saved = {}
+    monkeypatch.setattr(main, "save_results", lambda results, filename: saved.update(results) or True)
+    monkeypatch.setattr(main, "visualize_data", lambda *args, **kwargs: None, raising=False)
+    main.main(["--input", "raw/run-*.csv", "--chunksize", "10", "--no-cache"])
+    assert [Path(path).name for path in saved["failed_shards"]] == ["run-99.csv"]
+
+    with pytest.raises(main.ShardLoadError):
+        main.load_data("raw/missing-*.csv")
+
+
+def test_chunked_analysis_resumes_from_checkpoint(csv_file, tmp_path):
+    """An interrupted streamed analysis continues after its last saved chunk."""
+    from src.checkpoint import CheckpointMismatch, RunCheckpoint
+
+    fingerprint = {"inputs": {"sample.csv": [1, 2]}, "options": {}, "code": "abc"}
+    checkpoint = RunCheckpoint(fingerprint, tmp_path / "checkpoint", every=2)
+    checkpoint.start()
+
+    def interrupted():
+        for i, chunk in enumerate(main.load_data("sample.csv", chunksize=100)):
+            if i == 5:
+                raise KeyboardInterrupt
+            yield chunk
+
+    with pytest.raises(KeyboardInterrupt):
+        main.analyze_data(interrupted(), n_workers=1, checkpoint=checkpoint)
+
+    resumed = RunCheckpoint(fingerprint, tmp_path / "checkpoint", every=2)
+    assert resumed.resume()
+    assert resumed.progress("analysis")[0] == 4
+    results = main.analyze_data(main.load_data("sample.csv", chunksize=100), n_workers=1, checkpoint=resumed)
+    expected = main.analyze_data(main.load_data("sample.csv", chunksize=100), n_workers=1)
+    rows = ["count", "mean", "std", "min", "max"]
+    pd.testing.assert_frame_equal(results["summary"].loc[rows], expected["summary"].loc[rows], rtol=1e-9)
+    pd.testing.assert_frame_equal(results["correlation"], expected["correlation"], rtol=1e-9)
+
+    changed = RunCheckpoint(dict(fingerprint, inputs={"sample.csv": [1, 3]}), tmp_path / "checkpoint")
+    with pytest.raises(CheckpointMismatch, match="input sample.csv"):
+        changed.resume()
+
+
+def test_main_resumes_after_crash(csv_file, tmp_path, monkeypatch):
+    """--resume skips completed stages and refuses changed inputs."""
+    checkpoint_dir = tmp_path / "data" / "processed" / ".checkpoint" / "all"
+    save_results, analyze_data = main.save_results, main.analyze_data
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(main, "save_results", crash)
+    with pytest.raises(RuntimeError):
+        main.main(["--no-cache"])
+    assert (checkpoint_dir / "manifest.json").exists()
+
+    monkeypatch.setattr(main, "save_results", save_results)
+    monkeypatch.setattr(main, "analyze_data", crash)
+    monkeypatch.setattr(main, "visualize_data", crash, raising=False)
+    main.main(["--no-cache", "--resume"])
+    assert (tmp_path / "data" / "results" / "analysis_results.json").exists()
+    assert not checkpoint_dir.exists()
+
+    monkeypatch.setattr(main, "analyze_data", analyze_data)
+    monkeypatch.setattr(main, "save_results", crash)
+    with pytest.raises(RuntimeError):
+        main.main(["--no-cache", "--exact"])
+    csv_file.iloc[:10].to_csv(tmp_path / "data" / "sample.csv", index=False)
+    with pytest.raises(SystemExit):
+        main.main(["--no-cache", "--exact", "--resume"])
+
+
+def test_resume_with_other_run_options(csv_file, tmp_path, monkeypatch):
+    """Only options that change the results are part of the checkpoint fingerprint."""
+    def crash(*args, **kwargs):
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(main, "save_results", crash)
+    with pytest.raises(RuntimeError):
+        main.main(["--no-cache", "--chunksize", "100", "--log-file", str(tmp_path / "first.log")])
+    monkeypatch.undo()
+    monkeypatch.setattr(main, "__file__", str(tmp_path / "src" / "main.py"))
+    monkeypatch.setattr(main, "visualize_data", lambda *args, **kwargs: None, raising=False)
+    main.main(["--no-cache", "--chunksize", "100", "--resume", "--log-json", "--log-max-bytes", "1MB",
+               "--log-backups", "1", "--log-file", str(tmp_path / "resumed.log"), "--profile", "cpu",
+               "--workers", "1", "--cache-budget", "1GB", "--checkpoint-every", "2"])
+    assert (tmp_path / "data" / "results" / "analysis_results.json").exists()
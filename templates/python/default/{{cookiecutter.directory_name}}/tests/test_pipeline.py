@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the stage pipeline in src/pipeline.py.
+"""
+
+import json
+import sys
+
+import pytest
+
+from src.pipeline import Step, dependencies, load_steps, run_pipeline
+
+# Copies its first argument to its second, recording start and end times
+COPY_SCRIPT = """
+import json, sys, time
+start = time.time()
+time.sleep(float(sys.argv[3]) if len(sys.argv) > 3 else 0)
+data = open(sys.argv[1]).read()
+with open(sys.argv[2], "w") as f:
+    f.write(data)
+with open(sys.argv[2] + ".times", "w") as f:
+    json.dump([start, time.time()], f)
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Project directory with an input file and a copy script."""
+    (tmp_path / "copy.py").write_text(COPY_SCRIPT)
+    (tmp_path / "raw.txt").write_text("1,2,3\n")
+    return tmp_path
+
+
+def diamond():
+    """``prep`` feeds ``left`` and ``right``, which are independent."""
+    return {
+        "prep": Step("prep", "python copy.py raw.txt prep.txt", inputs=["raw.txt"], outputs=["prep.txt"],
+                     code=["copy.py"]),
+        "left": Step("left", "python copy.py prep.txt left.txt 0.5", inputs=["prep.txt"], outputs=["left.txt"],
+                     code=["copy.py"]),
+        "right": Step("right", "python copy.py prep.txt right.txt 0.5", inputs=["prep.txt"],
+                      outputs=["right.txt"]),
+    }
+
+
+def test_dependencies_from_inputs_and_outputs():
+    """Steps reading another step's outputs depend on it; cycles are rejected."""
+    assert dependencies(diamond()) == {"prep": set(), "left": {"prep"}, "right": {"prep"}}
+
+    cycle = {"a": Step("a", "true", inputs=["b.txt"], outputs=["a.txt"]),
+             "b": Step("b", "true", inputs=["a.txt"], outputs=["b.txt"])}
+    with pytest.raises(ValueError, match="cycle"):
+        dependencies(cycle)
+
+
+def test_run_pipeline_concurrent_and_incremental(project):
+    """Independent steps overlap, and only steps with changed inputs or code run again."""
+    status = run_pipeline(diamond(), root=project, n_workers=2)
+    assert status == {"prep": "ran", "left": "ran", "right": "ran"}
+    assert (project / "left.txt").read_text() == "1,2,3\n"
+    left, right = (json.loads((project / f"{name}.txt.times").read_text()) for name in ("left", "right"))
+    assert left[0] < right[1] and right[0] < left[1]
+
+    assert set(run_pipeline(diamond(), root=project).values()) == {"skipped"}
+
+    # Only `left` lists the script as its code
+    (project / "copy.py").write_text(COPY_SCRIPT + "\n# changed\n")
+    assert run_pipeline(diamond(), root=project) == {"prep": "ran", "left": "ran", "right": "skipped"}
+
+    # A changed input reruns everything downstream
+    (project / "raw.txt").write_text("4,5,6\n")
+    assert set(run_pipeline(diamond(), root=project).values()) == {"ran"}
+    assert (project / "right.txt").read_text() == "4,5,6\n"
+
+    # A deleted output reruns its step
+    (project / "right.txt").unlink()
+    assert run_pipeline(diamond(), root=project)["right"] == "ran"
+
+
+def test_failed_step_blocks_dependents(project):
+    """Steps downstream of a failure do not run, and the failed step runs again next time."""
+    steps = diamond()
+    steps["prep"].command = "python copy.py missing.txt prep.txt"
+    status = run_pipeline(steps, root=project)
+    assert status == {"prep": "failed", "left": "blocked", "right": "blocked"}
+    assert run_pipeline(diamond(), root=project)["prep"] == "ran"
+
+
+def test_steps_get_their_own_log_file(project):
+    """Each step is pointed at its own log file, so concurrent steps never rotate a shared one."""
+    script = "import os, sys; open(sys.argv[1], 'w').write(os.environ['CRESP_LOG_FILE'])"
+    steps = {name: Step(name, f'python -c "{script}" {name}.env') for name in ("a", "b")}
+    assert run_pipeline(steps, root=project, n_workers=2) == {"a": "ran", "b": "ran"}
+    assert (project / "a.env").read_text() == str(project / "logs" / "a.log")
+    assert (project / "b.env").read_text() == str(project / "logs" / "b.log")
+
+
+def test_load_steps(tmp_path):
+    """Table steps are read with their files, string steps as bare commands, empty ones left out."""
+    pytest.importorskip("tomllib" if sys.version_info >= (3, 11) else "tomli")
+    config = tmp_path / "cresp.toml"
+    config.write_text(
+        '[execution.steps]\n'
+        'cleanup = "python cleanup.py"\n'
+        'unused = ""\n\n'
+        '[execution.steps.prep]\n'
+        'command = "python prep.py"\n'
+        'inputs = ["data/raw"]\n'
+        'outputs = ["data/processed/prep.parquet"]\n'
+    )
+    steps = load_steps(config)
+    assert list(steps) == ["cleanup", "prep"]
+    assert steps["cleanup"].command == "python cleanup.py" and not steps["cleanup"].declares_files
+    assert steps["prep"].outputs == ["data/processed/prep.parquet"]
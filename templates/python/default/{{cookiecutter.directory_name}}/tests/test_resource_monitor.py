@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the resource sampler in src/resource_monitor.py.
+"""
+
+import csv
+import os
+import sys
+
+import pytest
+
+from src.resource_monitor import COLUMNS, ResourceMonitor, parse_duration
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/stat"), reason="needs /proc")
+
+
+def test_parse_duration():
+    """Intervals are given as in cresp.toml."""
+    assert parse_duration("10s") == 10
+    assert parse_duration("500ms") == 0.5
+    assert parse_duration("2m") == 120
+    assert parse_duration(3) == 3
+    with pytest.raises(ValueError):
+        parse_duration("often")
+
+
+def test_samples_tagged_with_stages(tmp_path):
+    """Every stage boundary adds samples; the periodic thread adds more."""
+    output = tmp_path / "usage.csv"
+    with ResourceMonitor(output, interval=0.05) as monitor:
+        monitor.set_stage("analysis")
+        sum(i * i for i in range(300_000))
+        monitor.set_stage("saving")
+        with open(tmp_path / "payload.bin", "wb") as f:
+            f.write(os.urandom(1 << 20))
+
+    with open(output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == COLUMNS
+    stages = [row["stage"] for row in rows]
+    assert stages[0] == "startup" and stages[-1] == "saving" and "analysis" in stages
+    assert all(int(row["rss_bytes"]) > 0 for row in rows)
+    assert all(0 <= float(row["system_cpu_percent"]) <= 100 for row in rows)
+    summary = monitor.summary()
+    assert summary["samples"] == len(rows) and summary["peak_rss_bytes"] > 0
+
+
+def test_alert_thresholds(tmp_path):
+    """A threshold crossed logs one alert until usage drops below it again."""
+    monitor = ResourceMonitor(tmp_path / "usage.csv", interval=60,
+                              thresholds={"cpu_usage": "", "memory_usage": "1KB", "gpu_memory": "80%"})
+    with monitor:
+        monitor.sample()
+        monitor.set_stage("analysis")
+    assert [alert["threshold"] for alert in monitor.alerts] == ["memory_usage"]
+    assert monitor.alerts[0]["stage"] == "startup"
+
+
+def test_from_config(tmp_path):
+    """Settings come from cresp.toml; a missing configuration disables monitoring."""
+    pytest.importorskip("tomllib" if sys.version_info >= (3, 11) else "tomli")
+    config = tmp_path / "cresp.toml"
+    config.write_text(
+        '[execution.resource_monitoring]\n'
+        'enabled = true\n'
+        'logging_interval = "250ms"\n\n'
+        '[reproduction.cloud.resource_monitoring]\n'
+        'alert_thresholds = { cpu_usage = "95%", memory_usage = "" }\n'
+    )
+    monitor = ResourceMonitor.from_config(tmp_path / "usage.csv", config)
+    assert monitor.enabled and monitor.interval == 0.25
+    assert [check[:3] for check in monitor._checks] == [("cpu_usage", "system_cpu_percent", 95.0)]
+
+    assert not ResourceMonitor.from_config(tmp_path / "usage.csv", tmp_path / "missing.toml").enabled
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the spans and profiling hooks in src/tracing.py.
+"""
+
+import json
+import time
+
+import pytest
+
+from src.tracing import Tracer, profile_kinds
+
+
+def test_profile_kinds(monkeypatch):
+    """Kinds come from the argument or the environment; unknown ones are rejected."""
+    assert profile_kinds("memory, cpu") == ["cpu", "memory"]
+    assert profile_kinds("all") == ["cpu", "memory"]
+    monkeypatch.setenv("CRESP_PROFILE", "cpu")
+    assert profile_kinds() == ["cpu"]
+    with pytest.raises(ValueError, match="gpu"):
+        profile_kinds("gpu")
+
+
+def test_spans_and_chrome_trace(tmp_path):
+    """Spans are timed and exported as complete events in order."""
+    tracer = Tracer()
+    with tracer.span("load_data", input="sample.csv"):
+        time.sleep(0.02)
+    with pytest.raises(RuntimeError):
+        with tracer.span("analyze_data"):
+            raise RuntimeError("failed")
+
+    summary = tracer.summary()
+    assert [row["span"] for row in summary] == ["load_data", "analyze_data"]
+    assert summary[0]["seconds"] >= 0.02 and "top_functions" not in summary[0]
+
+    trace = json.loads(tracer.write(tmp_path / "trace.json").read_text())
+    events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert [event["name"] for event in events] == ["load_data", "analyze_data"]
+    assert events[0]["args"]["input"] == "sample.csv"
+    assert events[0]["ts"] + events[0]["dur"] <= events[1]["ts"]
+
+
+def test_cpu_and_memory_profiles(tmp_path):
+    """Profiling adds the slowest functions, a .prof file and the allocation peak."""
+    def allocate():
+        return [bytes(1024) for _ in range(2000)]
+
+    tracer = Tracer(profile=["cpu", "memory"], profile_dir=tmp_path / "profiles")
+    with tracer.span("analyze_data"):
+        kept = allocate()
+    row = tracer.summary()[0]
+    assert row["peak_allocated_bytes"] >= 2000 * 1024
+    assert row["net_allocated_bytes"] >= 2000 * 1024
+    assert any("allocate" in function["function"] for function in row["top_functions"])
+    assert (tmp_path / "profiles" / "analyze_data.prof").is_file()
+    del kept
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the helpers in src/utils.py.
+"""
+
+import os
+import stat
+
+import pytest
+
+from src.utils import atomic_path
+
+
+def test_atomic_path_uses_umask_permissions(tmp_path):
+    """Files get the mode of a normally created file, not the 0600 of the temporary file."""
+    previous = os.umask(0o022)
+    try:
+        with atomic_path(tmp_path / "out" / "result.json") as tmp:
+            tmp.write_text("{}")
+    finally:
+        os.umask(previous)
+    assert stat.S_IMODE((tmp_path / "out" / "result.json").stat().st_mode) == 0o644
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="reads the umask from /proc")
+def test_atomic_path_leaves_umask_alone(tmp_path, monkeypatch):
+    """The umask is read without setting it, which would race with other threads creating files."""
+    previous = os.umask(0o027)
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(os, "umask", lambda mask: pytest.fail("umask changed"))
+            with atomic_path(tmp_path / "result.json") as tmp:
+                tmp.write_text("{}")
+    finally:
+        os.umask(previous)
+    assert stat.S_IMODE((tmp_path / "result.json").stat().st_mode) == 0o640
+
+
+def test_atomic_path_keeps_old_file_on_error(tmp_path):
+    """A failed write leaves the previous file and no temporary file behind."""
+    target = tmp_path / "result.json"
+    target.write_text("old")
+    with pytest.raises(RuntimeError):
+        with atomic_path(target) as tmp:
+            tmp.write_text("partial")
+            raise RuntimeError("interrupted")
+    assert target.read_text() == "old"
+    assert [path.name for path in tmp_path.iterdir()] == ["result.json"]